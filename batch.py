@@ -0,0 +1,337 @@
+import abc
+import argparse
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from logging_config import setup_logging, get_logger
+from main import build_prompt, build_request_kwargs, extraction_response_format, read_pdf_for_prompt, save_response
+from response_check import check_response
+
+logger = get_logger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+DEFAULT_REQUESTS_FILENAME = "batch_requests.jsonl"
+DEFAULT_RESULTS_FILENAME = "batch_results.jsonl"
+
+
+# ----------------- подготовка запросов ----------------- #
+
+def build_batch_request(pdf_text: str, uid: str) -> Dict[str, Any]:
+    """
+    Одна строка JSONL для Batch API: тот же промпт и те же параметры модели,
+    что и в run_extraction_prompt, custom_id = uid.
+    """
+    return {
+        "custom_id": uid,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": build_request_kwargs(build_prompt(pdf_text), extraction_response_format()),
+    }
+
+
+def prepare_batch(pdf_paths: List[str], requests_path: str) -> int:
+    """
+    Читает PDF и пишет по одной строке-запросу на файл в requests_path.
+    Возвращает количество записанных запросов.
+    """
+    written = 0
+    seen = set()
+    with open(requests_path, "w", encoding="utf-8") as f:
+        for pdf_path in pdf_paths:
+            uid = os.path.splitext(os.path.basename(pdf_path))[0]
+            if uid in seen:
+                # custom_id в батче должен быть уникальным
+                logger.error(f"prepare_batch: повторяющийся uid={uid}, пропускаю {pdf_path}")
+                continue
+            try:
+                pdf_text = read_pdf_for_prompt(pdf_path)
+            except Exception:
+                logger.exception(f"prepare_batch: не удалось прочитать PDF: {pdf_path}")
+                continue
+
+            f.write(json.dumps(build_batch_request(pdf_text, uid), ensure_ascii=False))
+            f.write("\n")
+            seen.add(uid)
+            written += 1
+
+    logger.info(f"prepare_batch: записано запросов={written} → {requests_path}")
+    return written
+
+
+# ----------------- разбор результатов ----------------- #
+
+def ingest_batch_results(results_path: str, output_dir: str) -> Dict[str, int]:
+    """
+    Читает JSONL с результатами Batch API и пишет обычные
+    <uid>_response.json / <uid>_BAD_RESPONSE.txt в output_dir.
+    Ответ ремонтируется и проверяется по схеме (response_check.py), UID — custom_id;
+    дозапроса полей здесь нет — оставшиеся ошибки помечаются через check_it.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stats = {"ok": 0, "bad": 0}
+
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                record = json.loads(line)
+                uid = record["custom_id"]
+            except (json.JSONDecodeError, KeyError) as e:
+                logger.error(f"ingest_batch_results: строка {line_no} не разобрана: {e}")
+                stats["bad"] += 1
+                continue
+
+            content = _extract_content(record)
+            if content is None:
+                logger.error(f"ingest_batch_results: запрос uid={uid} завершился ошибкой")
+                bad_path = os.path.join(output_dir, f"{uid}_BAD_RESPONSE.txt")
+                try:
+                    with open(bad_path, "w", encoding="utf-8") as out:
+                        out.write(line)
+                    logger.info(f"Сырой ответ модели сохранён в: {bad_path}")
+                except Exception:
+                    logger.exception(f"Не удалось сохранить сырой ответ модели в файл: {bad_path}")
+                stats["bad"] += 1
+                continue
+
+            checked = check_response(content)
+            json_str = content if checked is None else checked.to_json(uid)
+            json_obj = save_response(json_str, uid, output_dir, uid)
+            stats["ok" if json_obj is not None else "bad"] += 1
+
+    logger.info(f"ingest_batch_results: {results_path} → ok={stats['ok']}, bad={stats['bad']}")
+    return stats
+
+
+def _extract_content(record: Dict[str, Any]) -> Optional[str]:
+    """
+    Достаёт message.content из строки результата Batch API
+    или None, если запрос завершился ошибкой.
+    """
+    if record.get("error"):
+        return None
+    response = record.get("response") or {}
+    if response.get("status_code") != 200:
+        return None
+    try:
+        return response["body"]["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+# ----------------- отправка батча ----------------- #
+
+class BatchBackend(abc.ABC):
+    """
+    Интерфейс отправки батча. OpenAIBatchBackend ходит в Batch API,
+    LocalBatchBackend — файловая заглушка для тестов и отладки.
+    """
+
+    @abc.abstractmethod
+    def submit(self, requests_path: str) -> str:
+        """Отправляет файл запросов, возвращает batch_id."""
+
+    @abc.abstractmethod
+    def status(self, batch_id: str) -> str:
+        """Статус батча: validating / in_progress / completed / failed / ..."""
+
+    @abc.abstractmethod
+    def download_results(self, batch_id: str, results_path: str) -> str:
+        """Сохраняет JSONL с результатами в results_path и возвращает путь."""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    def __init__(self, client: OpenAI, completion_window: str = "24h"):
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, requests_path: str) -> str:
+        with open(requests_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        logger.info(f"OpenAIBatchBackend: батч {batch.id} отправлен (file={input_file.id})")
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def download_results(self, batch_id: str, results_path: str) -> str:
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"Батч {batch_id} ещё не готов: status={batch.status}")
+
+        content = self.client.files.content(batch.output_file_id)
+        with open(results_path, "wb") as f:
+            f.write(content.read())
+
+        # ошибки отдельных запросов OpenAI кладёт в отдельный файл — дописываем их,
+        # чтобы ingest сохранил для них _BAD_RESPONSE.txt
+        if batch.error_file_id:
+            errors = self.client.files.content(batch.error_file_id)
+            with open(results_path, "ab") as f:
+                f.write(errors.read())
+
+        logger.info(f"OpenAIBatchBackend: результаты {batch_id} сохранены в {results_path}")
+        return results_path
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Файловая заглушка Batch API: батч "выполняется" сразу при submit,
+    ответ на каждый запрос формирует responder(body) -> content.
+    Каталог батча: <root_dir>/<batch_id>/{input,output}.jsonl
+    """
+
+    def __init__(self, root_dir: str, responder: Optional[Callable[[Dict[str, Any]], str]] = None):
+        self.root_dir = root_dir
+        self.responder = responder or (lambda body: "{}")
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _dir(self, batch_id: str) -> str:
+        return os.path.join(self.root_dir, batch_id)
+
+    def submit(self, requests_path: str) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        batch_dir = self._dir(batch_id)
+        os.makedirs(batch_dir)
+        shutil.copyfile(requests_path, os.path.join(batch_dir, "input.jsonl"))
+
+        with open(os.path.join(batch_dir, "input.jsonl"), "r", encoding="utf-8") as src, \
+                open(os.path.join(batch_dir, "output.jsonl"), "w", encoding="utf-8") as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                dst.write(json.dumps(self._respond(request), ensure_ascii=False))
+                dst.write("\n")
+
+        logger.info(f"LocalBatchBackend: батч {batch_id} выполнен в {batch_dir}")
+        return batch_id
+
+    def _respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        body = request.get("body", {})
+        return {
+            "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", ""),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": self.responder(body)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                },
+            },
+            "error": None,
+        }
+
+    def status(self, batch_id: str) -> str:
+        if os.path.exists(os.path.join(self._dir(batch_id), "output.jsonl")):
+            return "completed"
+        if os.path.isdir(self._dir(batch_id)):
+            return "in_progress"
+        raise KeyError(f"Батч не найден: {batch_id}")
+
+    def download_results(self, batch_id: str, results_path: str) -> str:
+        shutil.copyfile(os.path.join(self._dir(batch_id), "output.jsonl"), results_path)
+        return results_path
+
+
+# ----------------- CLI ----------------- #
+
+def make_backend(name: str) -> BatchBackend:
+    if name == "local":
+        return LocalBatchBackend(os.getenv("LOCAL_BATCH_DIR", os.path.join(".cache", "batches")))
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        logger.critical("OPENAI_API_KEY не указан в .env")
+        raise RuntimeError("OPENAI_API_KEY не указан в .env")
+    return OpenAIBatchBackend(OpenAI(api_key=api_key))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    output_dir = os.getenv("OUTPUT_DIR", "output_files")
+
+    parser = argparse.ArgumentParser(description="Обработка PDF через OpenAI Batch API")
+    parser.add_argument("--backend", choices=["openai", "local"], default="openai")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("prepare", help="PDF из PDF_INPUT_DIR → JSONL с запросами")
+    p.add_argument("--input-dir", default=os.getenv("PDF_INPUT_DIR", "input_files"))
+    p.add_argument("--out", default=os.path.join(output_dir, DEFAULT_REQUESTS_FILENAME))
+
+    p = sub.add_parser("submit", help="отправить JSONL с запросами, напечатать batch_id")
+    p.add_argument("requests_path", nargs="?", default=os.path.join(output_dir, DEFAULT_REQUESTS_FILENAME))
+
+    p = sub.add_parser("status", help="статус батча")
+    p.add_argument("batch_id")
+
+    p = sub.add_parser("fetch", help="скачать результаты батча и сразу разобрать их")
+    p.add_argument("batch_id")
+    p.add_argument("--out", default=os.path.join(output_dir, DEFAULT_RESULTS_FILENAME))
+
+    p = sub.add_parser("ingest", help="JSONL с результатами → <uid>_response.json")
+    p.add_argument("results_path")
+
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    load_dotenv()
+    args = parse_args(argv)
+    output_dir = os.getenv("OUTPUT_DIR", "output_files")
+    os.makedirs(output_dir, exist_ok=True)
+
+    if args.command == "prepare":
+        pdf_paths = [
+            os.path.join(args.input_dir, f) for f in sorted(os.listdir(args.input_dir))
+            if f.lower().endswith(".pdf")
+        ]
+        if not pdf_paths:
+            logger.error(f"Не найдено ни одного PDF в директории: {args.input_dir}")
+            raise FileNotFoundError(f"Не найдено ни одного PDF в {args.input_dir}")
+        prepare_batch(pdf_paths, args.out)
+        print(args.out)
+
+    elif args.command == "submit":
+        print(make_backend(args.backend).submit(args.requests_path))
+
+    elif args.command == "status":
+        print(make_backend(args.backend).status(args.batch_id))
+
+    elif args.command == "fetch":
+        results_path = make_backend(args.backend).download_results(args.batch_id, args.out)
+        print(ingest_batch_results(results_path, output_dir))
+
+    elif args.command == "ingest":
+        print(ingest_batch_results(args.results_path, output_dir))
+
+
+if __name__ == "__main__":
+    setup_logging()
+    logger = get_logger(__name__)
+
+    logger.info("Приложение запущено (batch.py)")
+
+    main()
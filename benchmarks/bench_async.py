@@ -0,0 +1,82 @@
+"""
+Бенчмарк async-режима main.py против локальной заглушки OpenAI.
+
+Копирует PDF из input_files/ во временную папку (до --docs штук),
+поднимает FakeOpenAIServer с заданной латентностью и прогоняет
+process_pdfs_async с разными лимитами concurrency.
+
+Запуск:
+    python benchmarks/bench_async.py --docs 16 --latency 1.0 --concurrency 1,2,4,8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from benchmarks.fake_openai import FakeOpenAIServer  # noqa: E402
+from logging_config import setup_logging  # noqa: E402
+from main import process_pdfs_async  # noqa: E402
+
+
+def prepare_inputs(source_dir: str, target_dir: str, docs: int):
+    sources = sorted(
+        os.path.join(source_dir, f) for f in os.listdir(source_dir) if f.lower().endswith(".pdf")
+    )
+    if not sources:
+        raise FileNotFoundError(f"Не найдено ни одного PDF в {source_dir}")
+
+    paths = []
+    for i in range(docs):
+        src = sources[i % len(sources)]
+        dst = os.path.join(target_dir, f"{i:05d}_{os.path.basename(src)}")
+        shutil.copyfile(src, dst)
+        paths.append(dst)
+    return paths
+
+
+def run_once(pdf_paths, output_dir, base_url, concurrency):
+    client = AsyncOpenAI(api_key="bench", base_url=base_url, max_retries=0)
+    start = time.perf_counter()
+    results = asyncio.run(process_pdfs_async(pdf_paths, client, output_dir, concurrency))
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for r in results.values() if r is not None)
+    return elapsed, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input-dir", default="input_files")
+    parser.add_argument("--docs", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=1.0, help="задержка ответа заглушки, сек")
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(latency=args.latency) as server:
+        in_dir = os.path.join(tmp, "in")
+        os.makedirs(in_dir)
+        pdf_paths = prepare_inputs(args.input_dir, in_dir, args.docs)
+
+        print(f"docs={args.docs}, latency={args.latency}s, endpoint={server.base_url}")
+        print(f"{'concurrency':>11} | {'wall, s':>8} | {'docs/s':>7} | {'ok':>4}")
+        for level in levels:
+            out_dir = os.path.join(tmp, f"out_{level}")
+            os.makedirs(out_dir)
+            elapsed, ok = run_once(pdf_paths, out_dir, server.base_url, level)
+            print(f"{level:>11} | {elapsed:>8.2f} | {args.docs / elapsed:>7.2f} | {ok:>4}")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    # логи каждого файла мешают читать таблицу результатов
+    logging.getLogger().setLevel(os.getenv("BENCH_LOG_LEVEL", "WARNING"))
+    main()
@@ -0,0 +1,109 @@
+"""
+Бенчмарк DrugResolver: скорость разрешения названий медикаментов в RxCUI.
+
+Поток названий строится из словаря: точные названия и синонимы, названия
+с дозировкой и формой выпуска ("Lisinopril 20 mg tab"), опечатки (1-2 правки)
+и неизвестные названия. Меряется:
+- cold: каждое название впервые (точный поиск + n-граммы/Левенштейн), кэш пуст;
+- warm: поток из --lookups названий с повторами, как в реальных ответах;
+- доля найденных опечаток и доля правильных RxCUI среди них.
+
+Запуск:
+    python benchmarks/bench_drug_resolver.py --lookups 1000000
+"""
+import argparse
+import logging
+import os
+import random
+import string
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from drug_resolver import DrugResolver, load_dictionary_csv  # noqa: E402
+from logging_config import setup_logging  # noqa: E402
+
+
+def misspell(name: str, rng: random.Random, edits: int) -> str:
+    chars = list(name)
+    for _ in range(edits):
+        pos = rng.randrange(len(chars))
+        op = rng.choice(["replace", "insert", "delete", "swap"])
+        if op == "replace":
+            chars[pos] = rng.choice(string.ascii_lowercase)
+        elif op == "insert":
+            chars.insert(pos, rng.choice(string.ascii_lowercase))
+        elif op == "delete" and len(chars) > 1:
+            del chars[pos]
+        elif op == "swap" and pos + 1 < len(chars):
+            chars[pos], chars[pos + 1] = chars[pos + 1], chars[pos]
+    return "".join(chars)
+
+
+def make_names(entries, rng: random.Random, distinct: int):
+    """
+    (название, ожидаемый rxcui или None) — distinct различных названий.
+    """
+    long_entries = [e for e in entries if len(e[0]) >= 8]
+    names = {}
+    while len(names) < distinct:
+        alias, rxcui, _ = rng.choice(entries)
+        kind = rng.random()
+        if kind < 0.4:
+            name = rng.choice([alias, alias.title(), alias.upper()])
+        elif kind < 0.6:
+            name = f"{alias.title()} {rng.choice([5, 10, 20, 40, 100])} {rng.choice(['mg', 'mcg'])} " \
+                   f"{rng.choice(['tab', 'tablet', 'capsule', 'ER', ''])}".strip()
+        elif kind < 0.9:
+            alias, rxcui, _ = rng.choice(long_entries)
+            name = misspell(alias, rng, rng.choice([1, 1, 2]))
+        else:
+            name, rxcui = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12))), None
+        names.setdefault(name, rxcui)
+    return list(names.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dictionary", default=os.path.join(ROOT_DIR, "drug_dictionary.csv"))
+    parser.add_argument("--distinct", type=int, default=5000, help="различных названий в потоке")
+    parser.add_argument("--lookups", type=int, default=1_000_000, help="длина потока для warm-замера")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    entries = load_dictionary_csv(args.dictionary)
+
+    start = time.perf_counter()
+    resolver = DrugResolver(entries)
+    print(f"index: {len(resolver)} терминов, построение {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    names = make_names(entries, rng, args.distinct)
+
+    start = time.perf_counter()
+    results = [resolver.resolve(name) for name, _ in names]
+    cold = time.perf_counter() - start
+    print(f"cold: {len(names) / cold:,.0f} lookups/s ({len(names)} различных названий, кэш пуст)")
+
+    typos = [(r, expected) for (name, expected), r in zip(names, results) if expected is not None]
+    found = [r for r, _ in typos if r is not None]
+    correct = sum(1 for r, expected in typos if r is not None and r.rxcui == expected)
+    unknown = [r for (name, expected), r in zip(names, results) if expected is None]
+    print(f"known names: найдено {len(found) / len(typos):.1%}, правильный rxcui {correct / len(typos):.1%}; "
+          f"неизвестные названия с ложным совпадением: {sum(r is not None for r in unknown)}/{len(unknown)}")
+
+    # реальный поток: частые препараты повторяются (распределение Ципфа)
+    weights = [1 / (i + 1) for i in range(len(names))]
+    stream = rng.choices([name for name, _ in names], weights=weights, k=args.lookups)
+    start = time.perf_counter()
+    for name in stream:
+        resolver.resolve(name)
+    warm = time.perf_counter() - start
+    print(f"warm: {args.lookups / warm:,.0f} lookups/s ({args.lookups} обращений), {resolver.cache_info()}")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    logging.getLogger().setLevel(os.getenv("BENCH_LOG_LEVEL", "WARNING"))
+    main()
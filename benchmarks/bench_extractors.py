@@ -0,0 +1,274 @@
+"""
+Бенчмарк экстракторов reader.py: время, пиковый RSS, страниц/сек, размер вывода.
+
+Каждый (файл, экстрактор) меряется в отдельном процессе, чтобы пиковый RSS
+не смешивался между экстракторами. Кэш текста при замерах не используется.
+
+Файлы: input_files/, other_imput_files/ и синтетические PDF
+на сотни страниц (генерируются PyMuPDF в .cache/bench/).
+
+Запуск:
+    python benchmarks/bench_extractors.py run        # → .cache/bench/bench_results.json
+    python benchmarks/bench_extractors.py run --synthetic-pages 100,400 --repeat 3
+    python benchmarks/bench_extractors.py compare bench_baseline.json .cache/bench/bench_results.json --threshold 0.2
+    python benchmarks/bench_extractors.py run --baseline bench_baseline.json   # run + compare
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_DIRS = ["input_files", "other_imput_files"]
+DEFAULT_EXTRACTORS = ["pypdf", "pdfplumber", "pymupdf", "auto", "form_fields_pypdf"]
+SYNTHETIC_DIR = os.path.join(".cache", "bench")
+DEFAULT_OUT = os.path.join(SYNTHETIC_DIR, "bench_results.json")
+# Сколько ждать один замер, прежде чем убить дочерний процесс
+DEFAULT_TIMEOUT = 600.0
+
+# Направление метрик для compare
+LOWER_IS_BETTER = ("wall_s", "peak_rss_mb")
+HIGHER_IS_BETTER = ("pages_per_s",)
+
+SYNTHETIC_PAGE_LINES = [
+    "Member Information",
+    "Name: Applicant {n}",
+    "Date of Birth: 01-{d:02d}-1970",
+    "Gender: F",
+    'Height: 65"',
+    "Weight: 164 lb",
+    "Prescription Medications",
+    "Are you and/or any of your family members listed above taking prescription medications?",
+    "Name of Medication",
+    "escitalopram",
+    "Dosage (mg/mcrg)",
+    "10 mg",
+    "Frequency",
+    "once a day",
+    "Have you and/or any of your family members listed above seen a medical provider, had treatment or",
+    "receiving ongoing care in the last five years for cancer? (If No, move down to Cardiac or Health",
+    "Disease/Disorder)",
+    "No",
+    "Page {n}",
+]
+
+
+def make_synthetic_pdf(pages: int, out_dir: str = SYNTHETIC_DIR) -> str:
+    """
+    Генерирует PDF на pages страниц с текстом, похожим на анкету. Повторно не пересоздаёт.
+    """
+    import fitz
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"synthetic_{pages}p.pdf")
+    if os.path.exists(path):
+        return path
+
+    doc = fitz.open()
+    for n in range(pages):
+        page = doc.new_page()
+        text = "\n".join(line.format(n=n + 1, d=n % 28 + 1) for line in SYNTHETIC_PAGE_LINES)
+        page.insert_text((56, 72), text, fontsize=10)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def _extract(extractor: str, path: str) -> int:
+    """
+    Запускает экстрактор и возвращает размер вывода в символах.
+    """
+    import reader
+
+    if extractor == "form_fields_pypdf":
+        fields = reader.extract_form_fields_pypdf(path)
+        output = json.dumps(fields, ensure_ascii=False)
+    else:
+        output = reader.TEXT_READERS[extractor](path, use_cache=False)
+    return len(output)
+
+
+def _page_count(path: str) -> int:
+    import fitz
+
+    with fitz.open(path) as doc:
+        return len(doc)
+
+
+def _measure_in_child(extractor: str, path: str, repeat: int, queue) -> None:
+    logging.disable(logging.CRITICAL)  # логи экстракторов не нужны и искажают время
+    try:
+        import reader  # noqa: F401 — импорт библиотек не должен попадать в замер
+        pages = _page_count(path)
+        times = []
+        output_chars = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output_chars = _extract(extractor, path)
+            times.append(time.perf_counter() - start)
+        # ru_maxrss в Linux — килобайты, в macOS — байты
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_rss_mb = rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+        wall = statistics.median(times)
+        queue.put({
+            "ok": True,
+            "pages": pages,
+            "wall_s": round(wall, 4),
+            "wall_min_s": round(min(times), 4),
+            "pages_per_s": round(pages / wall, 2) if wall > 0 else None,
+            "peak_rss_mb": round(peak_rss_mb, 1),
+            "output_chars": output_chars,
+        })
+    except Exception as e:
+        queue.put({"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+
+def measure(extractor: str, path: str, repeat: int, timeout: float = DEFAULT_TIMEOUT):
+    """
+    Замер в дочернем процессе. Если процесс упал (segfault, OOM kill) или не уложился
+    в timeout секунд, замер записывается как неудачный, а не блокирует весь бенчмарк.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure_in_child, args=(extractor, path, repeat, queue))
+    proc.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None:
+        alive = proc.is_alive()
+        try:
+            result = queue.get(timeout=1.0)
+        except queue_module.Empty:
+            if not alive:
+                result = {"ok": False, "error": f"процесс завершился без результата, exitcode={proc.exitcode}"}
+            elif time.monotonic() > deadline:
+                proc.kill()
+                result = {"ok": False, "error": f"таймаут {timeout:g} с"}
+    proc.join()
+    return result
+
+
+def run(args) -> dict:
+    paths = sorted(
+        os.path.join(d, f) for d in args.dirs if os.path.isdir(d)
+        for f in os.listdir(d) if f.lower().endswith(".pdf")
+    )
+    for pages in args.synthetic_pages:
+        paths.append(make_synthetic_pdf(pages))
+
+    results = []
+    print(f"{'file':<36} | {'extractor':<17} | {'pages':>5} | {'wall, s':>8} | "
+          f"{'pages/s':>8} | {'RSS, MB':>8} | {'chars':>8}")
+    for path in paths:
+        for extractor in args.extractors:
+            r = measure(extractor, path, args.repeat, args.timeout)
+            r.update({"file": os.path.relpath(path, ROOT_DIR) if os.path.isabs(path) else path,
+                      "extractor": extractor})
+            results.append(r)
+            if r["ok"]:
+                print(f"{r['file']:<36} | {extractor:<17} | {r['pages']:>5} | {r['wall_s']:>8.3f} | "
+                      f"{r['pages_per_s'] or 0:>8.1f} | {r['peak_rss_mb']:>8.1f} | {r['output_chars']:>8}")
+            else:
+                print(f"{r['file']:<36} | {extractor:<17} | ERROR {r['error']}")
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {args.out}")
+    return report
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Возвращает список регрессий: метрика хуже baseline больше чем на threshold (доля).
+    """
+    base_index = {(r["file"], r["extractor"]): r for r in baseline["results"] if r.get("ok")}
+    regressions = []
+    for r in current["results"]:
+        base = base_index.get((r["file"], r["extractor"]))
+        if base is None or not r.get("ok"):
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            old, new = base.get(metric), r.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            if worse:
+                regressions.append({
+                    "file": r["file"], "extractor": r["extractor"], "metric": metric,
+                    "baseline": old, "current": new, "change_pct": round(change * 100, 1),
+                })
+    return regressions
+
+
+def print_regressions(regressions: list, threshold: float) -> None:
+    if not regressions:
+        print(f"Регрессий нет (порог {threshold:.0%})")
+        return
+    print(f"Регрессии (порог {threshold:.0%}):")
+    for r in regressions:
+        print(f"  {r['file']} / {r['extractor']}: {r['metric']} "
+              f"{r['baseline']} → {r['current']} ({r['change_pct']:+}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run")
+    p.add_argument("dirs", nargs="*", default=DEFAULT_DIRS)
+    p.add_argument("--extractors", type=lambda s: s.split(","), default=DEFAULT_EXTRACTORS)
+    p.add_argument("--synthetic-pages", type=lambda s: [int(x) for x in s.split(",") if x],
+                   default=[100, 300])
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--out", default=DEFAULT_OUT)
+    p.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                   help="секунд на один замер, после чего дочерний процесс убивается")
+    p.add_argument("--baseline", help="после замера сравнить с этим файлом")
+    p.add_argument("--threshold", type=float, default=0.2)
+
+    p = sub.add_parser("compare")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=0.2)
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        current = run(args)
+        if not args.baseline:
+            return 0
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    print_regressions(regressions, args.threshold)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
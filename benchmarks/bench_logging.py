@@ -0,0 +1,147 @@
+"""
+Накладные расходы логирования на 10k записей: раньше и сейчас.
+
+- debug off: вызов logger.debug с f-строкой (строка форматируется всегда)
+  против ленивого logger.debug("...%s", arg) при уровне INFO;
+- info sync: консоль + RotatingFileHandler в вызывающем потоке (как было);
+- info queue: QueueHandler → QueueListener (I/O в фоновом потоке),
+  отдельно время в вызывающем потоке и время до записи последней строки;
+- info json: то же с JsonFormatter;
+- info slow console: консоль, которая тратит --slow-write-ms на каждую запись
+  (терминал или pipe, который читают медленнее, чем пишут);
+- tables: json_to_tables_from_dict по ответам из output_files/ (5 INFO-записей на документ).
+
+Консоль перенаправляется в /dev/null, файл логов — во временный каталог.
+
+Запуск:
+    python benchmarks/bench_logging.py --records 10000
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import logging_config  # noqa: E402
+from tables import json_to_tables_from_dict  # noqa: E402
+
+PER = 10_000
+
+
+class SlowStream:
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def configure(use_queue: bool, log_format: str = "text") -> None:
+    logging_config.setup_logging(use_queue=use_queue, log_format=log_format)
+
+
+def drain() -> None:
+    logging_config._stop_listener()
+
+
+def per_10k(seconds: float, count: int) -> str:
+    return f"{seconds * PER / count * 1000:8.1f} ms"
+
+
+def bench_debug_off(logger: logging.Logger, count: int):
+    logger.setLevel(logging.INFO)
+    uid, name, dosage = "044551191", "Lisiniopril HCTZ", "12.5 -20"
+
+    start = time.perf_counter()
+    for i in range(count):
+        logger.debug(f"build_medication_records: uid={uid}, med_name={name!r}, applicant_id={i}, dosage={dosage!r}")
+    eager = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(count):
+        logger.debug("build_medication_records: uid=%s, med_name=%r, applicant_id=%s, dosage=%r",
+                     uid, name, i, dosage)
+    lazy = time.perf_counter() - start
+    logger.setLevel(logging.NOTSET)
+    return eager, lazy
+
+
+def bench_info(logger: logging.Logger, count: int, use_queue: bool, log_format: str = "text"):
+    configure(use_queue, log_format)
+    start = time.perf_counter()
+    for i in range(count):
+        logger.info("build_medication_records: для uid=%s записей=%d", "044551191", i)
+    caller = time.perf_counter() - start
+    drain()
+    return caller, time.perf_counter() - start
+
+
+def bench_tables(docs, use_queue: bool):
+    configure(use_queue)
+    start = time.perf_counter()
+    for doc in docs:
+        json_to_tables_from_dict(doc)
+    caller = time.perf_counter() - start
+    drain()
+    return caller, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=PER)
+    parser.add_argument("--docs", type=int, default=2000, help="документов для замера tables")
+    parser.add_argument("--slow-write-ms", type=float, default=0.1, help="задержка записи медленной консоли")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    logging_config.LOGGING_CONFIG["handlers"]["console"]["stream"] = devnull
+    logging_config.LOGGING_CONFIG["handlers"]["file"]["filename"] = os.path.join(tmp_dir.name, "app.log")
+    logger = logging.getLogger("bench")
+
+    configure(use_queue=False)
+    eager, lazy = bench_debug_off(logger, args.records)
+    print(f"{'scenario':<28} | {'caller / 10k':>12} | {'until written / 10k':>19}")
+    print(f"{'debug off, f-string':<28} | {per_10k(eager, args.records)} |")
+    print(f"{'debug off, lazy %s':<28} | {per_10k(lazy, args.records)} |")
+
+    for name, use_queue, log_format in (("info sync (text)", False, "text"), ("info queue (text)", True, "text"),
+                                        ("info sync (json)", False, "json"), ("info queue (json)", True, "json")):
+        caller, total = bench_info(logger, args.records, use_queue, log_format)
+        print(f"{name:<28} | {per_10k(caller, args.records)} | {per_10k(total, args.records):>19}")
+
+    console = logging_config.LOGGING_CONFIG["handlers"]["console"]
+    console["stream"] = SlowStream(devnull, args.slow_write_ms / 1000)
+    for name, use_queue in (("info slow console, sync", False), ("info slow console, queue", True)):
+        caller, total = bench_info(logger, args.records, use_queue)
+        print(f"{name:<28} | {per_10k(caller, args.records)} | {per_10k(total, args.records):>19}")
+    console["stream"] = devnull
+
+    templates = []
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "output_files", "*_response.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            templates.append(json.load(f))
+    if templates:
+        docs = [templates[i % len(templates)] for i in range(args.docs)]
+        for name, use_queue in (("tables sync", False), ("tables queue", True)):
+            caller, total = bench_tables(docs, use_queue)
+            print(f"{name + f' ({args.docs} docs)':<28} | {caller:10.2f} s | {total:17.2f} s")
+
+    configure(use_queue=False)
+    devnull.close()
+    tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
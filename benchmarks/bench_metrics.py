@@ -0,0 +1,63 @@
+"""
+Накладные расходы инструментирования этапов (metrics.span).
+
+- disabled: метрики выключены (METRICS_DIR пуст) — span() возвращает общую заглушку;
+- enabled: каждый span пишет строку JSONL и копит длительность для p50/p95;
+- baseline: тот же цикл без span — для сравнения.
+
+Итог печатается в ns на span; для сравнения с реальным этапом: запрос
+в OpenAI — секунды, чтение PDF — десятки миллисекунд.
+
+Запуск:
+    python benchmarks/bench_metrics.py --spans 200000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import metrics  # noqa: E402
+from logging_config import setup_logging  # noqa: E402
+
+
+def loop(count: int, instrumented: bool) -> float:
+    start = time.perf_counter()
+    if instrumented:
+        with metrics.doc_context("044551191"):
+            for i in range(count):
+                with metrics.span("api_call") as s:
+                    s.tag(prompt_tokens=i)
+    else:
+        for i in range(count):
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=200_000)
+    args = parser.parse_args()
+
+    baseline = loop(args.spans, instrumented=False)
+    disabled = loop(args.spans, instrumented=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        metrics.start_run(tmp_dir)
+        enabled = loop(args.spans, instrumented=True)
+        summary = metrics.finish_run()
+
+    print(f"{'scenario':<10} | {'ns / span':>10}")
+    for name, seconds in (("baseline", baseline), ("disabled", disabled), ("enabled", enabled)):
+        print(f"{name:<10} | {seconds / args.spans * 1e9:>10.0f}")
+    print(summary)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    logging.getLogger().setLevel(os.getenv("BENCH_LOG_LEVEL", "WARNING"))
+    main()
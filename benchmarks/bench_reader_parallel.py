@@ -0,0 +1,70 @@
+"""
+Сравнение последовательного и параллельного чтения PDF через pdfplumber.
+
+- per-document: read_pdf_text_pdfplumber vs read_pdf_text_pdfplumber_parallel
+  (страницы одного документа делятся между процессами)
+- batch: цикл read_pdf_text_pdfplumber vs read_many_pdfs_pdfplumber_parallel
+  (много документов одновременно на всех ядрах)
+
+Запуск:
+    python benchmarks/bench_reader_parallel.py --workers 4
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_config import setup_logging  # noqa: E402
+from reader import (  # noqa: E402
+    read_many_pdfs_pdfplumber_parallel,
+    read_pdf_text_pdfplumber,
+    read_pdf_text_pdfplumber_parallel,
+)
+
+DEFAULT_DIRS = ["input_files", "other_imput_files"]
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dirs", nargs="*", default=DEFAULT_DIRS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(d, f) for d in args.dirs if os.path.isdir(d)
+        for f in os.listdir(d) if f.lower().endswith(".pdf")
+    )
+    print(f"files={len(paths)}, workers={args.workers}, cpu_count={os.cpu_count()}")
+
+    print(f"\n{'file':<40} | {'serial, s':>9} | {'parallel, s':>11} | {'speedup':>7} | same")
+    # пул поднимаем один раз, чтобы не мерить время старта процессов на каждом файле
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for path in paths:
+            t_serial, serial = timed(read_pdf_text_pdfplumber, path, use_cache=False)
+            t_parallel, parallel = timed(
+                read_pdf_text_pdfplumber_parallel, path, args.workers,
+                min_pages=1, executor=executor, use_cache=False,
+            )
+            print(f"{path:<40} | {t_serial:>9.2f} | {t_parallel:>11.2f} | "
+                  f"{t_serial / t_parallel:>6.2f}x | {serial == parallel}")
+
+    t_serial, _ = timed(lambda: [read_pdf_text_pdfplumber(p, use_cache=False) for p in paths])
+    t_parallel, _ = timed(read_many_pdfs_pdfplumber_parallel, paths, args.workers, use_cache=False)
+    print(f"\nbatch of {len(paths)} files: serial={t_serial:.2f}s, "
+          f"parallel={t_parallel:.2f}s, speedup={t_serial / t_parallel:.2f}x")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    logging.getLogger().setLevel(os.getenv("BENCH_LOG_LEVEL", "WARNING"))
+    main()
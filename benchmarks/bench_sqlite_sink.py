@@ -0,0 +1,169 @@
+"""
+Бенчмарк SqliteTableSink: скорость вставки и латентность запросов на ~1M строк медикаментов.
+
+Синтетические строки в формате build_main_records / build_medication_records
+пишутся батчами по --batch-docs документов. Во время записи отдельный поток-читатель
+(WAL) выполняет запрос "все аппликанты на escitalopram" и меряет его латентность.
+После загрузки меряются запросы по медикаменту, по check_it за последнюю неделю и по uid.
+
+Запуск:
+    python benchmarks/bench_sqlite_sink.py --docs 100000 --meds-per-doc 10
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_config import setup_logging  # noqa: E402
+from table_store import (  # noqa: E402
+    SqliteTableSink,
+    applicants_on_medication,
+    connect_sqlite_readonly,
+    flagged_since,
+)
+
+MEDICATION_NAMES = [
+    "escitalopram", "lisinopril", "atorvastatin", "metformin", "levothyroxine", "amlodipine",
+    "metoprolol", "omeprazole", "losartan", "gabapentin", "sertraline", "rosuvastatin",
+    "xanax", "ambien", "ibandronate", "albuterol", "prednisone", "insulin glargine",
+]
+
+
+def make_batch(first_doc: int, docs: int, meds_per_doc: int, rng: random.Random):
+    main_rows, med_rows = [], []
+    for n in range(first_doc, first_doc + docs):
+        uid = f"{n:09d}"
+        check_it = rng.random() < 0.1
+        for applicant_id in range(2):
+            main_rows.append({
+                "uid": uid, "check_it": check_it, "reason_checking": "", "status": "", "true_tier": "",
+                "applicant_id": applicant_id, "is_main_applicant": applicant_id == 0,
+                "firstName": "A", "lastName": "B", "midName": "", "phone": "",
+                "gender": rng.choice(["male", "female"]),
+                "dob": f"19{rng.randint(40, 99)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+                "nicotine": False, "weight": float(rng.randint(100, 250)),
+                "height": 65, "heightFt": 5, "heightIn": 5,
+                "medications": pd.NA, "dosages": pd.NA, "dosage_unit": pd.NA, "frequencies": pd.NA,
+                "descriptions": pd.NA, "combine_reasons": pd.NA,
+                "reason_checking_logs": "", "reason_checking_med": "", "reason_checking_dosage_unit": "",
+            })
+        for _ in range(meds_per_doc):
+            med_rows.append({
+                "uid": uid, "applicant_id": rng.randint(0, 1),
+                "medication": rng.choice(MEDICATION_NAMES),
+                "dosage": str(rng.choice([5, 10, 20, 40])), "dosage_unit": "mg",
+                "standardized_dose": "", "standardized_unit": "mg",
+                "check_it": check_it, "reason_checking": "", "reason_checking_dosage_unit": "",
+                "frequency": "Once daily", "description": "",
+            })
+    return pd.DataFrame(main_rows), pd.DataFrame(med_rows)
+
+
+def timed_query(fn, repeat: int):
+    times = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(fn())
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "rows": rows,
+        "p50_ms": round(statistics.median(times) * 1000, 2),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 2),
+    }
+
+
+def reader_loop(path: str, stop: threading.Event, latencies: list):
+    conn = connect_sqlite_readonly(path)
+    while not stop.is_set():
+        start = time.perf_counter()
+        conn.execute(
+            "SELECT count(*) FROM medications WHERE medication = ? COLLATE NOCASE", ("escitalopram",)
+        ).fetchone()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.05)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--meds-per-doc", type=int, default=10)
+    parser.add_argument("--batch-docs", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", help="путь к базе (по умолчанию — временный каталог)")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    path = args.db
+    if path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp_dir.name, "tables.sqlite")
+
+    rng = random.Random(42)
+    sink = SqliteTableSink(path)
+
+    stop = threading.Event()
+    reader_latencies: list = []
+    reader = threading.Thread(target=reader_loop, args=(path, stop, reader_latencies), daemon=True)
+    reader.start()
+
+    write_time = 0.0
+    for first in range(0, args.docs, args.batch_docs):
+        main_df, meds_df = make_batch(first, min(args.batch_docs, args.docs - first), args.meds_per_doc, rng)
+        start = time.perf_counter()
+        sink.write(main_df, meds_df)
+        write_time += time.perf_counter() - start
+    stop.set()
+    reader.join()
+
+    med_rows = sink.conn.execute("SELECT count(*) FROM medications").fetchone()[0]
+    app_rows = sink.conn.execute("SELECT count(*) FROM applications").fetchone()[0]
+    print(f"applications={app_rows}, medications={med_rows}, db={os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"insert: {write_time:.1f}s, {med_rows / write_time:,.0f} med rows/s, "
+          f"{args.docs / write_time:,.0f} docs/s (батч {args.batch_docs} документов)")
+    if reader_latencies:
+        reader_latencies.sort()
+        print(f"reader during writes: queries={len(reader_latencies)}, "
+              f"p50={statistics.median(reader_latencies) * 1000:.1f} ms, max={reader_latencies[-1] * 1000:.1f} ms")
+
+    # upsert уже загруженных документов (повторная обработка)
+    main_df, meds_df = make_batch(0, args.batch_docs, args.meds_per_doc, rng)
+    start = time.perf_counter()
+    sink.write(main_df, meds_df)
+    print(f"re-upsert {args.batch_docs} existing docs: {time.perf_counter() - start:.2f}s")
+    sink.close()
+
+    conn = connect_sqlite_readonly(path)
+    week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+    queries = {
+        "applicants on escitalopram": lambda: applicants_on_medication(conn, "Escitalopram"),
+        "check_it since last week": lambda: flagged_since(conn, week_ago),
+        "by uid": lambda: pd.read_sql_query(
+            "SELECT * FROM medications WHERE uid = ?", conn, params=(f"{args.docs // 2:09d}",)),
+    }
+    print(f"\n{'query':<28} | {'rows':>8} | {'p50, ms':>8} | {'p95, ms':>8}")
+    for name, fn in queries.items():
+        r = timed_query(fn, args.repeat)
+        print(f"{name:<28} | {r['rows']:>8} | {r['p50_ms']:>8} | {r['p95_ms']:>8}")
+    conn.close()
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    logging.getLogger().setLevel(os.getenv("BENCH_LOG_LEVEL", "WARNING"))
+    main()
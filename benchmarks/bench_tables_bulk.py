@@ -0,0 +1,88 @@
+"""
+Сравнение построчного и пакетного преобразования JSON-ответов в таблицы.
+
+- per-file: json_to_tables_from_dict для каждого ответа + pd.concat (как раньше в tables.main)
+- bulk: tables.json_list_to_tables для всего списка
+
+Ответы генерируются из *_response.json в output_files/ (с новыми uid),
+результаты обоих путей сверяются построчно (tables.tables_equal).
+
+Запуск:
+    python benchmarks/bench_tables_bulk.py --docs 10000,100000
+"""
+import argparse
+import copy
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from logging_config import setup_logging  # noqa: E402
+from tables import json_list_to_tables, json_to_tables_from_dict, tables_equal  # noqa: E402
+
+
+def load_templates(source_dir: str):
+    paths = sorted(glob.glob(os.path.join(source_dir, "*_response.json")))
+    if not paths:
+        raise FileNotFoundError(f"Не найдено ни одного *_response.json в {source_dir}")
+    templates = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            templates.append(json.load(f))
+    return templates
+
+
+def make_docs(templates, count: int):
+    docs = []
+    for n in range(count):
+        doc = copy.deepcopy(templates[n % len(templates)])
+        doc["uid"] = f"{n:09d}"
+        docs.append(doc)
+    return docs
+
+
+def per_file(docs):
+    main_dfs, meds_dfs = [], []
+    for doc in docs:
+        main_df, meds_df = json_to_tables_from_dict(doc)
+        main_dfs.append(main_df)
+        meds_dfs.append(meds_df)
+    return pd.concat(main_dfs, ignore_index=True), pd.concat(meds_dfs, ignore_index=True)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=lambda s: [int(x) for x in s.split(",") if x], default=[10_000, 100_000])
+    parser.add_argument("--source-dir", default=os.path.join(ROOT_DIR, "output_files"))
+    args = parser.parse_args()
+
+    templates = load_templates(args.source_dir)
+    print(f"{'docs':>7} | {'main rows':>9} | {'meds rows':>9} | {'per-file, s':>11} | "
+          f"{'bulk, s':>8} | {'speedup':>7} | same")
+    for count in args.docs:
+        docs = make_docs(templates, count)
+        t_old, (old_main, old_meds) = timed(per_file, docs)
+        t_new, (new_main, new_meds) = timed(json_list_to_tables, docs)
+        same = tables_equal(old_main, new_main) and tables_equal(old_meds, new_meds)
+        print(f"{count:>7} | {len(new_main):>9} | {len(new_meds):>9} | {t_old:>11.2f} | "
+              f"{t_new:>8.2f} | {t_old / t_new:>6.1f}x | {same}")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    # построчный путь пишет warning на каждую дозу без единицы — в замер это не нужно
+    logging.getLogger().setLevel(os.getenv("BENCH_LOG_LEVEL", "ERROR"))
+    main()
@@ -0,0 +1,111 @@
+"""
+Локальная заглушка OpenAI Chat Completions API для бенчмарков.
+
+Отвечает на POST /v1/chat/completions (и /chat/completions) фиксированным
+JSON-ответом с искусственной задержкой, имитируя латентность модели.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+FAKE_CONTENT = json.dumps({
+    "uid": "fake",
+    "check_it": False,
+    "reason_checking": "",
+    "applicants": [],
+    "plans": [],
+    "phq": {"medications": [], "issues": [], "conditions": []},
+    "income": 0,
+    "address": {},
+})
+
+
+def _completion_body(content: str, model: str) -> bytes:
+    return json.dumps({
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }).encode("utf-8")
+
+
+class FakeOpenAIServer:
+    """
+    HTTP-сервер в фоновом потоке. Пример:
+
+        with FakeOpenAIServer(latency=0.5) as server:
+            client = AsyncOpenAI(api_key="x", base_url=server.base_url)
+    """
+
+    def __init__(self, latency: float = 0.5, content: str = FAKE_CONTENT,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.content = content
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._host = host
+        self._port = port
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+
+                time.sleep(server.latency)
+                with server._lock:
+                    server.requests_served += 1
+
+                body = _completion_body(server.content, payload.get("model", "fake"))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # не засоряем вывод бенчмарка
+
+        return Handler
+
+    def start(self) -> "FakeOpenAIServer":
+        self._httpd = ThreadingHTTPServer((self._host, self._port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
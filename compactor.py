@@ -0,0 +1,220 @@
+import os
+import re
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+from logging_config import setup_logging, get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken необязателен, без него считаем токены приблизительно
+    tiktoken = None
+
+
+# ----------------- подсчёт токенов ----------------- #
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Количество токенов в тексте. С tiktoken — точно (o200k_base, как у gpt-4.1 / gpt-4o),
+    без него — грубая оценка ~4 символа на токен.
+    """
+    global _encoding
+    if tiktoken is None:
+        return (len(text) + 3) // 4
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+# ----------------- шаги сжатия ----------------- #
+
+_SPACES_RE = re.compile(r"[ \t\u00a0]+")
+_DIGITS_RE = re.compile(r"\d+")
+
+# Слова-маркеры юридического текста (согласия, раскрытие PHI, уведомления о приватности)
+LEGAL_MARKERS_RE = re.compile(
+    r"\b(certif(?:y|icate)|acknowledg\w*|understand|agree\w*|rescind\w*|fraud\w*|"
+    r"misrepresentation|HIPAA|privacy|consent|authoriz\w*|liabilit\w*|disclos\w*|"
+    r"hereby|terms and conditions|membership|managerial)\b",
+    re.IGNORECASE,
+)
+
+# Блок "прозы": подряд идущие длинные строки (перенесённый абзац)
+PROSE_LINE_MIN_CHARS = 60
+PROSE_BLOCK_MIN_LINES = 3
+LEGAL_MARKERS_MIN_HITS = 2
+
+
+def collapse_whitespace(text: str) -> str:
+    """
+    Схлопывает пробелы/табы внутри строк, убирает пробелы по краям строк
+    и оставляет не больше одной пустой строки подряд.
+    """
+    lines = [_SPACES_RE.sub(" ", line).strip() for line in text.splitlines()]
+
+    result: List[str] = []
+    for line in lines:
+        if not line and (not result or not result[-1]):
+            continue
+        result.append(line)
+
+    while result and not result[-1]:
+        result.pop()
+    return "\n".join(result)
+
+
+def _line_signature(line: str) -> str:
+    # номера страниц и даты в колонтитулах меняются, поэтому цифры не учитываем
+    return _DIGITS_RE.sub("#", line.strip().lower())
+
+
+def strip_repeated_headers_footers(pages: List[str], edge_lines: int = 2,
+                                   min_ratio: float = 0.6, min_pages: int = 3) -> List[str]:
+    """
+    Удаляет колонтитулы: строки из первых/последних edge_lines строк страницы,
+    которые (с точностью до цифр) повторяются на >= min_ratio страниц.
+    На документах короче min_pages страниц ничего не делает.
+    """
+    if len(pages) < min_pages:
+        return pages
+
+    split_pages = [page.splitlines() for page in pages]
+    counts: Counter = Counter()
+    for lines in split_pages:
+        edges = lines[:edge_lines] + lines[-edge_lines:]
+        counts.update({_line_signature(line) for line in edges if line.strip()})
+
+    threshold = max(2, int(len(pages) * min_ratio + 0.999))
+    repeated = {sig for sig, n in counts.items() if n >= threshold}
+    if not repeated:
+        return pages
+
+    logger.debug("strip_repeated_headers_footers: колонтитулы=%s", repeated)
+
+    result = []
+    for lines in split_pages:
+        n = len(lines)
+        kept = [
+            line for i, line in enumerate(lines)
+            if not ((i < edge_lines or i >= n - edge_lines) and _line_signature(line) in repeated)
+        ]
+        result.append("\n".join(kept))
+    return result
+
+
+def drop_legal_boilerplate(text: str) -> str:
+    """
+    Удаляет абзацы юридического текста: блоки из >= PROSE_BLOCK_MIN_LINES длинных строк
+    подряд, в которых встречается >= LEGAL_MARKERS_MIN_HITS маркеров (certify, HIPAA, consent ...).
+    Короткие строки (заголовки, вопросы анкеты, ответы) не трогаются.
+    """
+    lines = text.splitlines()
+    result: List[str] = []
+    block: List[str] = []
+
+    def flush():
+        if len(block) >= PROSE_BLOCK_MIN_LINES and \
+                len(LEGAL_MARKERS_RE.findall(" ".join(block))) >= LEGAL_MARKERS_MIN_HITS:
+            logger.debug("drop_legal_boilerplate: удалено строк=%d", len(block))
+        else:
+            result.extend(block)
+        block.clear()
+
+    for line in lines:
+        if len(line) >= PROSE_LINE_MIN_CHARS:
+            block.append(line)
+            continue
+        # короткая строка-хвост абзаца ("the members renewal date.") относится к блоку
+        if block and line and not line.endswith(":") and block[-1][-1:] not in ".:?!":
+            block.append(line)
+            flush()
+            continue
+        flush()
+        result.append(line)
+    flush()
+
+    return "\n".join(result)
+
+
+def compact_text(text: str, drop_legal: bool = True) -> str:
+    """
+    Схлопывает пробелы и пустые строки и (опционально) удаляет юридический boilerplate.
+    """
+    text = collapse_whitespace(text)
+    if drop_legal:
+        text = drop_legal_boilerplate(text)
+    return text
+
+
+def compact_pages(pages: List[str], drop_legal: bool = True) -> str:
+    """
+    Сжимает постраничный текст PDF перед построением промпта:
+    1) убирает повторяющиеся колонтитулы
+    2) схлопывает пробелы и пустые строки
+    3) (опционально) удаляет юридический boilerplate
+    """
+    pages = strip_repeated_headers_footers(pages)
+    return compact_text("\n".join(pages), drop_legal)
+
+
+# ----------------- отчёт ----------------- #
+
+def compaction_report(pdf_paths: List[str]) -> List[Dict[str, object]]:
+    """
+    Для каждого PDF считает токены промпта:
+    - before: как раньше (шаблон и схема дважды вокруг сырого текста)
+    - after: один шаблон вокруг сжатого текста нужных разделов
+      (для длинных документов — сумма по всем запросам-группам)
+    """
+    from main import build_prompt, read_pdf_chunks_for_prompt
+    from reader import read_pdf_pages_pdfplumber
+
+    rows = []
+    for path in pdf_paths:
+        pages = read_pdf_pages_pdfplumber(path)
+        before = count_tokens(build_prompt(build_prompt("\n".join(pages))))
+        after = sum(count_tokens(build_prompt(text)) for text in read_pdf_chunks_for_prompt(path).values())
+        rows.append({
+            "file": os.path.basename(path),
+            "before": before,
+            "after": after,
+            "saved_pct": round(100.0 * (before - after) / before, 1) if before else 0.0,
+        })
+    return rows
+
+
+def print_report(rows: List[Dict[str, object]], exact: Optional[bool] = None) -> None:
+    exact = tiktoken is not None if exact is None else exact
+    print(f"Токены промпта ({'tiktoken' if exact else '~4 символа/токен'}):")
+    print(f"{'file':<28} | {'before':>7} | {'after':>7} | {'saved':>6}")
+    for row in rows:
+        print(f"{row['file']:<28} | {row['before']:>7} | {row['after']:>7} | {row['saved_pct']:>5}%")
+    total_before = sum(r["before"] for r in rows)
+    total_after = sum(r["after"] for r in rows)
+    if total_before:
+        print(f"{'TOTAL':<28} | {total_before:>7} | {total_after:>7} | "
+              f"{round(100.0 * (total_before - total_after) / total_before, 1):>5}%")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    logger = get_logger(__name__)
+
+    # python compactor.py [dir_or_pdf ...]
+    targets = sys.argv[1:] or [os.getenv("PDF_INPUT_DIR", "input_files")]
+    pdf_paths = []
+    for target in targets:
+        if os.path.isdir(target):
+            pdf_paths.extend(
+                os.path.join(target, f) for f in sorted(os.listdir(target)) if f.lower().endswith(".pdf")
+            )
+        else:
+            pdf_paths.append(target)
+
+    print_report(compaction_report(pdf_paths))
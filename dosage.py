@@ -0,0 +1,185 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Сколько различных пар (доза, единица) держать в памяти — строки доз постоянно повторяются
+# (DOSAGE_CACHE_SIZE читается при первом разборе, после load_dotenv; см. _cached_parser)
+_cached_parse_dose: Optional[Callable[[Any, Any], "Dose"]] = None
+
+# ----------------- таблица единиц ----------------- #
+
+# Простые единицы: синоним → (стандартная единица, множитель к стандартной)
+MASS_UNITS: Dict[str, float] = {
+    "mg": 1.0, "mgs": 1.0, "milligram": 1.0, "milligrams": 1.0,
+    "mcg": 0.001, "μg": 0.001, "µg": 0.001, "ug": 0.001, "microgram": 0.001, "micrograms": 0.001,
+    "g": 1000.0, "gm": 1000.0, "gram": 1000.0, "grams": 1000.0,
+}
+VOLUME_UNITS: Dict[str, float] = {
+    "ml": 1.0, "cc": 1.0, "milliliter": 1.0, "milliliters": 1.0,
+    "l": 1000.0, "liter": 1000.0, "liters": 1000.0,
+}
+TIME_UNITS: Dict[str, float] = {
+    "hr": 1.0, "hrs": 1.0, "h": 1.0, "hour": 1.0, "hours": 1.0,
+    "24hr": 24.0, "24hrs": 24.0, "24h": 24.0, "24hours": 24.0, "day": 24.0, "d": 24.0,
+}
+ACTIVITY_UNITS: Dict[str, float] = {
+    "unit": 1.0, "units": 1.0, "u": 1.0, "iu": 1.0, "ius": 1.0,
+    "internationalunit": 1.0, "internationalunits": 1.0,
+}
+
+UNIT_TABLE: Dict[str, Tuple[str, float]] = {
+    **{alias: ("mg", f) for alias, f in MASS_UNITS.items()},
+    **{alias: ("ml", f) for alias, f in VOLUME_UNITS.items()},
+    **{alias: ("unit", f) for alias, f in ACTIVITY_UNITS.items()},
+    "meq": ("meq", 1.0), "milliequivalent": ("meq", 1.0), "milliequivalents": ("meq", 1.0),
+    "%": ("%", 1.0), "percent": ("%", 1.0), "pct": ("%", 1.0),
+}
+
+# Составные единицы "<числитель>/<знаменатель>" (mg/5ml, mcg/hr, units/ml, mg/24hr):
+# стандартная единица и множитель числителя для каждой пары измерений
+_NUMERATORS = {"mg": MASS_UNITS, "unit": ACTIVITY_UNITS, "meq": {"meq": 1.0}}
+_DENOMINATORS = {"ml": VOLUME_UNITS, "hr": TIME_UNITS}
+# скорость (mass/time) принято писать в mcg/hr (пластыри), поэтому масса переводится в mcg
+_RATE_SCALE = {("mg", "hr"): ("mcg/hr", 1000.0)}
+
+# ----------------- грамматика дозы ----------------- #
+
+_NUMBER = r"(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|\.\d+"
+_RANGE_SEP = r"-|–|—|to"
+_COMBO_SEP = r"/|\+|&|and|,"
+_DOSE_RE = re.compile(
+    rf"^\s*(?P<first>{_NUMBER})"
+    rf"(?P<rest>(?:\s*(?:{_RANGE_SEP}|{_COMBO_SEP})\s*(?:{_NUMBER}))*)"
+    rf"\s*(?P<unit>[^\d\s].*)?$",
+    re.I,
+)
+_PART_RE = re.compile(rf"\s*({_RANGE_SEP}|{_COMBO_SEP})\s*({_NUMBER})", re.I)
+_COMPOSITE_RE = re.compile(rf"^(?P<num>[^/]+)/(?P<qty>{_NUMBER})?(?P<den>[^/]+)$")
+_UNIT_NOISE_RE = re.compile(r"[\s.]+")
+
+
+@dataclass(frozen=True)
+class Dose:
+    """
+    Результат нормализации дозы.
+
+    values — значения в стандартной единице (одно, границы диапазона "12.5-20"
+    или компоненты комбинированного препарата "10/12.5");
+    kind — "single" | "range" | "combo"; error — причина, если разобрать не удалось.
+    """
+    values: Tuple[float, ...] = ()
+    unit: Optional[str] = None
+    kind: str = "single"
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+    @cached_property
+    def text(self) -> Optional[str]:
+        """
+        Стандартизованная доза строкой: "20", "0.025", "12.5-20", "10/12.5".
+        """
+        if not self.ok:
+            return None
+        sep = "-" if self.kind == "range" else "/"
+        return sep.join(format_number(v) for v in self.values)
+
+
+def format_number(value: float) -> str:
+    return f"{value:.6g}" if value != int(value) else str(int(value))
+
+
+def _parse_number(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+@lru_cache(maxsize=4096)
+def parse_unit(unit: str) -> Optional[Tuple[str, float]]:
+    """
+    Единица → (стандартная единица, множитель) или None, если единица неизвестна.
+    Понимает синонимы (IU, units, mcg, μg, mL, %), "per" и составные единицы
+    с количеством в знаменателе (mg/5ml → mg/ml × 0.2, mg/24hr → mcg/hr).
+    """
+    key = _UNIT_NOISE_RE.sub("", unit.lower().replace(" per ", "/"))
+    if key in UNIT_TABLE:
+        return UNIT_TABLE[key]
+
+    m = _COMPOSITE_RE.match(key)
+    if not m:
+        return None
+    quantity = _parse_number(m.group("qty")) if m.group("qty") else 1.0
+    if quantity == 0:
+        return None
+    for num_std, num_units in _NUMERATORS.items():
+        if m.group("num") not in num_units:
+            continue
+        for den_std, den_units in _DENOMINATORS.items():
+            if m.group("den") not in den_units:
+                continue
+            std, scale = _RATE_SCALE.get((num_std, den_std), (f"{num_std}/{den_std}", 1.0))
+            return std, num_units[m.group("num")] * scale / (den_units[m.group("den")] * quantity)
+    return None
+
+
+def _parse_dose(dosage: Any, dosage_unit: Any) -> Dose:
+    dosage = "" if dosage is None else str(dosage).strip()
+    dosage_unit = "" if dosage_unit is None else str(dosage_unit).strip()
+    if not dosage:
+        return Dose(error="нет дозы")
+
+    m = _DOSE_RE.match(dosage)
+    if not m:
+        logger.warning("parse_dose: не найдено численное значение в '%s'", dosage)
+        return Dose(error="не найдено численное значение")
+
+    # единица из отдельного поля, иначе — из хвоста дозы ("10 mg")
+    unit_text = dosage_unit or (m.group("unit") or "").strip()
+    if not unit_text:
+        logger.warning("parse_dose: нет единицы у дозы '%s'", dosage)
+        return Dose(error="нет единицы")
+    unit = parse_unit(unit_text)
+    if unit is None:
+        logger.warning("parse_dose: неизвестная единица '%s'", unit_text)
+        return Dose(error="неизвестная единица")
+
+    values = [_parse_number(m.group("first"))]
+    kinds = set()
+    for sep, number in _PART_RE.findall(m.group("rest")):
+        kinds.add("range" if re.fullmatch(_RANGE_SEP, sep, re.I) else "combo")
+        values.append(_parse_number(number))
+    if len(kinds) > 1:
+        logger.warning("parse_dose: диапазон и комбинация одновременно в '%s'", dosage)
+        return Dose(error="неоднозначная доза")
+
+    std_unit, factor = unit
+    return Dose(tuple(v * factor for v in values), std_unit, kinds.pop() if kinds else "single")
+
+
+def _cached_parser() -> Callable[[Any, Any], Dose]:
+    global _cached_parse_dose
+    if _cached_parse_dose is None:
+        _cached_parse_dose = lru_cache(maxsize=int(os.getenv("DOSAGE_CACHE_SIZE", "65536")))(_parse_dose)
+    return _cached_parse_dose
+
+
+def parse_dose(dosage: Any, dosage_unit: Any) -> Dose:
+    """
+    Нормализует дозу к стандартной единице (mg, mg/ml, mcg/hr, unit, ml, meq, %).
+    Результаты запоминаются по паре (доза, единица), DOSAGE_CACHE_SIZE штук.
+    """
+    try:
+        return _cached_parser()(dosage, dosage_unit)
+    except TypeError:  # нехешируемое значение (модель вернула список или объект)
+        return _parse_dose(dosage, dosage_unit)
+
+
+def cache_info():
+    return _cached_parser().cache_info()
@@ -0,0 +1,293 @@
+import csv
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Словарь препаратов: CSV (rxcui,name,synonyms через "|") или RXNCONSO.RRF из выгрузки RxNorm
+# (переопределяется DRUG_DICTIONARY). Настройки DRUG_* читаются при создании резолвера (после load_dotenv):
+# DRUG_FUZZY_MIN — минимальная похожесть (1 - расстояние Левенштейна / длина) для нечёткого совпадения,
+# DRUG_CACHE_SIZE — сколько различных названий держать в кэше разрешения.
+DEFAULT_DRUG_DICTIONARY = "drug_dictionary.csv"
+
+# Нечёткий поиск только для названий не короче этого (иначе слишком много ложных совпадений)
+_FUZZY_MIN_LENGTH = 4
+# Сколько кандидатов по n-граммам проверять расстоянием Левенштейна
+_FUZZY_CANDIDATES = 10
+# Типы терминов RxNorm, которые попадают в словарь из RXNCONSO.RRF
+RRF_TERM_TYPES = {"IN", "PIN", "MIN", "BN", "SY", "TMSY"}
+_RRF_CANONICAL_TYPES = ("IN", "MIN", "PIN", "BN")
+
+# Формы выпуска и пролонгированные формы — на действующее вещество не влияют
+_FORM_WORDS = {
+    "tablet", "tablets", "tab", "tabs", "capsule", "capsules", "cap", "caps", "oral", "po",
+    "er", "xr", "sr", "dr", "xl", "la",
+}
+# Соли при действующем веществе ("losartan potassium", "albuterol sulfate") — отбрасываются,
+# только если кроме них в названии есть другие слова
+_SALT_WORDS = {
+    "hcl", "hydrochloride",
+    "sodium", "potassium", "calcium", "magnesium", "oxalate", "succinate", "tartrate", "besylate",
+    "maleate", "mesylate", "citrate", "fumarate", "sulfate", "acetate", "phosphate", "bromide",
+}
+# Минеральные соли: если название состоит только из этих слов, соль и есть действующее вещество
+# ("Sodium Chloride", "Potassium Chloride", "Calcium", "Magnesium Citrate") — ничего не отбрасывается
+_MINERAL_WORDS = {
+    "sodium", "potassium", "calcium", "magnesium", "zinc", "chloride", "citrate", "carbonate",
+    "bicarbonate", "oxide", "hydroxide", "gluconate", "lactate", "sulfate", "phosphate", "acetate",
+    "bromide", "iodide", "fluoride",
+}
+# Доза — число с единицей измерения; цифры внутри слова ("b12", "d3") — часть названия
+_DOSE_RE = re.compile(r"(?<![a-z0-9])\d+(?:[.,]\d+)?\s*(?:mg|mcg|g|ml|meq|iu|units?|%)(?![a-z0-9])")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Ключ для поиска: нижний регистр, без дозировок, форм выпуска, солей и пунктуации,
+    слова отсортированы ("Lisinopril/HCTZ 20 mg tab" → "hctz lisinopril").
+    """
+    text = _DOSE_RE.sub(" ", name.lower())
+    words = [w for w in _NON_ALNUM_RE.split(text) if w and w not in _FORM_WORDS]
+    if not all(w in _MINERAL_WORDS for w in words):
+        words = [w for w in words if w not in _SALT_WORDS] or words
+    return " ".join(sorted(words))
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a: str, b: str, max_dist: int) -> int:
+    """
+    Расстояние Левенштейна (бит-параллельный алгоритм Майерса/Хиройо: одна строка
+    кодируется битовыми масками, вторая проходится за O(len) целочисленных операций).
+    Если расстояние больше max_dist, возвращается max_dist + 1.
+    """
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    if not a or not b:
+        return max(len(a), len(b))
+
+    peq: Dict[str, int] = {}
+    for i, ch in enumerate(a):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    pv, mv, score = full, 0, len(a)
+    for ch in b:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        pv = ((mh << 1) | ~(xv | ph)) & full
+        mv = ph & xv
+    return score if score <= max_dist else max_dist + 1
+
+
+@dataclass(frozen=True)
+class DrugMatch:
+    rxcui: str
+    name: str
+    score: float = 1.0
+    method: str = "exact"  # exact | fuzzy
+
+
+class DrugResolver:
+    """
+    Разрешение названий медикаментов в каноническое название + RxCUI:
+    1) точное совпадение нормализованного названия (dict);
+    2) нечёткое: кандидаты по общим триграммам, затем расстояние Левенштейна;
+    3) результат запоминается (lru_cache на DRUG_CACHE_SIZE названий).
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, str]], fuzzy_min: Optional[float] = None,
+                 cache_size: Optional[int] = None):
+        """
+        entries — тройки (название или синоним, rxcui, каноническое название);
+        fuzzy_min / cache_size по умолчанию — DRUG_FUZZY_MIN (0.8) / DRUG_CACHE_SIZE (100000).
+        """
+        if fuzzy_min is None:
+            fuzzy_min = float(os.getenv("DRUG_FUZZY_MIN", "0.8"))
+        if cache_size is None:
+            cache_size = int(os.getenv("DRUG_CACHE_SIZE", "100000"))
+        self.fuzzy_min = fuzzy_min
+        self._exact: Dict[str, DrugMatch] = {}
+        # ключ → приоритет записи: каноническое название (1) важнее синонима (0)
+        priority: Dict[str, int] = {}
+        ambiguous: Dict[str, set] = {}
+        for alias, rxcui, canonical in entries:
+            key = normalize_name(alias)
+            if not key:
+                continue
+            rank = int(normalize_name(canonical) == key)
+            current = self._exact.get(key)
+            if key in ambiguous:
+                if rank > priority[key]:
+                    ambiguous.pop(key)
+                else:
+                    if rank == priority[key]:
+                        ambiguous[key].add(str(rxcui))
+                    continue
+            elif current is not None and (current.rxcui == str(rxcui) or rank < priority[key]):
+                continue
+            elif current is not None and rank == priority[key]:
+                ambiguous[key] = {current.rxcui, str(rxcui)}
+                continue
+            self._exact[key] = DrugMatch(str(rxcui), canonical)
+            priority[key] = rank
+
+        # ключ, который одинаково подходит разным RxCUI, не разрешается вовсе:
+        # лучше пустой rxcui, чем чужой
+        for key in ambiguous:
+            del self._exact[key]
+        if ambiguous:
+            examples = ", ".join(f"{key!r}: {sorted(rxcuis)}" for key, rxcuis in list(ambiguous.items())[:5])
+            logger.warning(f"DrugResolver: {len(ambiguous)} названий соответствуют разным RxCUI "
+                           f"и исключены из словаря (например, {examples})")
+
+        self._keys: List[str] = list(self._exact)
+        self._grams: Dict[str, List[int]] = defaultdict(list)
+        for term_id, key in enumerate(self._keys):
+            for gram in _trigrams(key):
+                self._grams[gram].append(term_id)
+
+        self._cached_resolve = lru_cache(maxsize=cache_size)(self._resolve)
+        logger.info(f"DrugResolver: терминов={len(self._keys)}, триграмм={len(self._grams)}")
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "DrugResolver":
+        if path.upper().endswith(".RRF"):
+            return cls(load_rxnconso(path), **kwargs)
+        return cls(load_dictionary_csv(path), **kwargs)
+
+    def resolve(self, name: str) -> Optional[DrugMatch]:
+        """
+        Каноническое название + RxCUI для названия из ответа модели или None.
+        """
+        if not isinstance(name, str):
+            return None
+        return self._cached_resolve(name)
+
+    def cache_info(self):
+        return self._cached_resolve.cache_info()
+
+    def _resolve(self, name: str) -> Optional[DrugMatch]:
+        key = normalize_name(name)
+        if not key:
+            return None
+
+        match = self._exact.get(key)
+        if match is not None:
+            return match
+        if len(key) < _FUZZY_MIN_LENGTH:
+            return None
+        return self._fuzzy(key)
+
+    def _fuzzy(self, key: str) -> Optional[DrugMatch]:
+        grams = _trigrams(key)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for term_id in self._grams.get(gram, ()):
+                shared[term_id] += 1
+        if not shared:
+            return None
+
+        candidates = sorted(shared, key=shared.__getitem__, reverse=True)[:_FUZZY_CANDIDATES]
+        best: Optional[Tuple[float, int]] = None
+        for term_id in candidates:
+            term = self._keys[term_id]
+            length = max(len(key), len(term))
+            # + 1e-9: 1 - 0.8 = 0.19999999999999996, без поправки max_dist на 1 меньше
+            max_dist = int(length * (1 - self.fuzzy_min) + 1e-9)
+            # каждая правка портит не больше 3 триграмм: кандидат с меньшим числом общих
+            # триграмм заведомо дальше max_dist, Левенштейн для него не считаем
+            if shared[term_id] < len(grams) - 3 * max_dist:
+                continue
+            dist = levenshtein(key, term, max_dist)
+            if dist > max_dist:
+                continue
+            score = 1 - dist / length
+            if best is None or score > best[0]:
+                best = (score, term_id)
+
+        if best is None:
+            return None
+        match = self._exact[self._keys[best[1]]]
+        return DrugMatch(match.rxcui, match.name, round(best[0], 3), "fuzzy")
+
+
+# ----------------- загрузка словаря ----------------- #
+
+def load_dictionary_csv(path: str) -> List[Tuple[str, str, str]]:
+    """
+    CSV с колонками rxcui, name, synonyms (синонимы через "|").
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            rxcui, name = row["rxcui"].strip(), row["name"].strip()
+            entries.append((name, rxcui, name))
+            for synonym in (row.get("synonyms") or "").split("|"):
+                if synonym.strip():
+                    entries.append((synonym.strip(), rxcui, name))
+    return entries
+
+
+def load_rxnconso(path: str) -> List[Tuple[str, str, str]]:
+    """
+    RXNCONSO.RRF (RxNorm): английские неподавленные термины SAB=RXNORM
+    с типами из RRF_TERM_TYPES. Каноническое название — IN/MIN/PIN/BN того же RXCUI.
+    """
+    terms: List[Tuple[str, str, str]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("|")
+            # RXCUI|LAT|...|SAB(11)|TTY(12)|CODE|STR(14)|SRL|SUPPRESS(16)|CVF
+            if len(cols) < 17 or cols[1] != "ENG" or cols[11] != "RXNORM":
+                continue
+            if cols[12] not in RRF_TERM_TYPES or cols[16] not in ("", "N"):
+                continue
+            terms.append((cols[0], cols[12], cols[14]))
+
+    rank = {tty: i for i, tty in enumerate(_RRF_CANONICAL_TYPES)}
+    canonical: Dict[str, Tuple[int, str]] = {}
+    for rxcui, tty, text in terms:
+        if tty in rank and (rxcui not in canonical or rank[tty] < canonical[rxcui][0]):
+            canonical[rxcui] = (rank[tty], text)
+    return [(text, rxcui, canonical.get(rxcui, (0, text))[1]) for rxcui, _, text in terms]
+
+
+_resolver: Optional[DrugResolver] = None
+_resolver_loaded = False
+
+
+def get_drug_resolver() -> Optional[DrugResolver]:
+    """
+    Резолвер из DRUG_DICTIONARY (загружается один раз) или None, если файла нет.
+    """
+    global _resolver, _resolver_loaded
+    if not _resolver_loaded:
+        _resolver_loaded = True
+        path = os.getenv("DRUG_DICTIONARY", DEFAULT_DRUG_DICTIONARY)
+        if path and os.path.exists(path):
+            _resolver = DrugResolver.load(path)
+        else:
+            logger.info(f"Словарь препаратов {path!r} не найден, rxcui не заполняется")
+    return _resolver
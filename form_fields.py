@@ -0,0 +1,416 @@
+import copy
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from logging_config import get_logger
+from schema import RESPONSE_NODE, path_hint
+
+logger = get_logger(__name__)
+
+# Файл с маппингом "поле AcroForm → путь в target_json_format" (переопределяется FORM_FIELD_MAP)
+DEFAULT_FORM_FIELD_MAP = "form_field_map.json"
+
+# Части схемы, которые из полей формы обычно не заполнить — их спрашиваем у модели,
+# если маппинг не закрыл их явно (например, чекбоксом "No" через "clears")
+DEFAULT_LLM_PATHS = ["phq.medications", "phq.issues", "phq.conditions"]
+
+# Псевдопуть "все аппликанты, кроме основного" (applicants.1, applicants.2, ...): из полей формы
+# иждивенцы не раскладываются, поэтому их спрашиваем у модели, если маппинг не закрыл путь через "clears"
+DEPENDENTS_PATH = "dependents"
+# Поля ответа, которые заполняются не из формы
+_SERVICE_FIELDS = {"uid", "check_it", "reason_checking"}
+# Поля аппликанта, которые задаются не отдельным путём (индекс, признак основного, части роста)
+_DERIVED_APPLICANT_FIELDS = {"applicant", "is_main_applicant", "heightFt", "heightIn"}
+
+# Подсказки формата для промпта с недостающими полями: по типу поля маппинга
+TYPE_HINTS = {
+    "str": '"string"',
+    "date": '"YYYY-MM-DD"',
+    "gender": '"male" | "female"',
+    "float": "float",
+    "int": "int",
+    "money": "float",
+    "weight": "float",
+    "bool": "bool",
+    "height": '{"height": int, "heightFt": int, "heightIn": int}',
+}
+
+
+def empty_response() -> Dict[str, Any]:
+    """
+    Пустой объект схемы ответа (schema.Response) со значениями по умолчанию.
+    """
+    return RESPONSE_NODE.empty()
+
+
+def empty_applicant(index: int) -> Dict[str, Any]:
+    return {**RESPONSE_NODE.fields["applicants"].item.empty(), "applicant": index, "is_main_applicant": index == 0}
+
+
+def schema_paths() -> List[str]:
+    """
+    Пути схемы ответа, которые заполняются из формы или моделью: поля основного аппликанта
+    (applicants.0.*), иждивенцы (DEPENDENTS_PATH), поля phq и address, plans, income.
+    """
+    paths = []
+    for name, node in RESPONSE_NODE.fields.items():
+        if name in _SERVICE_FIELDS:
+            continue
+        if name == "applicants":
+            paths += [f"applicants.0.{key}" for key in node.item.fields if key not in _DERIVED_APPLICANT_FIELDS]
+            paths.append(DEPENDENTS_PATH)
+        elif node.kind == "object":
+            paths += [f"{name}.{key}" for key in node.fields]
+        else:
+            paths.append(name)
+    return paths
+
+
+def _dependent(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+    applicant = {**empty_applicant(index), **item, "applicant": index, "is_main_applicant": False}
+    if isinstance(applicant["height"], int) and applicant["height"] > 0 and not applicant["heightFt"]:
+        applicant["heightFt"], applicant["heightIn"] = divmod(applicant["height"], 12)
+    return applicant
+
+
+DEPENDENTS_HINT = (f"[{RESPONSE_NODE.fields['applicants'].item.hint()}] — all applicants except the main one, "
+                   f'"applicant": 1, 2, ... in document order')
+
+
+# ----------------- пути вида "applicants.0.dob" ----------------- #
+
+def get_path(data: Any, path: str, default: Any = None) -> Any:
+    node = data
+    for part in path.split("."):
+        if isinstance(node, list) and part.isdigit() and int(part) < len(node):
+            node = node[int(part)]
+        elif isinstance(node, dict) and part in node:
+            node = node[part]
+        else:
+            return default
+    return node
+
+
+def set_path(data: Dict[str, Any], path: str, value: Any) -> None:
+    """
+    Записывает значение по пути, создавая недостающие словари.
+    Элементы applicants создаются целиком по шаблону empty_applicant.
+    """
+    parts = path.split(".")
+    node: Any = data
+    for i, part in enumerate(parts[:-1]):
+        nxt = parts[i + 1]
+        if isinstance(node, list):
+            index = int(part)
+            while len(node) <= index:
+                node.append(empty_applicant(len(node)) if parts[i - 1] == "applicants" else {})
+            node = node[index]
+            continue
+        if part not in node or not isinstance(node[part], (dict, list)):
+            node[part] = [] if nxt.isdigit() else {}
+        node = node[part]
+
+    last = parts[-1]
+    if isinstance(node, list):
+        index = int(last)
+        while len(node) <= index:
+            node.append(None)
+        node[index] = value
+    else:
+        node[last] = value
+
+
+# ----------------- преобразование значений полей ----------------- #
+
+# Числа принимаются только целиком: "10-20", "52k" или "80 kg" в float не превращаются —
+# неразобранный путь уходит модели, а не записывается с неверным значением
+_NUMBER_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*$")
+_MONEY_RE = re.compile(r"^\s*\$?\s*(\d+(?:\.\d+)?)\s*([km])?\s*\+?\s*$", re.I)
+_MONEY_SCALE = {"": 1, "k": 1_000, "m": 1_000_000}
+_WEIGHT_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(lbs?|pounds?|kgs?|kilograms?)?\.?\s*$", re.I)
+KG_TO_LBS = 2.20462
+_DATE_FORMATS = ("%m/%d/%Y", "%m-%d-%Y", "%Y-%m-%d", "%m/%d/%y", "%m-%d-%y", "%m.%d.%Y")
+_FT_IN_RE = re.compile(r"^\s*(\d+)\s*(?:'|ft|feet)\s*(\d+)?\s*(?:\"|''|in|inches)?\s*$", re.I)
+_INCHES_RE = re.compile(r"^\s*(\d+)\s*(?:\"|''|in|inches)?\s*$", re.I)
+_CM_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*cm\s*$", re.I)
+# Рост в дюймах вне этого диапазона — скорее ошибка ввода (например, сантиметры без единицы)
+_HEIGHT_INCHES = range(12, 109)
+
+
+def _to_str(value: str) -> Optional[str]:
+    return value.strip() or None
+
+
+def _to_number(value: str) -> Optional[float]:
+    match = _NUMBER_RE.match(value.replace(",", ""))
+    return float(match.group(1)) if match else None
+
+
+def _to_money(value: str) -> Optional[float]:
+    """
+    $52,000 / 52k / $178641+ → число; прочие суффиксы — None.
+    """
+    match = _MONEY_RE.match(value.replace(",", ""))
+    if not match:
+        return None
+    return float(match.group(1)) * _MONEY_SCALE[(match.group(2) or "").lower()]
+
+
+def _to_weight(value: str) -> Optional[float]:
+    """
+    Вес в фунтах: 190 / 190 lbs; килограммы переводятся в фунты.
+    """
+    match = _WEIGHT_RE.match(value.replace(",", ""))
+    if not match:
+        return None
+    weight = float(match.group(1))
+    if (match.group(2) or "").lower().startswith("k"):
+        weight = round(weight * KG_TO_LBS, 1)
+    return weight
+
+
+def _to_int(value: str) -> Optional[int]:
+    number = _to_number(value)
+    return int(round(number)) if number is not None else None
+
+
+def _to_date(value: str) -> Optional[str]:
+    value = value.strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def _to_gender(value: str) -> Optional[str]:
+    value = value.strip().lower()
+    if value in ("m", "male"):
+        return "male"
+    if value in ("f", "female"):
+        return "female"
+    return None
+
+
+_TRUE_STRINGS = {"yes", "y", "true", "t", "1", "on", "x", "checked"}
+_FALSE_STRINGS = {"no", "n", "false", "f", "0", "off", "unchecked", "none"}
+
+
+def _to_bool(value: str) -> Optional[bool]:
+    # чекбоксы extract_form_fields_pypdf приводит к "Yes"/"No", текстовые поля бывают "Y", "0", "true", ...
+    value = value.strip().lower()
+    if value in _TRUE_STRINGS:
+        return True
+    if value in _FALSE_STRINGS:
+        return False
+    return None
+
+
+def _to_height(value: str) -> Optional[Dict[str, int]]:
+    """
+    5'5" / 5 ft 5 in → фут+дюймы; 66 / 66" — дюймы; 178 cm — переводится в дюймы.
+    Прочие записи ("5-10") и неправдоподобный рост — None.
+    """
+    ft_in, inches_only, cm = _FT_IN_RE.match(value), _INCHES_RE.match(value), _CM_RE.match(value)
+    if ft_in:
+        feet, inches = int(ft_in.group(1)), int(ft_in.group(2) or 0)
+        if inches >= 12:
+            return None
+        total = feet * 12 + inches
+    elif inches_only:
+        total = int(inches_only.group(1))
+    elif cm:
+        total = int(round(float(cm.group(1)) / 2.54))
+    else:
+        return None
+    if total not in _HEIGHT_INCHES:
+        return None
+    feet, inches = divmod(total, 12)
+    return {"height": total, "heightFt": feet, "heightIn": inches}
+
+
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "str": _to_str,
+    "date": _to_date,
+    "gender": _to_gender,
+    "float": _to_number,
+    "money": _to_money,
+    "weight": _to_weight,
+    "int": _to_int,
+    "bool": _to_bool,
+    "height": _to_height,
+}
+
+
+# ----------------- маппинг и предзаполнение ----------------- #
+
+@dataclass
+class FieldRule:
+    field: str
+    path: Optional[str]  # None — чекбокс-вопрос, который только закрывает clears
+    type: str = "str"
+    # пути, которые считаются заполненными пустым списком, если чекбокс = "No"
+    # (например, "Taking prescription medications? No" → phq.medications = [])
+    clears: List[str] = field(default_factory=list)
+
+
+@dataclass
+class FormPrefill:
+    data: Dict[str, Any]
+    resolved: Set[str]
+    missing: List[str]
+    # подсказки формата недостающих путей для промпта (иначе — из FormFieldMap.path_hint)
+    hints: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing
+
+    def to_json(self, uid: str) -> str:
+        data = copy.deepcopy(self.data)
+        data["uid"] = uid
+        return json.dumps(data, ensure_ascii=False)
+
+    def merge_answer(self, answer: Dict[str, Any], uid: str) -> str:
+        """
+        Дописывает в предзаполненный объект ответ модели вида {"<path>": value, ...}.
+        Модель может заполнить только недостающие пути, значения из формы не перезаписываются.
+        """
+        data = copy.deepcopy(self.data)
+        for path in self.missing:
+            if path not in answer:
+                continue
+            value = answer[path]
+            if path == DEPENDENTS_PATH:
+                if isinstance(value, list):
+                    dependents = [item for item in value if isinstance(item, dict)]
+                    data["applicants"] = data.get("applicants", [])[:1] + [
+                        _dependent(i, item) for i, item in enumerate(dependents, start=1)
+                    ]
+            elif path.endswith(".height") and isinstance(value, dict):
+                for key, item in value.items():
+                    set_path(data, path.rsplit(".", 1)[0] + "." + key, item)
+            else:
+                set_path(data, path, value)
+
+        data["check_it"] = bool(data.get("check_it")) or bool(answer.get("check_it"))
+        reason = str(answer.get("reason_checking") or "").strip()
+        if reason:
+            data["reason_checking"] = " | ".join(r for r in (data.get("reason_checking"), reason) if r)
+        data["uid"] = uid
+        return json.dumps(data, ensure_ascii=False)
+
+
+class FormFieldMap:
+    """
+    Маппинг полей AcroForm на пути target_json_format. Формат файла:
+
+    {
+      "fields": {
+        "DOB": {"path": "applicants.0.dob", "type": "date"},
+        "TakingMeds": {"path": "phq.treatment", "type": "bool", "clears": ["phq.medications"]}
+      },
+      "required": ["applicants.0.firstName", "applicants.0.dob"],
+      "llm_paths": ["phq.medications", "phq.issues", "phq.conditions"]
+    }
+
+    required — что должно прийти из формы, иначе это спросят у модели;
+    llm_paths — что всегда спрашивается у модели, если не закрыто через "clears".
+    Остальные пути схемы (schema_paths), не заполненные формой, тоже спрашиваются у модели —
+    в том числе иждивенцы (DEPENDENTS_PATH), которых закрывает только "clears":
+    "HasDependents": {"type": "bool", "clears": ["dependents"]}.
+    Поле без "path" (только "clears") — вопрос формы, у которого нет своего поля в схеме:
+    "IllnessLast5Years": {"type": "bool", "clears": ["phq.conditions"]}.
+    """
+
+    def __init__(self, rules: List[FieldRule], required: List[str], llm_paths: List[str]):
+        self.rules = rules
+        self.required = required
+        self.llm_paths = llm_paths
+
+    @classmethod
+    def load(cls, path: str) -> "FormFieldMap":
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+        rules = []
+        for name, rule in config.get("fields", {}).items():
+            rule_type = rule.get("type", "str")
+            if rule_type not in CONVERTERS:
+                raise ValueError(f"{path}: неизвестный тип {rule_type!r} у поля {name!r}")
+            if not rule.get("path") and not rule.get("clears"):
+                raise ValueError(f"{path}: у поля {name!r} нет ни path, ни clears")
+            if not rule.get("path") and rule_type != "bool":
+                raise ValueError(f"{path}: поле {name!r} без path должно иметь тип bool")
+            rules.append(FieldRule(name, rule.get("path"), rule_type, list(rule.get("clears", []))))
+
+        return cls(rules, list(config.get("required", [])), list(config.get("llm_paths", DEFAULT_LLM_PATHS)))
+
+    @classmethod
+    def from_env(cls) -> Optional["FormFieldMap"]:
+        """
+        Маппинг из FORM_FIELD_MAP или None, если файла нет
+        (тогда быстрый путь через поля формы выключен).
+        """
+        path = os.getenv("FORM_FIELD_MAP", DEFAULT_FORM_FIELD_MAP)
+        if not path or not os.path.exists(path):
+            return None
+        return cls.load(path)
+
+    def prefill(self, fields: Dict[str, Any]) -> Optional[FormPrefill]:
+        """
+        Заполняет пустой target_json_format значениями полей формы.
+        Возвращает None, если ни одно поле маппинга не заполнено
+        (PDF — не форма или форма пустая).
+        """
+        data = empty_response()
+        resolved: Set[str] = set()
+
+        for rule in self.rules:
+            raw = fields.get(rule.field)
+            if raw is None:
+                continue
+            value = CONVERTERS[rule.type](str(raw))
+            if value is None:
+                continue
+
+            if rule.path is None:
+                pass
+            elif rule.type == "height":
+                base = rule.path.rsplit(".", 1)[0]
+                for key, item in value.items():
+                    set_path(data, f"{base}.{key}", item)
+                resolved.add(rule.path)
+            else:
+                set_path(data, rule.path, value)
+                resolved.add(rule.path)
+
+            if value is False:
+                for path in rule.clears:
+                    if path != DEPENDENTS_PATH:
+                        set_path(data, path, [])
+                    resolved.add(path)
+
+        if not resolved:
+            return None
+
+        # пути, не закрытые формой, спрашиваются у модели — иначе, например, иждивенцы
+        # молча пропадут, а medications[].applicant будет ссылаться на несуществующего аппликанта
+        wanted = list(dict.fromkeys(self.required + self.llm_paths + schema_paths()))
+        missing = [path for path in wanted if path not in resolved]
+        return FormPrefill(data, resolved, missing)
+
+    def path_hint(self, path: str) -> str:
+        for rule in self.rules:
+            if rule.path == path:
+                return TYPE_HINTS[rule.type]
+        if path == DEPENDENTS_PATH:
+            return DEPENDENTS_HINT
+        if path.endswith(".height"):
+            return TYPE_HINTS["height"]
+        return path_hint(path, TYPE_HINTS["str"])
@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Состояния документа в журнале
+QUEUED = "queued"        # найден, ещё не обработан
+EXTRACTED = "extracted"  # текст прочитан, промпт готов
+SENT = "sent"            # запрос в OpenAI отправлен
+DONE = "done"            # ответ сохранён в _response.json
+FAILED = "failed"        # последняя попытка завершилась ошибкой
+STATES = (QUEUED, EXTRACTED, SENT, DONE, FAILED)
+
+
+def default_ledger_path(output_dir: str) -> str:
+    return os.getenv("JOB_LEDGER", os.path.join(output_dir, ".job_ledger.sqlite"))
+
+
+class JobLedger:
+    """
+    Журнал обработки PDF (SQLite, WAL): для каждого файла — состояние, число попыток
+    и текст последней ошибки. Каждое изменение коммитится сразу, поэтому после
+    падения процесса видно, какие документы закончены, а какие нет
+    (queued / extracted / sent — прерваны посередине).
+
+    Ключ — абсолютный путь к PDF.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # воркеры async-режима и потоки пула пишут в один журнал
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                pdf_path TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(pdf_path: str) -> str:
+        return os.path.abspath(pdf_path)
+
+    def enqueue(self, pdf_paths: Iterable[str], reset: bool = True) -> None:
+        """
+        Регистрирует PDF запуска. reset=True — обычный запуск: все документы снова queued
+        с нулём попыток; reset=False (--resume) — существующие записи не трогаются.
+        """
+        now = time.time()
+        rows = [(self.key(p), QUEUED, now) for p in pdf_paths]
+        if reset:
+            sql = ("INSERT INTO jobs (pdf_path, state, updated_at) VALUES (?, ?, ?) "
+                   "ON CONFLICT(pdf_path) DO UPDATE SET state = excluded.state, attempts = 0, "
+                   "error = NULL, updated_at = excluded.updated_at")
+        else:
+            sql = "INSERT OR IGNORE INTO jobs (pdf_path, state, updated_at) VALUES (?, ?, ?)"
+        with self._lock, self.conn:
+            self.conn.executemany(sql, rows)
+
+    def pending(self, pdf_paths: Iterable[str], max_attempts: Optional[int] = None) -> List[str]:
+        """
+        PDF, которые ещё нужно обработать: всё, кроме done и документов,
+        упавших max_attempts раз и больше (их пишем в лог).
+        По умолчанию max_attempts — JOB_MAX_ATTEMPTS (3), читается при вызове (после load_dotenv).
+        """
+        if max_attempts is None:
+            max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        states = self.states()
+        result, exhausted = [], []
+        for pdf_path in pdf_paths:
+            state, attempts, _ = states.get(self.key(pdf_path), (QUEUED, 0, None))
+            if state == DONE:
+                continue
+            if state == FAILED and max_attempts > 0 and attempts >= max_attempts:
+                exhausted.append(pdf_path)
+                continue
+            result.append(pdf_path)
+        if exhausted:
+            logger.warning(f"JobLedger: пропущено {len(exhausted)} PDF, упавших {max_attempts} раз и больше "
+                           f"(например, {exhausted[0]}); ошибки — в {self.path}")
+        return result
+
+    def begin(self, pdf_path: str) -> None:
+        """
+        Начало очередной попытки обработки документа.
+        """
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (pdf_path, state, attempts, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(pdf_path) DO UPDATE SET state = excluded.state, attempts = attempts + 1, "
+                "error = NULL, updated_at = excluded.updated_at",
+                (self.key(pdf_path), QUEUED, time.time()),
+            )
+
+    def mark(self, pdf_path: str, state: str, error: Optional[str] = None) -> None:
+        if state not in STATES:
+            raise ValueError(f"Неизвестное состояние {state!r}, доступны: {STATES}")
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (pdf_path, state, error, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(pdf_path) DO UPDATE SET state = excluded.state, error = excluded.error, "
+                "updated_at = excluded.updated_at",
+                (self.key(pdf_path), state, error, time.time()),
+            )
+
+    def states(self) -> Dict[str, tuple]:
+        """
+        {pdf_path: (state, attempts, error)}.
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT pdf_path, state, attempts, error FROM jobs").fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+def mark_job(ledger: Optional[JobLedger], pdf_path: str, state: str, error: Optional[str] = None) -> None:
+    """
+    ledger.mark, если журнал включён.
+    """
+    if ledger is not None:
+        ledger.mark(pdf_path, state, error)
@@ -1,9 +1,14 @@
 
+import atexit
+import copy
+import json
 import os
+import queue
 import sys
 import logging
 import logging.config
 import logging.handlers
+from datetime import datetime, timezone
 
 # --- Базовые пути ---
 
@@ -17,6 +22,11 @@ if not os.path.exists(LOG_DIR):
 
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
 
+# Запись в консоль и файл в отдельном потоке (QueueHandler → QueueListener)
+LOG_QUEUE = os.getenv("LOG_QUEUE", "1").lower() not in ("0", "false", "no")
+# Формат записей: text (как раньше) или json (одна JSON-строка на запись)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
 
 # --- Конфиг логирования ---
 
@@ -55,8 +65,114 @@ LOGGING_CONFIG = {
 }
 
 
-def setup_logging() -> None:
-    logging.config.dictConfig(LOGGING_CONFIG)
+# Стандартные атрибуты LogRecord: всё остальное пришло через extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Одна запись — одна JSON-строка: ts, level, logger, message, поля из extra={...}
+    и exc_info (текст traceback), если есть.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:  # traceback уже превращён в текст в _QueueHandler.prepare
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Стандартный QueueHandler склеивает traceback с текстом сообщения;
+    здесь сообщение и traceback готовятся отдельно (message / exc_text),
+    чтобы форматтеры в потоке listener-а оформили их как обычно.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_plain_formatter = logging.Formatter()
+
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # дописывает всё, что осталось в очереди
+        _listener = None
+
+
+def _install_queue(root: logging.Logger) -> None:
+    """
+    Переносит обработчики root в QueueListener, а в root оставляет один QueueHandler:
+    вызывающий поток только кладёт запись в очередь, форматирование и I/O — в потоке listener-а.
+    """
+    global _listener
+    handlers = list(root.handlers)
+    log_queue: queue.Queue = queue.Queue(-1)
+    root.handlers = [_QueueHandler(log_queue)]
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def setup_logging(use_queue: bool | None = None, log_format: str | None = None) -> None:
+    """
+    Настраивает логирование по LOGGING_CONFIG.
+
+    use_queue — писать в консоль/файл в фоновом потоке (по умолчанию LOG_QUEUE);
+    log_format — "text" или "json" (по умолчанию LOG_FORMAT).
+    """
+    use_queue = LOG_QUEUE if use_queue is None else use_queue
+    log_format = LOG_FORMAT if log_format is None else log_format
+    if log_format not in ("text", "json"):
+        raise ValueError(f"LOG_FORMAT должен быть text или json, получено {log_format!r}")
+
+    _stop_listener()
+    config = LOGGING_CONFIG
+    if log_format == "json":
+        # копии словарей, а не deepcopy: в конфиге лежит объект sys.stdout
+        config = {
+            **LOGGING_CONFIG,
+            "formatters": {**LOGGING_CONFIG["formatters"], "json": {"()": JsonFormatter}},
+            "handlers": {name: {**h, "formatter": "json"} for name, h in LOGGING_CONFIG["handlers"].items()},
+        }
+    logging.config.dictConfig(config)
+
+    if use_queue:
+        _install_queue(logging.getLogger())
+
+
+def _after_fork_in_child() -> None:
+    # в дочернем процессе (пул чтения PDF) потока listener-а нет: пишем напрямую
+    global _listener
+    if _listener is not None:
+        logging.getLogger().handlers = list(_listener.handlers)
+        _listener = None
+
+
+atexit.register(_stop_listener)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
 
 
 def get_logger(name: str | None = None) -> logging.Logger:
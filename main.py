@@ -1,37 +1,93 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, AuthenticationError
 import os, sys, json
+import argparse
+import asyncio
+import contextvars
+from typing import Callable, Dict, Any, List, Optional
 from dotenv import load_dotenv
-import re
-from reader import read_pdf_text_pdfplumber
-from prompt import prompt_template, target_json_format
+from reader import PAGE_READERS, extract_form_fields_pypdf
+from compactor import compact_text, count_tokens, strip_repeated_headers_footers
+from sections import SECTION_GROUPS, SectionIndex, merge_partial_json_strings, split_for_prompt
+from concurrent.futures import ThreadPoolExecutor
+from prompt import missing_fields_prompt_template, prompt_template, target_json_format
 from logging_config import setup_logging, get_logger
+from response_cache import ResponseCache, make_cache_key
+from form_fields import FormFieldMap, FormPrefill
+from schema import RESPONSE_NODE, response_format
+from response_check import check_response, repair_json, response_reask
+from job_ledger import DONE, EXTRACTED, FAILED, SENT, JobLedger, default_ledger_path, mark_job
+from retry import get_openai_retry
+from metrics import (doc_context, enabled as metrics_enabled, print_summary as print_metrics_summary,
+                     set_doc_tags, span, start_run, usage_tags)
+
+logger = get_logger(__name__)
+
+# Сколько запросов к OpenAI может одновременно находиться "в полёте" в async-режиме
+DEFAULT_MAX_CONCURRENCY = 4
+
+# strict JSON Schema ответа для OPENAI_STRUCTURED_OUTPUT=1
+RESPONSE_FORMAT = response_format(RESPONSE_NODE)
+
+# Маппинг полей AcroForm → target_json_format (None, если файла FORM_FIELD_MAP нет)
+_form_field_map: Optional[FormFieldMap] = None
+_form_field_map_loaded = False
+
+
+def get_form_field_map() -> Optional[FormFieldMap]:
+    """
+    Маппинг из FORM_FIELD_MAP; загружается при первом обращении, то есть уже после load_dotenv.
+    """
+    global _form_field_map, _form_field_map_loaded
+    if not _form_field_map_loaded:
+        _form_field_map = FormFieldMap.from_env()
+        _form_field_map_loaded = True
+    return _form_field_map
+
+
+def pdf_extractor() -> str:
+    """
+    Экстрактор текста: pdfplumber (по умолчанию) или auto (PyMuPDF + pdfplumber только для плохих страниц).
+    Читается при каждом вызове, чтобы действовало значение из .env (load_dotenv в main()).
+    """
+    return os.getenv("PDF_EXTRACTOR", "pdfplumber")
+
 
 def build_prompt(pdf_text: str) -> str:
     """
     Подставляет JSON-схему и текст PDF в prompt_template из prompt.py.
     В prompt_template используются плейсхолдеры {target_json_format} и {pdf_text}.
     """
-    return prompt_template.format(
-        target_json_format=target_json_format,
-        pdf_text=pdf_text,
-    )
+    with span("build_prompt"):
+        return prompt_template.format(
+            target_json_format=target_json_format,
+            pdf_text=pdf_text,
+        )
 
 
-def run_extraction_prompt(pdf_text: str, client: OpenAI, uid: str) -> str:
+def extraction_response_format() -> Dict[str, Any]:
     """
-    Отправляет текст PDF в модель OpenAI и возвращает JSON-строку.
-    Вставляет UID в результат.
+    response_format запроса на извлечение документа: strict JSON Schema из schema.py
+    при OPENAI_STRUCTURED_OUTPUT=1 (ответ гарантированно валиден по схеме), иначе json_object.
     """
-    prompt = build_prompt(pdf_text)
+    if os.getenv("OPENAI_STRUCTURED_OUTPUT", "0") == "1":
+        return RESPONSE_FORMAT
+    return {"type": "json_object"}
+
 
+def build_request_kwargs(prompt: str, response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Собирает параметры запроса chat.completions для готового промпта.
+    Используется и синхронным, и асинхронным режимом.
+    response_format по умолчанию — json_object (например, для дозапроса отдельных полей).
+    """
     model = os.getenv("OPENAI_MODEL", "gpt-4.1-mini") # fallback
     temperature = float(os.getenv("OPENAI_TEMPERATURE", "0.2")) # fallback
 
-    response = client.chat.completions.create(
-        model=model,
-        temperature=temperature,
-        response_format={"type": "json_object"},
-        messages=[
+    return {
+        "model": model,
+        "temperature": temperature,
+        "response_format": response_format or {"type": "json_object"},
+        "messages": [
             {
                 "role": "system",
                 "content": "You extract structured data from messy medical PDFs.",
@@ -41,56 +97,128 @@ def run_extraction_prompt(pdf_text: str, client: OpenAI, uid: str) -> str:
                 "content": prompt,
             },
         ],
-    )
-    json_str = response.choices[0].message.content
-    json_str = re.sub(
-        r'"uid"\s*:\s*"[^"]*"',
-        f'"uid": "{uid}"',
-        json_str,
-        count=1
-    )
-    return json_str
+    }
 
-def process_pdf(pdf_path: str, client: OpenAI, output_dir: str):
+
+def _cache_store(cache: Optional[ResponseCache], key: Optional[str], json_str: str) -> None:
     """
-    Обрабатывает один PDF-файл:
-    - читает текст
-    - генерирует промпт
-    - отправляет в ChatGPT
-    - получает JSON-ответ
-    - сохраняет ответ в .json
+    Кладёт ответ в кэш, только если из него получается JSON-объект (с локальным ремонтом):
+    неразборчивый ответ при следующем запуске должен быть запрошен заново.
     """
+    if cache is None or key is None:
+        return
+    if repair_json(json_str)[0] is None:
+        logger.warning("Невалидный JSON от модели не кладём в кэш")
+        return
+    cache.put(key, json_str)
 
-    if not os.path.exists(pdf_path):
-        logger.error("Файл не найден: %s", pdf_path)
 
-        return
+def _message_text(response: Any) -> str:
+    """
+    Текст ответа модели; при отказе (structured output) — пустая строка.
+    """
+    message = response.choices[0].message
+    if message.content is None:
+        logger.warning(f"Модель не вернула ответ: {getattr(message, 'refusal', None)!r}")
+        return ""
+    return message.content
+
+
+def complete_prompt(prompt: str, client: OpenAI, cache: Optional[ResponseCache] = None,
+                    key_text: Optional[str] = None, response_format: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Отправляет готовый промпт в модель и возвращает сырой ответ (JSON-строку).
+    Если передан cache — сначала ищет ответ в кэше по key_text (по умолчанию — сам промпт).
+    """
+    request = build_request_kwargs(prompt, response_format)
+
+    key = None
+    if cache is not None:
+        key = make_cache_key(prompt if key_text is None else key_text,
+                             request["model"], request["temperature"], request["response_format"]["type"])
+        with span("cache_lookup") as s:
+            cached = cache.get(key)
+            s.tag(hit=cached is not None)
+        if cached is not None:
+            return cached
+
+    with span("api_call") as s:
+        response = get_openai_retry().call(lambda: client.chat.completions.create(**request))
+        s.tag(**usage_tags(response))
+    json_str = _message_text(response)
+    _cache_store(cache, key, json_str)
+    return json_str
+
+
+async def complete_prompt_async(prompt: str, client: AsyncOpenAI, cache: Optional[ResponseCache] = None,
+                                key_text: Optional[str] = None,
+                                response_format: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Асинхронный вариант complete_prompt для AsyncOpenAI.
+    """
+    request = build_request_kwargs(prompt, response_format)
+
+    key = None
+    if cache is not None:
+        key = make_cache_key(prompt if key_text is None else key_text,
+                             request["model"], request["temperature"], request["response_format"]["type"])
+        with span("cache_lookup") as s:
+            cached = await asyncio.to_thread(cache.get, key)
+            s.tag(hit=cached is not None)
+        if cached is not None:
+            return cached
+
+    with span("api_call") as s:
+        response = await get_openai_retry().call_async(lambda: client.chat.completions.create(**request))
+        s.tag(**usage_tags(response))
+    json_str = _message_text(response)
+    await asyncio.to_thread(_cache_store, cache, key, json_str)
+    return json_str
 
-    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
 
-    logger.info(f"\n=== Обрабатываем PDF через pdfplumber: {pdf_path} ===")
+def run_extraction_prompt(pdf_text: str, client: OpenAI,
+                          cache: Optional[ResponseCache] = None) -> str:
+    """
+    Отправляет текст PDF в модель OpenAI и возвращает JSON-строку
+    (UID файла проставляет check_and_reask после разбора ответа).
+    Если передан cache — сначала ищет готовый ответ в кэше.
+    """
+    return complete_prompt(build_prompt(pdf_text), client, cache, key_text=pdf_text,
+                           response_format=extraction_response_format())
 
 
-    pdf_text = read_pdf_text_pdfplumber(pdf_path) # Читаем PDF
-    prompt_text = build_prompt(pdf_text) # Строим промпт
+async def run_extraction_prompt_async(pdf_text: str, client: AsyncOpenAI,
+                                      cache: Optional[ResponseCache] = None) -> str:
+    """
+    Асинхронный вариант run_extraction_prompt для AsyncOpenAI.
+    """
+    return await complete_prompt_async(build_prompt(pdf_text), client, cache, key_text=pdf_text,
+                                       response_format=extraction_response_format())
 
-    # Сохраняем промпт (для отладки)
+
+def save_prompt(prompt_text: str, output_dir: str, base_name: str) -> None:
+    """
+    Сохраняет промпт в <base_name>_prompt.txt (для отладки).
+    """
     prompt_output_path = os.path.join(output_dir, f"{base_name}_prompt.txt")
     try:
-        with open(prompt_output_path, "w", encoding="utf-8") as f:
+        with span("write_prompt"), open(prompt_output_path, "w", encoding="utf-8") as f:
             f.write(prompt_text)
             logger.info(f"Промпт сохранён в: {prompt_output_path}" )
     except Exception:
         logger.exception(f"Не удалось сохранить промпт в файл: {prompt_output_path}")
 
-    # Отправляем запрос в модель
-    uid = os.path.splitext(os.path.basename(pdf_path))[0]
-    logger.info(f"Отправляем запрос в OpenAI для файла: {pdf_path} (uid={uid})")
-    json_str = run_extraction_prompt(prompt_text, client, uid)
 
+def save_response(json_str: str, pdf_path: str, output_dir: str, base_name: str):
+    """
+    Парсит ответ модели и сохраняет его в <base_name>_response.json.
+    Если JSON невалидный — сохраняет сырой ответ в <base_name>_BAD_RESPONSE.txt
+    и возвращает None.
+    """
     # Конвертируем строку → JSON (dict)
     try:
-        json_obj = json.loads(json_str)
+        with span("parse_json"):
+            json_obj = json.loads(json_str)
     except json.JSONDecodeError:
         logger.exception(
             f"Модель вернула невалидный JSON для файла {pdf_path}. "
@@ -103,12 +231,12 @@ def process_pdf(pdf_path: str, client: OpenAI, output_dir: str):
             logger.info(f"Сырой ответ модели сохранён в: {bad_path}")
         except Exception:
             logger.exception(f"Не удалось сохранить сырой ответ модели в файл: {bad_path}")
-        return
+        return None
 
     # Сохраняем красивый JSON
     response_output_path = os.path.join(output_dir, f"{base_name}_response.json")
     try:
-        with open(response_output_path, "w", encoding="utf-8") as f:
+        with span("write_response"), open(response_output_path, "w", encoding="utf-8") as f:
             json.dump(json_obj, f, ensure_ascii=False, indent=2)
         logger.info(f"JSON сохранён в: {response_output_path}")
     except Exception:
@@ -117,26 +245,502 @@ def process_pdf(pdf_path: str, client: OpenAI, output_dir: str):
     return json_obj
 
 
+def read_pdf_chunks_for_prompt(pdf_path: str, compact: bool = True,
+                               split_min_pages: Optional[int] = None) -> Dict[str, str]:
+    """
+    Читает PDF (экстрактор pdf_extractor()) и готовит текст для промпта:
+    - убирает колонтитулы и оставляет только разделы, нужные схеме (sections.py)
+    - сжимает текст: пробелы, юридический boilerplate (compactor.py)
+    - документы от split_min_pages страниц (по умолчанию SECTION_SPLIT_MIN_PAGES, 40)
+      делит на группы разделов, каждая группа уходит в модель отдельным запросом
+
+    Returns:
+        dict: {имя_группы: текст}; для обычного документа одна группа "document"
+    """
+    if split_min_pages is None:
+        split_min_pages = int(os.getenv("SECTION_SPLIT_MIN_PAGES", "40"))
+    extractor = pdf_extractor()
+    if extractor not in PAGE_READERS:
+        raise ValueError(f"Неизвестный PDF_EXTRACTOR={extractor!r}, доступны: {list(PAGE_READERS)}")
+    with span("read_pdf", extractor=extractor) as s:
+        pages = PAGE_READERS[extractor](pdf_path)
+        s.tag(pages=len(pages))
+    set_doc_tags(pages=len(pages))
+    raw_text = "\n".join(pages)
+    if not compact:
+        return {"document": raw_text}
+
+    with span("prepare_text"):
+        pages = strip_repeated_headers_footers(pages)
+        groups = split_for_prompt(pages, split_min_pages)
+        if groups is None:
+            groups = {"document": SectionIndex.from_pages(pages).relevant_text()}
+
+        chunks = {name: compact_text(text) for name, text in groups.items()}
+    logger.info(
+        f"Сжатие текста {os.path.basename(pdf_path)}: "
+        f"токенов {count_tokens(raw_text)} → {sum(count_tokens(t) for t in chunks.values())}, "
+        f"запросов={len(chunks)}"
+    )
+    return chunks
+
+
+def read_pdf_for_prompt(pdf_path: str, compact: bool = True) -> str:
+    """
+    Текст PDF для одного запроса (без деления на группы разделов).
+    """
+    return read_pdf_chunks_for_prompt(pdf_path, compact, split_min_pages=sys.maxsize)["document"]
+
+
+def build_chunks_prompt(chunks: Dict[str, str]) -> str:
+    """
+    Промпт(ы) для сохранения в _prompt.txt: для нескольких групп — все подряд.
+    """
+    if len(chunks) == 1:
+        return build_prompt(next(iter(chunks.values())))
+    return "\n\n".join(
+        f"===== section group: {name} =====\n{build_prompt(text)}" for name, text in chunks.items()
+    )
+
+
+def run_chunked_extraction(chunks: Dict[str, str], client: OpenAI,
+                           cache: Optional[ResponseCache] = None) -> str:
+    """
+    Один запрос для обычного документа; для длинного — параллельные запросы
+    по группам разделов и слияние частичных JSON в один объект.
+    """
+    if len(chunks) == 1:
+        return run_extraction_prompt(next(iter(chunks.values())), client, cache)
+
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        # copy_context: теги документа для метрик видны и в потоках пула
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, run_extraction_prompt, text, client, cache)
+            for name, text in chunks.items()
+        }
+        parts = {name: future.result() for name, future in futures.items()}
+
+    return merge_partial_json_strings(parts)
+
+
+async def run_chunked_extraction_async(chunks: Dict[str, str], client: AsyncOpenAI,
+                                       cache: Optional[ResponseCache] = None) -> str:
+    """
+    Асинхронный вариант run_chunked_extraction.
+    """
+    if len(chunks) == 1:
+        return await run_extraction_prompt_async(next(iter(chunks.values())), client, cache)
+
+    names = list(chunks)
+    results = await asyncio.gather(
+        *(run_extraction_prompt_async(chunks[name], client, cache) for name in names)
+    )
+    return merge_partial_json_strings(dict(zip(names, results)))
+
+
+def prefill_from_form(pdf_path: str) -> Optional[FormPrefill]:
+    """
+    Заполняет target_json_format из полей AcroForm по маппингу FORM_FIELD_MAP.
+    None — маппинга нет, PDF не форма или ни одно поле маппинга не заполнено.
+    """
+    form_field_map = get_form_field_map()
+    if form_field_map is None:
+        return None
+    try:
+        with span("read_form"):
+            fields = extract_form_fields_pypdf(pdf_path)
+    except Exception:
+        logger.exception(f"Не удалось прочитать поля формы: {pdf_path}")
+        return None
+    if not fields:
+        return None
+
+    prefill = form_field_map.prefill(fields)
+    if prefill is not None:
+        logger.info(f"Поля формы {pdf_path}: заполнено путей={len(prefill.resolved)}, "
+                    f"у модели спрашиваем: {prefill.missing or 'ничего'}")
+    return prefill
 
-def main():
-    load_dotenv() # Загружаем переменные окружения (.env)
 
+def build_missing_fields_prompt(pdf_text: str, prefill: FormPrefill) -> str:
+    """
+    Короткий промпт для формы: уже известные данные + список недостающих путей.
+    """
+    fields = "\n".join(
+        f"   - {path}: {prefill.hints.get(path) or get_form_field_map().path_hint(path)}" for path in prefill.missing
+    )
+    return missing_fields_prompt_template.format(
+        known_json=json.dumps(prefill.data, ensure_ascii=False),
+        fields=fields,
+        pdf_text=pdf_text,
+    )
+
+
+def merge_missing_fields_answer(json_str: str, prefill: FormPrefill, uid: str) -> str:
+    """
+    Сливает ответ модели с предзаполненными полями. Невалидный ответ
+    возвращается как есть, чтобы save_response сохранил его в _BAD_RESPONSE.txt.
+    """
+    try:
+        answer = json.loads(json_str)
+    except (TypeError, json.JSONDecodeError):
+        return json_str
+    if not isinstance(answer, dict):
+        return json_str
+    return prefill.merge_answer(answer, uid)
+
+
+def run_form_extraction(prefill: FormPrefill, pdf_text: str, client: OpenAI, uid: str,
+                        cache: Optional[ResponseCache] = None) -> str:
+    """
+    Спрашивает у модели только недостающие поля формы и сливает ответ с предзаполненными.
+    """
+    json_str = complete_prompt(build_missing_fields_prompt(pdf_text, prefill), client, cache)
+    return merge_missing_fields_answer(json_str, prefill, uid)
+
+
+async def run_form_extraction_async(prefill: FormPrefill, pdf_text: str, client: AsyncOpenAI, uid: str,
+                                    cache: Optional[ResponseCache] = None) -> str:
+    """
+    Асинхронный вариант run_form_extraction.
+    """
+    json_str = await complete_prompt_async(build_missing_fields_prompt(pdf_text, prefill), client, cache)
+    return merge_missing_fields_answer(json_str, prefill, uid)
+
+
+def reask_text(chunks: Dict[str, str], paths: List[str]) -> str:
+    """
+    Текст PDF для дозапроса полей: у длинного документа — только группы разделов,
+    отвечающие за эти поля верхнего уровня (SECTION_GROUPS).
+    """
+    if len(chunks) > 1:
+        top_keys = {path.split(".", 1)[0] for path in paths}
+        texts = [text for name, text in chunks.items()
+                 if top_keys & set(SECTION_GROUPS.get(name, {}).get("keys", []))]
+        if texts:
+            return "\n".join(texts)
+    return "\n".join(chunks.values())
+
+
+def check_and_reask(json_str: str, chunks: Optional[Dict[str, str]], client: OpenAI, uid: str,
+                    cache: Optional[ResponseCache] = None) -> str:
+    """
+    Ремонтирует ответ модели, проверяет его по схеме (response_check.py) и проставляет UID файла.
+    Поля, не прошедшие проверку, дозапрашиваются у модели (не больше RESPONSE_REASK раз),
+    а не весь документ заново. Без chunks (ответ из полей формы) дозапроса нет.
+    Неразборчивый ответ возвращается как есть — save_response сохранит его в _BAD_RESPONSE.txt.
+    """
+    with span("validate"):
+        result = check_response(json_str)
+    if result is None:
+        return json_str
+    for _ in range(response_reask()):
+        if not result.errors or not chunks:
+            break
+        prefill = result.reask_prefill()
+        logger.info(f"Дозапрос полей у модели (uid={uid}): {prefill.missing}")
+        answer = complete_prompt(build_missing_fields_prompt(reask_text(chunks, prefill.missing), prefill),
+                                 client, cache)
+        with span("validate"):
+            result = result.merge(answer)
+    return result.to_json(uid)
+
+
+async def check_and_reask_async(json_str: str, chunks: Optional[Dict[str, str]], client: AsyncOpenAI,
+                                uid: str, cache: Optional[ResponseCache] = None) -> str:
+    """
+    Асинхронный вариант check_and_reask.
+    """
+    with span("validate"):
+        result = check_response(json_str)
+    if result is None:
+        return json_str
+    for _ in range(response_reask()):
+        if not result.errors or not chunks:
+            break
+        prefill = result.reask_prefill()
+        logger.info(f"Дозапрос полей у модели (uid={uid}): {prefill.missing}")
+        answer = await complete_prompt_async(
+            build_missing_fields_prompt(reask_text(chunks, prefill.missing), prefill), client, cache
+        )
+        with span("validate"):
+            result = result.merge(answer)
+    return result.to_json(uid)
+
+
+def process_pdf(pdf_path: str, client: OpenAI, output_dir: str,
+                cache: Optional[ResponseCache] = None, compact: bool = True, use_form: bool = True,
+                ledger: Optional[JobLedger] = None):
+    """
+    Обрабатывает один PDF-файл:
+    - заполняет что может из полей формы (если use_form и PDF — форма)
+    - читает текст
+    - генерирует промпт (для формы — только по недостающим полям)
+    - отправляет в ChatGPT
+    - получает JSON-ответ
+    - сохраняет ответ в .json
+    В ledger отмечаются промежуточные состояния extracted / sent.
+    """
+
+    if not os.path.exists(pdf_path):
+        logger.error("Файл не найден: %s", pdf_path)
+
+        return
+
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+
+    logger.info(f"\n=== Обрабатываем PDF через {pdf_extractor()}: {pdf_path} ===")
+    uid = base_name
+
+    with doc_context(uid), span("document"):
+        prefill = prefill_from_form(pdf_path) if use_form else None
+        if prefill is not None and prefill.complete:
+            logger.info(f"Все поля есть в форме, запрос в OpenAI не нужен: {pdf_path}")
+            mark_job(ledger, pdf_path, EXTRACTED)
+            json_str = check_and_reask(prefill.to_json(uid), None, client, uid, cache)
+            return save_response(json_str, pdf_path, output_dir, base_name)
+
+        chunks = read_pdf_chunks_for_prompt(pdf_path, compact) # Читаем PDF
+        mark_job(ledger, pdf_path, EXTRACTED)
+
+        if prefill is not None:
+            pdf_text = "\n".join(chunks.values())
+            save_prompt(build_missing_fields_prompt(pdf_text, prefill), output_dir, base_name)
+            mark_job(ledger, pdf_path, SENT)
+            logger.info(f"Отправляем запрос в OpenAI (недостающие поля формы) для файла: {pdf_path} (uid={uid})")
+            json_str = run_form_extraction(prefill, pdf_text, client, uid, cache)
+            json_str = check_and_reask(json_str, chunks, client, uid, cache)
+            return save_response(json_str, pdf_path, output_dir, base_name)
+
+        prompt_text = build_chunks_prompt(chunks) # Строим промпт
+
+        # Сохраняем промпт (для отладки) — ровно тот, что уйдёт в модель
+        save_prompt(prompt_text, output_dir, base_name)
+
+        # Отправляем запрос в модель (промпт из текста строится внутри)
+        logger.info(f"Отправляем запрос в OpenAI для файла: {pdf_path} (uid={uid})")
+        mark_job(ledger, pdf_path, SENT)
+        json_str = run_chunked_extraction(chunks, client, cache)
+        json_str = check_and_reask(json_str, chunks, client, uid, cache)
+
+        return save_response(json_str, pdf_path, output_dir, base_name)
+
+
+async def _read_and_prepare(pdf_path: str, output_dir: str, compact: bool = True, use_form: bool = True):
+    """
+    Читает поля формы и PDF в отдельном потоке (чтобы не блокировать event loop),
+    строит промпт и сохраняет его. Возвращает (base_name, chunks, prefill);
+    если форма заполнена полностью, chunks = None и PDF не читается.
+    """
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+
+    logger.info(f"\n=== Обрабатываем PDF через {pdf_extractor()}: {pdf_path} ===")
+
+    with doc_context(base_name):
+        prefill = await asyncio.to_thread(prefill_from_form, pdf_path) if use_form else None
+        if prefill is not None and prefill.complete:
+            return base_name, None, prefill
+
+        chunks = await asyncio.to_thread(read_pdf_chunks_for_prompt, pdf_path, compact)
+        if prefill is not None:
+            prompt_text = build_missing_fields_prompt("\n".join(chunks.values()), prefill)
+        else:
+            prompt_text = build_chunks_prompt(chunks)
+        await asyncio.to_thread(save_prompt, prompt_text, output_dir, base_name)
+
+    return base_name, chunks, prefill
+
+
+async def process_pdfs_async(pdf_paths: List[str], client: AsyncOpenAI, output_dir: str,
+                             max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                             cache: Optional[ResponseCache] = None,
+                             compact: bool = True,
+                             use_form: bool = True,
+                             on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                             ledger: Optional[JobLedger] = None,
+                             ) -> Dict[str, Any]:
+    """
+    Асинхронно обрабатывает список PDF:
+    - один продюсер читает PDF и строит промпты (чтение идёт параллельно с запросами)
+    - max_concurrency воркеров отправляют запросы в OpenAI
+    - каждый результат сохраняется сразу после получения ответа
+
+    Очередь между чтением и запросами ограничена, поэтому в памяти
+    одновременно лежит не больше ~2 * max_concurrency промптов.
+
+    on_result(json_obj) вызывается (в отдельном потоке) для каждого успешного ответа,
+    например pipeline.TableWriter.put. В этом случае сами ответы в результате
+    не накапливаются — вместо них True/False.
+
+    Если передан ledger — в нём отмечается состояние каждого документа.
+
+    Returns:
+        dict: {pdf_path: json_obj | None} или {pdf_path: bool}, если передан on_result
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency должен быть >= 1, получено {max_concurrency}")
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency)
+    results: Dict[str, Any] = {}
+
+    async def producer():
+        for pdf_path in pdf_paths:
+            if ledger is not None:
+                ledger.begin(pdf_path)
+            if not os.path.exists(pdf_path):
+                logger.error("Файл не найден: %s", pdf_path)
+                mark_job(ledger, pdf_path, FAILED, "файл не найден")
+                results[pdf_path] = None
+                continue
+            try:
+                prepared = await _read_and_prepare(pdf_path, output_dir, compact, use_form)
+            except Exception as e:
+                logger.exception(f"Не удалось прочитать PDF: {pdf_path}")
+                mark_job(ledger, pdf_path, FAILED, repr(e))
+                results[pdf_path] = None
+                continue
+            mark_job(ledger, pdf_path, EXTRACTED)
+            await queue.put((pdf_path, *prepared))
+
+        for _ in range(max_concurrency):
+            await queue.put(None)  # сигнал остановки для каждого воркера
+
+    async def handle(pdf_path, base_name, chunks, prefill):
+        uid = base_name
+        try:
+            if chunks is None:
+                logger.info(f"Все поля есть в форме, запрос в OpenAI не нужен: {pdf_path}")
+                json_str = prefill.to_json(uid)
+            elif prefill is not None:
+                logger.info(f"Отправляем запрос в OpenAI (недостающие поля формы) для файла: {pdf_path} (uid={uid})")
+                mark_job(ledger, pdf_path, SENT)
+                json_str = await run_form_extraction_async(
+                    prefill, "\n".join(chunks.values()), client, uid, cache
+                )
+            else:
+                logger.info(f"Отправляем запрос в OpenAI для файла: {pdf_path} (uid={uid})")
+                mark_job(ledger, pdf_path, SENT)
+                json_str = await run_chunked_extraction_async(chunks, client, cache)
+            json_str = await check_and_reask_async(json_str, chunks, client, uid, cache)
+        except AuthenticationError:
+            raise
+        except Exception as e:
+            logger.exception(f"Ошибка запроса к OpenAI для файла: {pdf_path}")
+            mark_job(ledger, pdf_path, FAILED, repr(e))
+            results[pdf_path] = None
+            return
+        json_obj = await asyncio.to_thread(save_response, json_str, pdf_path, output_dir, base_name)
+        if json_obj is None:
+            mark_job(ledger, pdf_path, FAILED, "невалидный JSON в ответе модели")
+        else:
+            mark_job(ledger, pdf_path, DONE)
+        if on_result is None:
+            results[pdf_path] = json_obj
+            return
+        results[pdf_path] = json_obj is not None
+        if json_obj is not None:
+            await asyncio.to_thread(on_result, json_obj)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            pdf_path, base_name, chunks, prefill = item
+            with doc_context(base_name):
+                await handle(pdf_path, base_name, chunks, prefill)
+
+    await asyncio.gather(producer(), *(worker() for _ in range(max_concurrency)))
+    return results
+
+
+def build_arg_parser(description: str = "Извлечение структурированных данных из PDF через OpenAI"
+                     ) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("pdf_path", nargs="?", help="конкретный PDF (по умолчанию — все PDF из PDF_INPUT_DIR)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="обрабатывать PDF параллельно через AsyncOpenAI")
+    parser.add_argument("--concurrency", type=int,
+                        default=int(os.getenv("OPENAI_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                        help="максимум одновременных запросов в async-режиме")
+    add_processing_args(parser)
+    parser.add_argument("--resume", action="store_true",
+                        help="продолжить прерванный запуск: обработать только незаконченные PDF из журнала")
+    return parser
+
+
+def add_processing_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """
+    Общие для main.py и watcher.py параметры обработки документа.
+    """
+    parser.add_argument("--no-cache", action="store_true",
+                        help="не использовать кэш ответов модели (всегда ходить в OpenAI)")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="очистить кэш ответов модели перед запуском")
+    parser.add_argument("--no-compact", action="store_true",
+                        help="отправлять текст PDF без сжатия (колонтитулы, пробелы, юридический текст)")
+    parser.add_argument("--no-form-fields", action="store_true",
+                        help="не использовать поля AcroForm (всегда извлекать всё через модель)")
+    parser.add_argument("--metrics-dir", default=os.getenv("METRICS_DIR", ""),
+                        help="каталог для метрик этапов (JSONL + снапшот Prometheus); по умолчанию выключено")
+    return parser
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    return build_arg_parser().parse_args(argv)
+
+
+def openai_api_key() -> str:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         logger.critical("OPENAI_API_KEY не указан в .env")
         raise RuntimeError("OPENAI_API_KEY не указан в .env")
+    return api_key
 
-    client = OpenAI(api_key=api_key)
-    logger.info("Клиент OpenAI инициализирован")
+
+def process_pdf_job(pdf_path: str, client: OpenAI, output_dir: str, ledger: JobLedger,
+                    cache: Optional[ResponseCache] = None, compact: bool = True, use_form: bool = True,
+                    on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> bool:
+    """
+    process_pdf с записью в журнал: ошибка документа попадает в ledger и не пробрасывается
+    (кроме AuthenticationError — с неверным ключом остальные документы тоже не пройдут).
+    Возвращает True, если ответ сохранён.
+    """
+    ledger.begin(pdf_path)
+    try:
+        json_obj = process_pdf(pdf_path, client, output_dir, cache,
+                               compact=compact, use_form=use_form, ledger=ledger)
+    except AuthenticationError:
+        raise
+    except Exception as e:
+        logger.exception(f"Не удалось обработать PDF: {pdf_path}")
+        ledger.mark(pdf_path, FAILED, repr(e))
+        return False
+    if json_obj is None:
+        ledger.mark(pdf_path, FAILED, "файл не найден или невалидный JSON в ответе модели")
+        return False
+    ledger.mark(pdf_path, DONE)
+    if on_result is not None:
+        on_result(json_obj)
+    return True
+
+
+def run(args: argparse.Namespace, on_result: Optional[Callable[[Dict[str, Any]], None]] = None):
+    """
+    Обрабатывает PDF по разобранным аргументам командной строки.
+    on_result(json_obj) вызывается для каждого успешного ответа (см. pipeline.py).
+    """
+
+    api_key = openai_api_key()
 
     input_dir = os.getenv("PDF_INPUT_DIR", "input_files")
     output_dir = os.getenv("OUTPUT_DIR", "output_files")
     os.makedirs(output_dir, exist_ok=True)
 
     # Собираем список PDF из папки
-    if len(sys.argv) > 1:
+    if args.pdf_path:
         # Если передали конкретный файл в аргумент — обрабатываем только его
-        pdf_paths = [sys.argv[1]]
+        pdf_paths = [args.pdf_path]
     else:
         # Иначе берём все PDF из input_dir
         pdf_paths = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.lower().endswith(".pdf")]
@@ -149,10 +753,55 @@ def main():
     for p in pdf_paths:
         print("  -", p)
 
-    # Обрабатываем каждый PDF
-    for pdf_path in pdf_paths:
-        process_pdf(pdf_path, client, output_dir)
-
+    # Журнал обработки: после падения --resume продолжает с незаконченных документов
+    ledger = JobLedger(default_ledger_path(output_dir))
+    ledger.enqueue(pdf_paths, reset=not args.resume)
+    if args.resume:
+        total = len(pdf_paths)
+        pdf_paths = ledger.pending(pdf_paths)
+        logger.info(f"--resume: к обработке {len(pdf_paths)} из {total} PDF (журнал {ledger.path})")
+
+    cache = None
+    if args.clear_cache:
+        ResponseCache.from_env().clear()
+    if not args.no_cache:
+        cache = ResponseCache.from_env()
+        logger.info(f"Кэш ответов модели: {cache.cache_dir}")
+
+    # метрики запуска может включить вызывающий (pipeline.py — чтобы учесть и запись таблиц)
+    owns_metrics = not metrics_enabled() and start_run(args.metrics_dir) is not None
+    try:
+        if args.use_async:
+            # повторы делает retry.get_openai_retry() (backoff + circuit breaker), а не клиент
+            async_client = AsyncOpenAI(api_key=api_key, max_retries=0)
+            logger.info(f"Клиент AsyncOpenAI инициализирован (concurrency={args.concurrency})")
+            asyncio.run(process_pdfs_async(
+                pdf_paths, async_client, output_dir, args.concurrency, cache,
+                compact=not args.no_compact, use_form=not args.no_form_fields, on_result=on_result,
+                ledger=ledger,
+            ))
+        else:
+            client = OpenAI(api_key=api_key, max_retries=0)
+            logger.info("Клиент OpenAI инициализирован")
+
+            # Обрабатываем каждый PDF; ошибка одного документа не останавливает остальные
+            for pdf_path in pdf_paths:
+                process_pdf_job(pdf_path, client, output_dir, ledger, cache,
+                                compact=not args.no_compact, use_form=not args.no_form_fields,
+                                on_result=on_result)
+    finally:
+        if owns_metrics:
+            print_metrics_summary()
+        logger.info(f"Журнал обработки {ledger.path}: {ledger.counts()}")
+        ledger.close()
+
+    if cache is not None:
+        cache.log_stats()
+
+
+def main(argv: Optional[List[str]] = None):
+    load_dotenv() # Загружаем переменные окружения (.env)
+    run(parse_args(argv))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,384 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Куда писать метрики запуска — METRICS_DIR (пусто — инструментирование выключено); остальные
+# настройки тоже читаются при start_run(), после load_dotenv():
+# METRICS_WINDOW — по скольким последним замерам этапа считаются p50/p95 (count и sum — за весь запуск);
+# METRICS_MAX_BYTES — размер JSONL, после которого он ротируется (0 — без ротации),
+# METRICS_BACKUPS — сколько старых файлов хранить (.jsonl.1 ... .jsonl.N).
+# Теги документа живут, пока открыт его doc_context, и ещё для _RECENT_DOCS последних документов
+# (async-режим: чтение и запрос — разные doc_context одного uid).
+_RECENT_DOCS = 1024
+
+# Квантили в сводке и в снапшоте Prometheus
+QUANTILES = (0.5, 0.95)
+
+# Теги текущего документа (uid, pages, ...) — общий dict для всех span-ов документа
+_doc_tags: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("metrics_doc_tags", default=None)
+
+_recorder: Optional["MetricsRecorder"] = None
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+class StageStats:
+    """
+    Замеры одного этапа: число и сумма — за весь запуск, квантили — по последним window замерам
+    (память не растёт в долгоживущем режиме). Отсортированное окно кэшируется до следующего замера.
+    """
+
+    __slots__ = ("count", "total", "window", "_ordered")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.window: Deque[float] = deque(maxlen=window)
+        self._ordered: Optional[List[float]] = None
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.window.append(seconds)
+        self._ordered = None
+
+    def quantile(self, q: float) -> float:
+        if self._ordered is None:
+            self._ordered = sorted(self.window)
+        return _quantile(self._ordered, q)
+
+
+class MetricsRecorder:
+    """
+    Метрики одного запуска:
+    - <dir>/metrics-<run_id>.jsonl — строка на каждый span (этап, длительность, теги документа, токены);
+      при max_bytes > 0 ротируется в .jsonl.1 ... .jsonl.<backups>;
+    - <dir>/metrics-<run_id>.prom — снапшот в текстовом формате Prometheus при закрытии.
+    """
+
+    def __init__(self, metrics_dir: str, window: Optional[int] = None,
+                 max_bytes: Optional[int] = None, backups: Optional[int] = None):
+        os.makedirs(metrics_dir, exist_ok=True)
+        self.run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        self.jsonl_path = os.path.join(metrics_dir, f"metrics-{self.run_id}.jsonl")
+        self.prom_path = os.path.join(metrics_dir, f"metrics-{self.run_id}.prom")
+        self.window = int(os.getenv("METRICS_WINDOW", "10000")) if window is None else window
+        self.max_bytes = int(os.getenv("METRICS_MAX_BYTES", "50000000")) if max_bytes is None else max_bytes
+        self.backups = int(os.getenv("METRICS_BACKUPS", "3")) if backups is None else backups
+        if self.window < 1:
+            raise ValueError(f"METRICS_WINDOW должен быть >= 1, получено {self.window}")
+        self._file = open(self.jsonl_path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.stages: Dict[str, StageStats] = {}
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.tokens: Dict[str, int] = defaultdict(int)
+        self.gauges: Dict[str, float] = {}
+        # uid -> [теги, сколько doc_context открыто]; закрытые — в recent_documents
+        self.documents: Dict[str, List[Any]] = {}
+        self.recent_documents: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.documents_total = 0
+
+    def _write(self, line: str) -> None:
+        # вызывается под self._lock
+        self._file.write(line + "\n")
+        if self.max_bytes > 0 and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.jsonl_path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.jsonl_path}.{i + 1}")
+            os.replace(self.jsonl_path, f"{self.jsonl_path}.1")
+        else:
+            os.remove(self.jsonl_path)
+        self._file = open(self.jsonl_path, "a", encoding="utf-8")
+
+    def record(self, stage: str, seconds: float, tags: Dict[str, Any], ok: bool) -> None:
+        entry = {"ts": time.time(), "stage": stage, "seconds": round(seconds, 6), "ok": ok, **tags}
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self._write(line)
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(self.window)
+            stats.add(seconds)
+            if not ok:
+                self.errors[stage] += 1
+            for kind in ("prompt_tokens", "completion_tokens"):
+                if isinstance(tags.get(kind), int):
+                    self.tokens[kind] += tags[kind]
+
+    def set_gauge(self, name: str, value: float) -> None:
+        entry = {"ts": time.time(), "gauge": name, "value": value}
+        with self._lock:
+            self._write(json.dumps(entry))
+            self._file.flush()
+            self.gauges[name] = value
+
+    def document_tags(self, uid: str) -> Dict[str, Any]:
+        """
+        Теги документа для нового doc_context; парный вызов — release_document(uid).
+        """
+        # один dict на документ: продюсер (чтение) и воркер (запрос) дописывают в него теги
+        with self._lock:
+            entry = self.documents.get(uid)
+            if entry is None:
+                tags = self.recent_documents.pop(uid, None)
+                if tags is None:
+                    tags = {"uid": uid}
+                    self.documents_total += 1
+                entry = self.documents[uid] = [tags, 0]
+            entry[1] += 1
+            return entry[0]
+
+    def release_document(self, uid: str) -> None:
+        """
+        Закрыт doc_context документа: после последнего теги остаются только среди _RECENT_DOCS недавних.
+        """
+        with self._lock:
+            entry = self.documents.get(uid)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self.documents[uid]
+            self.recent_documents[uid] = entry[0]
+            if len(self.recent_documents) > _RECENT_DOCS:
+                self.recent_documents.popitem(last=False)
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<16} | {'count':>6} | {'p50, s':>8} | {'p95, s':>8} | {'total, s':>9} | errors"]
+        for stage, stats in sorted(self.stages.items()):
+            lines.append(
+                f"{stage:<16} | {stats.count:>6} | {stats.quantile(0.5):>8.3f} | "
+                f"{stats.quantile(0.95):>8.3f} | {stats.total:>9.2f} | {self.errors.get(stage, 0)}"
+            )
+        lines.append(f"tokens: prompt={self.tokens.get('prompt_tokens', 0)}, "
+                     f"completion={self.tokens.get('completion_tokens', 0)}")
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP pdf_stage_seconds Время этапа обработки документа",
+            "# TYPE pdf_stage_seconds summary",
+        ]
+        for stage, stats in sorted(self.stages.items()):
+            for q in QUANTILES:
+                lines.append(f'pdf_stage_seconds{{stage="{stage}",quantile="{q}"}} {stats.quantile(q):.6f}')
+            lines.append(f'pdf_stage_seconds_sum{{stage="{stage}"}} {stats.total:.6f}')
+            lines.append(f'pdf_stage_seconds_count{{stage="{stage}"}} {stats.count}')
+        lines += ["# HELP pdf_stage_errors_total Этапы, завершившиеся исключением",
+                  "# TYPE pdf_stage_errors_total counter"]
+        for stage in sorted(self.stages):
+            lines.append(f'pdf_stage_errors_total{{stage="{stage}"}} {self.errors.get(stage, 0)}')
+        lines += ["# HELP pdf_tokens_total Токены OpenAI за запуск",
+                  "# TYPE pdf_tokens_total counter"]
+        for kind in ("prompt", "completion"):
+            lines.append(f'pdf_tokens_total{{kind="{kind}"}} {self.tokens.get(kind + "_tokens", 0)}')
+        lines += ["# HELP pdf_documents_total Документы с метриками за запуск",
+                  "# TYPE pdf_documents_total counter",
+                  f"pdf_documents_total {self.documents_total}"]
+        for name, value in sorted(self.gauges.items()):
+            lines += [f"# TYPE pdf_{name} gauge", f"pdf_{name} {value:g}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self) -> None:
+        """
+        Атомарно перезаписывает снапшот Prometheus (долгоживущий процесс вызывает его периодически).
+        """
+        with self._lock:
+            text = self.prometheus()
+        tmp_path = self.prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.prom_path)
+
+    def close(self) -> str:
+        with self._lock:
+            self._file.close()
+        self.write_prometheus()
+        logger.info(f"Метрики запуска: {self.jsonl_path}, {self.prom_path}")
+        return self.summary()
+
+
+class _NoopSpan:
+    """
+    Заглушка, когда метрики выключены: один общий объект, без замеров и аллокаций.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def tag(self, **tags) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("recorder", "stage", "tags", "started")
+
+    def __init__(self, recorder: MetricsRecorder, stage: str, tags: Dict[str, Any]):
+        self.recorder = recorder
+        self.stage = stage
+        self.tags = tags
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        doc = _doc_tags.get()
+        tags = {**doc, **self.tags} if doc else self.tags
+        self.recorder.record(self.stage, seconds, tags, exc_type is None)
+        return False
+
+    def tag(self, **tags) -> None:
+        self.tags.update(tags)
+
+
+def span(stage: str, **tags):
+    """
+    Замер этапа: with span("read_pdf") as s: ...; s.tag(pages=10).
+    К тегам добавляются теги текущего документа (doc_context).
+    """
+    recorder = _recorder
+    if recorder is None:
+        return _NOOP
+    return _Span(recorder, stage, tags)
+
+
+class _DocContext:
+    __slots__ = ("recorder", "uid", "token")
+
+    def __init__(self, recorder: MetricsRecorder, uid: str):
+        self.recorder = recorder
+        self.uid = uid
+
+    def __enter__(self):
+        self.token = _doc_tags.set(self.recorder.document_tags(self.uid))
+        return self
+
+    def __exit__(self, *exc):
+        _doc_tags.reset(self.token)
+        self.recorder.release_document(self.uid)
+        return False
+
+
+def doc_context(uid: str):
+    """
+    Все span-ы внутри блока получают теги документа uid (и всё, что добавит set_doc_tags).
+    """
+    recorder = _recorder
+    if recorder is None:
+        return _NOOP
+    return _DocContext(recorder, uid)
+
+
+def set_doc_tags(**tags) -> None:
+    """
+    Дописывает теги (например, pages) текущему документу.
+    """
+    doc = _doc_tags.get()
+    if doc is not None:
+        doc.update(tags)
+
+
+def observe(stage: str, seconds: float, **tags) -> None:
+    """
+    Длительность, замеренная вне with span(...) (например, от появления файла до ответа).
+    """
+    recorder = _recorder
+    if recorder is None:
+        return
+    doc = _doc_tags.get()
+    recorder.record(stage, seconds, {**doc, **tags} if doc else tags, True)
+
+
+def set_gauge(name: str, value: float) -> None:
+    """
+    Текущее значение показателя (например, длина очереди); в снапшоте — pdf_<name>.
+    """
+    recorder = _recorder
+    if recorder is not None:
+        recorder.set_gauge(name, value)
+
+
+def write_snapshot() -> None:
+    """
+    Обновляет снапшот Prometheus, не завершая запуск.
+    """
+    recorder = _recorder
+    if recorder is not None:
+        recorder.write_prometheus()
+
+
+def usage_tags(response: Any) -> Dict[str, Any]:
+    """
+    Токены из response.usage ответа OpenAI (если есть).
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "model": getattr(response, "model", None),
+    }
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def start_run(metrics_dir: Optional[str] = None) -> Optional[MetricsRecorder]:
+    """
+    Включает метрики для запуска (пустой metrics_dir — остаются выключенными; None — из METRICS_DIR).
+    """
+    global _recorder
+    if metrics_dir is None:
+        metrics_dir = os.getenv("METRICS_DIR", "")
+    if not metrics_dir:
+        return None
+    _recorder = MetricsRecorder(metrics_dir)
+    return _recorder
+
+
+def finish_run() -> Optional[str]:
+    """
+    Записывает снапшот Prometheus, выключает метрики и возвращает сводку p50/p95 по этапам.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None:
+        return None
+    return recorder.close()
+
+
+def print_summary() -> None:
+    """
+    finish_run() + печать сводки в stdout (если метрики были включены).
+    """
+    summary = finish_run()
+    if summary:
+        print(f"Метрики этапов:\n{summary}")
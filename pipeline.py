@@ -0,0 +1,225 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from logging_config import setup_logging, get_logger
+from main import build_arg_parser, run
+from metrics import print_summary as print_metrics_summary, span, start_run
+from tables import SINK_NAMES, json_list_to_tables, json_to_tables_from_dict, make_sinks
+
+logger = get_logger(__name__)
+
+
+def pipeline_settings() -> Dict[str, Any]:
+    """
+    Настройки записи таблиц из окружения; читаются при вызове (значения из .env действуют после load_dotenv).
+
+    - batch_docs (PIPELINE_BATCH_DOCS): сколько документов пишется в таблицы одним микро-батчем;
+    - flush_seconds (PIPELINE_FLUSH_SECONDS): как долго батч может ждать, пока наберётся.
+    """
+    return {
+        "batch_docs": int(os.getenv("PIPELINE_BATCH_DOCS", "50")),
+        "flush_seconds": float(os.getenv("PIPELINE_FLUSH_SECONDS", "5")),
+    }
+
+_STOP = object()
+
+
+class TableWriter:
+    """
+    Поток, который забирает ответы модели (dict) из ограниченной очереди,
+    строит по ним строки таблиц (json_list_to_tables — весь батч сразу)
+    и пишет их в приёмники микро-батчами: по batch_docs документов
+    или раз в flush_seconds, смотря что наступит раньше.
+
+    Очередь ограничена, поэтому при медленной записи put() блокирует
+    обработку PDF, и в памяти не копится больше max_queue + batch_docs ответов.
+
+    Приёмники создаются внутри потока записи (SQLite-соединение
+    нельзя использовать из другого потока).
+    """
+
+    def __init__(self, sink_names: List[str], output_dir: str,
+                 batch_docs: Optional[int] = None,
+                 flush_seconds: Optional[float] = None,
+                 max_queue: Optional[int] = None):
+        # не переданные параметры — из PIPELINE_* (см. pipeline_settings)
+        settings = pipeline_settings()
+        batch_docs = settings["batch_docs"] if batch_docs is None else batch_docs
+        flush_seconds = settings["flush_seconds"] if flush_seconds is None else flush_seconds
+        if batch_docs < 1:
+            raise ValueError(f"batch_docs должен быть >= 1, получено {batch_docs}")
+        self.sink_names = sink_names
+        self.output_dir = output_dir
+        self.batch_docs = batch_docs
+        self.flush_seconds = flush_seconds
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue or 2 * batch_docs)
+        self.stats = {"docs": 0, "batches": 0, "main_rows": 0, "meds_rows": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, name="table-writer", daemon=True)
+        self._ready = threading.Event()
+        self._init_error: Optional[BaseException] = None
+
+    def start(self) -> "TableWriter":
+        self._thread.start()
+        self._ready.wait()
+        if self._init_error is not None:
+            raise self._init_error
+        return self
+
+    def put(self, data: Dict[str, Any]) -> None:
+        """
+        Передаёт ответ модели на запись (блокируется, если очередь заполнена).
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("TableWriter не запущен или уже остановлен")
+        self.queue.put(data)
+
+    def close(self) -> Dict[str, int]:
+        """
+        Дописывает остаток и останавливает поток. Возвращает статистику.
+        """
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join()
+        logger.info(f"TableWriter: {self.stats}")
+        return self.stats
+
+    def __enter__(self) -> "TableWriter":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _flush(self, sinks, batch: List[Dict[str, Any]]) -> None:
+        try:
+            with span("build_tables", docs=len(batch)):
+                main_df, meds_df = json_list_to_tables(batch)
+        except Exception:
+            # разбираем по одному, чтобы один битый ответ не терял весь батч
+            logger.exception("TableWriter: пакетный разбор не удался, разбор по одному ответу")
+            main_df, meds_df, batch = self._flush_one_by_one(batch)
+        if not batch:
+            return
+
+        for sink in sinks:
+            try:
+                with span("write_table", sink=type(sink).__name__, docs=len(batch)):
+                    sink.write(main_df, meds_df)
+            except Exception:
+                logger.exception(f"TableWriter: ошибка записи в {type(sink).__name__}")
+                self.stats["errors"] += 1
+
+        self.stats["docs"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["main_rows"] += len(main_df)
+        self.stats["meds_rows"] += len(meds_df)
+        logger.info(f"TableWriter: записан батч docs={len(batch)}, "
+                    f"main_rows={len(main_df)}, meds_rows={len(meds_df)}")
+
+    def _flush_one_by_one(self, batch: List[Dict[str, Any]]):
+        main_dfs, meds_dfs, parsed = [], [], []
+        for data in batch:
+            try:
+                main_df, meds_df = json_to_tables_from_dict(data)
+            except Exception:
+                logger.exception(f"TableWriter: не удалось разобрать ответ uid={data.get('uid')}")
+                self.stats["errors"] += 1
+                continue
+            main_dfs.append(main_df)
+            meds_dfs.append(meds_df)
+            parsed.append(data)
+        if not parsed:
+            return None, None, parsed
+        return pd.concat(main_dfs, ignore_index=True), pd.concat(meds_dfs, ignore_index=True), parsed
+
+    def _run(self) -> None:
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            sinks = make_sinks(self.sink_names, self.output_dir)
+        except BaseException as e:
+            self._init_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        batch: List[Dict[str, Any]] = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None  # истёк flush_seconds
+
+                if item is _STOP:
+                    break
+                if item is not None:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_seconds
+
+                if batch and (len(batch) >= self.batch_docs or item is None):
+                    self._flush(sinks, batch)
+                    batch = []
+                    deadline = None
+
+            if batch:
+                self._flush(sinks, batch)
+        finally:
+            for sink in sinks:
+                sink.close()
+
+
+def add_table_args(parser: argparse.ArgumentParser,
+                   flush_seconds: Optional[float] = None) -> argparse.ArgumentParser:
+    """
+    Параметры записи в таблицы (общие для pipeline.py и watcher.py).
+    Умолчания из PIPELINE_* читаются здесь, при построении парсера (после load_dotenv() в main).
+    """
+    settings = pipeline_settings()
+    if flush_seconds is None:
+        flush_seconds = settings["flush_seconds"]
+    parser.add_argument("--sink", type=lambda s: [x.strip() for x in s.split(",") if x.strip()],
+                        default=os.getenv("TABLES_SINK", "csv").split(","),
+                        help=f"куда писать таблицы: {', '.join(SINK_NAMES)} или несколько через запятую")
+    parser.add_argument("--batch-docs", type=int, default=settings["batch_docs"],
+                        help="документов в одном микро-батче записи")
+    parser.add_argument("--flush-seconds", type=float, default=flush_seconds,
+                        help="максимальное время ожидания неполного батча")
+    return parser
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = build_arg_parser("PDF → OpenAI → общие таблицы за один проход")
+    return add_table_args(parser).parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    load_dotenv()
+    args = parse_args(argv)
+    output_dir = os.getenv("OUTPUT_DIR", "output_files")
+
+    start_run(args.metrics_dir)
+    try:
+        with TableWriter(args.sink, output_dir, args.batch_docs, args.flush_seconds) as writer:
+            run(args, on_result=writer.put)
+    finally:
+        print_metrics_summary()
+
+    print(f"Записано в таблицы: {writer.stats}")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    logger = get_logger(__name__)
+
+    logger.info("Приложение запущено (pipeline.py)")
+
+    main()
@@ -1,79 +1,10 @@
-# height, dosage_unit, is_main_applicant  - custom keys
-#  "status": accepted/rejected,
-
-target_json_format = '''{
-  "uid": "string (optional)",
-  "check_it": bool,
-  "reason_checking": 'string'
-  "applicants": [
-    {
-      "applicant": 0,
-      "is_main_applicant" : bool
-      "firstName": "string (optional)",
-      "lastName": "string (optional)",
-      "midName": "string (optional)",
-      "phone": "string (optional)",
-      "gender": "string (optional)",
-      "dob": "YYYY-MM-DD (optional)",
-      "nicotine": bool (optional),
-      "weight": float (optional), (0 default)
-      "height":int (optional), (0 default)
-      "heightFt": int (optional), (0 default)
-      "heightIn": int (optional) (0 default)
-    }
-  ],
-  "plans": [
-    {
-      "id": int, (0 default)
-      "priceId": int (0 default)
-    }
-  ],
-  "phq": {
-    "treatment": bool,
-    "invalid": bool,
-    "pregnancy": bool,
-    "effectiveDate": "YYYY-MM-DD",
-    "disclaimer": bool,
-    "signature": "string",
-    "medications": [
-      {
-        "applicant": int,
-        "name": "string",
-        "rxcui": "string",
-        "dosage": "string",
-        "dosage_unit": "string",
-        "frequency": "string",
-        "description": "string"
-      }
-    ],
-    "issues": [
-      {
-        "key": "string",
-        "details": [
-          {
-            "key": "string",
-            "description": "string"
-          }
-        ]
-      }
-    ],
-    "conditions": [
-      {
-        "key": "string",
-        "description": "string"
-      }
-    ]
-  },
-  "income": float,
-  "address": {
-    "address1": "string (optional)",
-    "address2": "string (optional)",
-    "city": "string (optional)",
-    "state": "string (optional)",
-    "zipcode": "string (optional)"
-  }
-}'''
+import json
 
+from schema import MEDICATION_FREQUENCIES, RESPONSE_NODE, prompt_format
+
+# Формат ответа для промпта генерируется из типизированной схемы (schema.py):
+# "?" — необязательное поле, "a"|"b" — допустимые значения
+target_json_format = prompt_format(RESPONSE_NODE)
 
 
 prompt_template = """  
@@ -92,7 +23,7 @@ Key Requirements:
      * "heightIn" must be integer (inches portion only, no units)
    - Gender: Must be strictly "male" or "female" (convert if needed: "m" → "male", "f" → "female")
    - Medications:
-      "frequency" must be one of: ["Once daily", "Twice daily", "Three times daily", "Four times daily", "Weekly", "Monthly", "Every other day", "At bedtime", "After meals", "Before meals", "As needed"]
+      "frequency" must be one of: """ + json.dumps(list(MEDICATION_FREQUENCIES)) + """
       "dosage": no units
       "dosage_unit": unit of measurement, eg mg  
    - Income is usually indicated in the Yearly Income section.
@@ -123,4 +54,31 @@ PDF Content:
 {pdf_text}  
 
 Output **only the raw JSON object** without explanations or annotations.  
-"""  
\ No newline at end of file
+"""  
+
+# Промпт для PDF-форм: часть полей уже заполнена из AcroForm (form_fields.py),
+# у модели спрашиваем только недостающие пути.
+missing_fields_prompt_template = """
+You are an expert in processing insurance documents. Part of the data has already been extracted
+from the PDF form fields:
+{known_json}
+
+Extract **only** the following fields from the PDF content below (path: format):
+{fields}
+
+Rules:
+   - Preserve all original values exactly as written, do not guess or infer missing data.
+   - Do not use the direct names of applicants in descriptions.
+   - Medications: "applicant" is the index of the applicant in the data above, "name" is only the
+     name of the medicine, "dosage" has no units, "dosage_unit" is the unit (eg mg), "frequency" must be
+     one of: """ + json.dumps(list(MEDICATION_FREQUENCIES)) + """
+   - Use empty strings, false or empty arrays where data is absent.
+   - If something looks wrong, set "check_it": true and briefly explain in "reason_checking".
+
+Return a JSON object whose keys are exactly the paths listed above plus "check_it" and "reason_checking".
+
+PDF Content:
+{pdf_text}
+
+Output **only the raw JSON object** without explanations or annotations.
+"""
@@ -1,13 +1,103 @@
 from pypdf import PdfReader
+import pypdf
 import pdfplumber
 import fitz
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from logging_config import setup_logging, get_logger
-from typing import Dict, Any
+from text_cache import TextCache
+from sections import SECTION_HEADINGS, HEADING_MAX_CHARS
+from typing import Callable, Dict, Any, Iterator, List, Optional, Sequence, Tuple
 from pypdf import PdfReader
 
 logger = get_logger(__name__)
 
-def read_pdf_text_pypdf(path: str) -> str:
+# Версии библиотек входят в ключ кэша текста: новая версия экстрактора = новый текст
+EXTRACTOR_VERSIONS = {
+    "pypdf": pypdf.__version__,
+    "pdfplumber": pdfplumber.__version__,
+    "pymupdf": fitz.VersionBind,
+}
+
+# Кэш текста страниц создаётся при первом обращении (после load_dotenv), см. get_text_cache()
+_text_cache: Optional[TextCache] = None
+_text_cache_loaded = False
+
+
+def get_text_cache() -> Optional[TextCache]:
+    """
+    Кэш текста страниц из PDF_TEXT_CACHE / PDF_TEXT_CACHE_DIR (None — выключен через PDF_TEXT_CACHE=0).
+    """
+    global _text_cache, _text_cache_loaded
+    if not _text_cache_loaded:
+        _text_cache = TextCache.from_env()
+        _text_cache_loaded = True
+    return _text_cache
+
+
+def pdf_limits(max_pages: Optional[int] = None, max_chars: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Ограничители для очень больших PDF (0 — без ограничения): читаются первые PDF_MAX_PAGES
+    страниц и не больше PDF_MAX_CHARS символов текста, остальное отбрасывается с предупреждением.
+    Явно переданные значения важнее переменных окружения; окружение читается при вызове
+    (значения из .env действуют после load_dotenv).
+    """
+    if max_pages is None:
+        max_pages = int(os.getenv("PDF_MAX_PAGES", "0"))
+    if max_chars is None:
+        max_chars = int(os.getenv("PDF_MAX_CHARS", "0"))
+    return max_pages, max_chars
+
+
+def _read_pages(extractor: str, path: str, extract_fn: Callable[[str], List[str]],
+                use_cache: bool = True) -> List[str]:
+    """
+    Возвращает тексты страниц через кэш (если он включён), иначе вызывает extract_fn.
+    """
+    text_cache = get_text_cache() if use_cache else None
+    if text_cache is None:
+        return extract_fn(path)
+    version = EXTRACTOR_VERSIONS[extractor]
+    max_pages, max_chars = pdf_limits()
+    if max_pages or max_chars:
+        # обрезанный текст не должен попадать в кэш полного
+        version += f"+max{max_pages}p{max_chars}c"
+    return text_cache.get_or_extract(path, extractor, version, extract_fn)
+
+
+# ----------------- потоковое чтение: страница за страницей ----------------- #
+
+def _page_limit(path: str, page_count: int, max_pages: int) -> int:
+    """
+    Сколько страниц читать с учётом max_pages (0 — все).
+    """
+    if max_pages and page_count > max_pages:
+        logger.warning(f"{path}: {page_count} страниц, читаются первые {max_pages} (PDF_MAX_PAGES)")
+        return max_pages
+    return page_count
+
+
+def _limit_chars(path: str, pages: Iterator[Tuple[int, str]], max_chars: int) -> Iterator[Tuple[int, str]]:
+    """
+    Пропускает страницы, пока суммарный текст не превысит max_chars (0 — без ограничения);
+    последняя страница обрезается, исходный генератор закрывается (файл освобождается сразу).
+    """
+    total = 0
+    try:
+        for page_no, text in pages:
+            if max_chars and total + len(text) > max_chars:
+                logger.warning(f"{path}: текст длиннее {max_chars} символов (PDF_MAX_CHARS), "
+                               f"чтение остановлено на странице {page_no}")
+                yield page_no, text[:max_chars - total]
+                return
+            total += len(text)
+            yield page_no, text
+    finally:
+        pages.close()
+
+
+def _iter_pypdf(path: str, max_pages: int) -> Iterator[Tuple[int, str]]:
     try:
         reader = PdfReader(path)
     except FileNotFoundError:
@@ -17,19 +107,33 @@ def read_pdf_text_pypdf(path: str) -> str:
         logger.exception(f"Cannot open PDF: {e}")
         raise ValueError(f"Cannot open PDF: {e}")
 
-    all_text = []
-
-    for i, page in enumerate(reader.pages):
+    for i in range(_page_limit(path, len(reader.pages), max_pages)):
         try:
-            text = page.extract_text()
+            text = reader.pages[i].extract_text()
         except Exception as e:
             logger.exception(f"Failed to extract text on page {i}: {e}")
             raise ValueError(f"Failed to extract text on page {i}: {e}")
 
-        if text:
-            all_text.append(text)
-        else:
-            all_text.append("")  # сохраняем пустую страницу, чтобы не ломать структуру
+        # пустая страница остаётся в выдаче, чтобы не ломать нумерацию
+        yield i, text or ""
+
+
+def iter_pages_pypdf(path: str, max_pages: Optional[int] = None,
+                     max_chars: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Текст PDF по страницам через pypdf: генератор (номер страницы с 0, текст).
+    max_pages / max_chars — ограничители (по умолчанию PDF_MAX_PAGES / PDF_MAX_CHARS, 0 — без ограничения).
+    """
+    max_pages, max_chars = pdf_limits(max_pages, max_chars)
+    return _limit_chars(path, _iter_pypdf(path, max_pages), max_chars)
+
+
+def _pypdf_pages(path: str) -> List[str]:
+    return [text for _, text in iter_pages_pypdf(path)]
+
+
+def read_pdf_text_pypdf(path: str, use_cache: bool = True) -> str:
+    all_text = _read_pages("pypdf", path, _pypdf_pages, use_cache)
 
     result = "\n".join(all_text)
 
@@ -40,24 +144,107 @@ def read_pdf_text_pypdf(path: str) -> str:
     return result
 
 
-def read_pdf_text_pdfplumber(path: str) -> str:
+def _pdfplumber_page_text(page, i: int) -> str:
+    """
+    Текст страницы pdfplumber; после чтения кэш раскладки страницы (символы,
+    линии, layout pdfminer) сбрасывается, иначе он живёт до закрытия документа.
+    """
+    try:
+        return page.extract_text() or ""
+    except Exception as e:
+        logger.error(f"pdfplumber: error reading page {i}: {e}")
+        raise ValueError(f"pdfplumber: error reading page {i}: {e}")
+    finally:
+        page.close()
+
+
+def _iter_pdfplumber(path: str, max_pages: int) -> Iterator[Tuple[int, str]]:
+    try:
+        pdf = pdfplumber.open(path)
+    except FileNotFoundError:
+        logger.error(f"PDF file not found: {path}")
+        raise FileNotFoundError(f"PDF file not found: {path}")
+    except Exception as e:
+        logger.exception(f"pdfplumber: cannot open PDF {path}: {e}")
+        raise ValueError(f"pdfplumber: cannot open PDF {path}: {e}")
+
+    with pdf:
+        try:
+            page_count = len(pdf.pages)
+        except Exception as e:
+            logger.exception(f"pdfplumber: cannot open PDF {path}: {e}")
+            raise ValueError(f"pdfplumber: cannot open PDF {path}: {e}")
+
+        for i in range(_page_limit(path, page_count, max_pages)):
+            yield i, _pdfplumber_page_text(pdf.pages[i], i)
+
+
+def iter_pages_pdfplumber(path: str, max_pages: Optional[int] = None,
+                          max_chars: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Текст PDF по страницам через pdfplumber: генератор (номер страницы с 0, текст).
+    В памяти одновременно только объекты текущей страницы. Ограничители — как в iter_pages_pypdf.
+    """
+    max_pages, max_chars = pdf_limits(max_pages, max_chars)
+    return _limit_chars(path, _iter_pdfplumber(path, max_pages), max_chars)
+
+
+def _pdfplumber_pages(path: str) -> List[str]:
+    return [text for _, text in iter_pages_pdfplumber(path)]
+
+
+def read_pdf_pages_pdfplumber(path: str, use_cache: bool = True) -> List[str]:
+    """
+    Как read_pdf_text_pdfplumber, но возвращает текст по страницам
+    (нужно, например, чтобы находить повторяющиеся колонтитулы).
+    """
+    pages_text = _read_pages("pdfplumber", path, _pdfplumber_pages, use_cache)
+
+    if not any(text.strip() for text in pages_text):
+        logger.error(f"pdfplumber: PDF contains no readable text: {path}")
+        raise ValueError(f"pdfplumber: PDF contains no readable text: {path}")
+
+    return pages_text
+
+
+def read_pdf_text_pdfplumber(path: str, use_cache: bool = True) -> str:
     """
     Читает текст с помощью pdfplumber.
     Лучше восстанавливает строки и расстояния.
     """
-    pages_text = []
+    return "\n".join(read_pdf_pages_pdfplumber(path, use_cache))
 
-    try:
-        with pdfplumber.open(path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                try:
-                    text = page.extract_text() or ""
-                except Exception as e:
-                    logger.error(f"pdfplumber: error reading page {i}: {e}")
-                    raise ValueError(f"pdfplumber: error reading page {i}: {e}")
 
-                pages_text.append(text)
+def _pdfplumber_read_page_range(path: str, start: int, stop: int) -> List[str]:
+    """
+    Воркер для read_pdf_text_pdfplumber_parallel: сам открывает файл
+    и читает страницы [start, stop). Ошибка страницы — ValueError,
+    как в read_pdf_text_pdfplumber.
+    """
+    with pdfplumber.open(path) as pdf:
+        return [_pdfplumber_page_text(pdf.pages[i], i) for i in range(start, stop)]
+
 
+def _split_page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    Делит [0, page_count) на parts непрерывных диапазонов примерно равного размера.
+    """
+    parts = max(1, min(parts, page_count))
+    base, extra = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for k in range(parts):
+        stop = start + base + (1 if k < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _pdfplumber_pages_parallel(path: str, workers: int, min_pages: int,
+                               executor: Optional[ProcessPoolExecutor]) -> List[str]:
+    try:
+        with pdfplumber.open(path) as pdf:
+            page_count = len(pdf.pages)
     except FileNotFoundError:
         logger.error(f"PDF file not found: {path}")
         raise FileNotFoundError(f"PDF file not found: {path}")
@@ -65,6 +252,57 @@ def read_pdf_text_pdfplumber(path: str) -> str:
         logger.exception(f"pdfplumber: cannot open PDF {path}: {e}")
         raise ValueError(f"pdfplumber: cannot open PDF {path}: {e}")
 
+    if workers == 1 or page_count < min_pages:
+        return _pdfplumber_pages(path)
+
+    max_pages, max_chars = pdf_limits()
+    page_count = _page_limit(path, page_count, max_pages)
+    ranges = _split_page_ranges(page_count, workers)
+    logger.debug("pdfplumber parallel: %s, pages=%d, ranges=%s", path, page_count, ranges)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=len(ranges))
+
+    pages_text: List[str] = []
+    try:
+        futures = [executor.submit(_pdfplumber_read_page_range, path, start, stop) for start, stop in ranges]
+        # порядок futures = порядок диапазонов = порядок страниц
+        for future in futures:
+            pages_text.extend(future.result())
+    except Exception as e:
+        logger.exception(f"pdfplumber: cannot open PDF {path}: {e}")
+        raise ValueError(f"pdfplumber: cannot open PDF {path}: {e}")
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+    if max_chars:
+        pages_text = [text for _, text in _limit_chars(path, iter(enumerate(pages_text)), max_chars)]
+    return pages_text
+
+
+def read_pdf_text_pdfplumber_parallel(path: str, workers: Optional[int] = None,
+                                      min_pages: int = 8,
+                                      executor: Optional[ProcessPoolExecutor] = None,
+                                      use_cache: bool = True) -> str:
+    """
+    То же, что read_pdf_text_pdfplumber, но страницы документа делятся
+    на диапазоны и читаются в отдельных процессах (каждый процесс открывает файл сам).
+    Текст собирается обратно в порядке страниц.
+
+    Для коротких документов (< min_pages страниц) накладные расходы на процессы
+    больше выигрыша, поэтому они читаются последовательно.
+    Можно передать уже созданный executor, чтобы не поднимать пул на каждый файл.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    pages_text = _read_pages(
+        "pdfplumber", path,
+        lambda p: _pdfplumber_pages_parallel(p, workers, min_pages, executor),
+        use_cache,
+    )
+
     result = "\n".join(pages_text)
 
     if not result.strip():
@@ -74,11 +312,34 @@ def read_pdf_text_pdfplumber(path: str) -> str:
     return result
 
 
-def read_pdf_text_pymupdf(path: str) -> str:
+def read_many_pdfs_pdfplumber_parallel(paths: List[str], workers: Optional[int] = None,
+                                       use_cache: bool = True) -> Dict[str, str]:
     """
-    Извлекает текст с помощью PyMuPDF (fitz).
-    Обычно лучше восстанавливает структуру формы.
+    Читает много документов одновременно: каждый PDF целиком
+    обрабатывается read_pdf_text_pdfplumber в своём процессе, все ядра заняты.
+
+    Ошибки отдельных файлов не прерывают остальные — для таких путей
+    в результате будет исключение, которое вернул бы read_pdf_text_pdfplumber.
+
+    Returns:
+        dict: {path: text | Exception}
     """
+    workers = workers or os.cpu_count() or 1
+    results: Dict[str, Any] = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {path: executor.submit(read_pdf_text_pdfplumber, path, use_cache) for path in paths}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                logger.error(f"pdfplumber: не удалось прочитать {path}: {e}")
+                results[path] = e
+
+    return results
+
+
+def _iter_pymupdf(path: str, max_pages: int) -> Iterator[Tuple[int, str]]:
     try:
         doc = fitz.open(path)
     except FileNotFoundError:
@@ -88,18 +349,217 @@ def read_pdf_text_pymupdf(path: str) -> str:
         logger.error(f"PyMuPDF: cannot open PDF {path}: {e}")
         raise ValueError(f"PyMuPDF: cannot open PDF {path}: {e}")
 
-    pages_text = []
+    with doc:
+        for i in range(_page_limit(path, doc.page_count, max_pages)):
+            try:
+                page = doc.load_page(i)
+                text = page.get_text("text")  # "text" = "как видит человек"
+            except Exception as e:
+                logger.error(f"PyMuPDF: error reading page {i}: {e}")
+                raise ValueError(f"PyMuPDF: error reading page {i}: {e}")
+            del page
+            yield i, text
+
+
+def iter_pages_pymupdf(path: str, max_pages: Optional[int] = None,
+                       max_chars: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Текст PDF по страницам через PyMuPDF: генератор (номер страницы с 0, текст).
+    Ограничители — как в iter_pages_pypdf.
+    """
+    max_pages, max_chars = pdf_limits(max_pages, max_chars)
+    return _limit_chars(path, _iter_pymupdf(path, max_pages), max_chars)
+
+
+def _pymupdf_pages(path: str) -> List[str]:
+    return [text for _, text in iter_pages_pymupdf(path)]
+
+
+def read_pdf_text_pymupdf(path: str, use_cache: bool = True) -> str:
+    """
+    Извлекает текст с помощью PyMuPDF (fitz).
+    Обычно лучше восстанавливает структуру формы.
+    """
+    pages_text = _read_pages("pymupdf", path, _pymupdf_pages, use_cache)
+
+    return "\n".join(pages_text)
+
+
+# ----------------- auto: быстрый PyMuPDF с откатом на pdfplumber ----------------- #
+
+# Пороги качества страницы, извлечённой PyMuPDF
+AUTO_MIN_CHARS_PER_PAGE = 30       # меньше непробельных символов — подозрительно пустая страница
+AUTO_BROKEN_LINE_MAX_CHARS = 2     # строка из 1-2 символов считается "рваной"
+AUTO_MAX_BROKEN_LINE_RATIO = 0.3   # больше такой доли рваных строк — текст разбит посимвольно
+
 
-    for i, page in enumerate(doc):
+def score_page_text(text: str) -> Dict[str, Any]:
+    """
+    Дешёвые метрики качества текста страницы:
+    chars — непробельные символы, lines — непустые строки,
+    broken_ratio — доля "рваных" строк, labels — найденные заголовки разделов анкеты.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    broken = sum(1 for line in lines if len(line) <= AUTO_BROKEN_LINE_MAX_CHARS)
+    labels = sum(
+        1 for line in lines
+        if len(line) < HEADING_MAX_CHARS and any(p.search(line) for _, p in SECTION_HEADINGS)
+    )
+    return {
+        "chars": sum(len(line.replace(" ", "")) for line in lines),
+        "lines": len(lines),
+        "broken_ratio": broken / len(lines) if lines else 0.0,
+        "labels": labels,
+    }
+
+
+def _page_failure_reason(score: Dict[str, Any], doc_has_labels: bool) -> Optional[str]:
+    if score["chars"] < AUTO_MIN_CHARS_PER_PAGE:
+        return f"chars={score['chars']}"
+    if score["broken_ratio"] > AUTO_MAX_BROKEN_LINE_RATIO:
+        return f"broken_ratio={score['broken_ratio']:.2f}"
+    if not doc_has_labels:
+        # ни одного знакомого заголовка во всём документе — PyMuPDF мог перепутать порядок текста
+        return "no_section_labels"
+    return None
+
+
+def _auto_pages(path: str, use_cache: bool = True) -> List[str]:
+    started = time.perf_counter()
+    pages = list(_read_pages("pymupdf", path, _pymupdf_pages, use_cache))
+    fast_time = time.perf_counter() - started
+
+    scores = [score_page_text(text) for text in pages]
+    doc_has_labels = any(score["labels"] for score in scores)
+
+    failed: Dict[int, str] = {}
+    for i, score in enumerate(scores):
+        reason = _page_failure_reason(score, doc_has_labels)
+        if reason:
+            failed[i] = reason
+        logger.debug(
+            "auto: %s page %d chars=%d broken_ratio=%.2f labels=%d → %s",
+            path, i, score["chars"], score["broken_ratio"], score["labels"],
+            f"pdfplumber ({reason})" if reason else "pymupdf",
+        )
+
+    slow_time = 0.0
+    if failed:
+        started = time.perf_counter()
         try:
-            text = page.get_text("text")  # "text" = "как видит человек"
+            with pdfplumber.open(path) as pdf:
+                for i in sorted(failed):
+                    page_started = time.perf_counter()
+                    text = _pdfplumber_page_text(pdf.pages[i], i)
+                    # пустой ответ pdfplumber не лучше ответа PyMuPDF (например, скан)
+                    if text.strip():
+                        pages[i] = text
+                    logger.debug(
+                        "auto: %s page %d pdfplumber %.3fs", path, i, time.perf_counter() - page_started
+                    )
+        except ValueError:
+            raise
         except Exception as e:
-            logger.error(f"PyMuPDF: error reading page {i}: {e}")
-            raise ValueError(f"PyMuPDF: error reading page {i}: {e}")
+            logger.exception(f"pdfplumber: cannot open PDF {path}: {e}")
+            raise ValueError(f"pdfplumber: cannot open PDF {path}: {e}")
+        slow_time = time.perf_counter() - started
 
-        pages_text.append(text)
+    logger.info(
+        f"auto: {os.path.basename(path)} pages={len(pages)}, pymupdf={len(pages) - len(failed)}, "
+        f"pdfplumber={len(failed)} {sorted(failed)}; pymupdf {fast_time:.3f}s, pdfplumber {slow_time:.3f}s"
+    )
+    return pages
 
-    return "\n".join(pages_text)
+
+# Пороги входят в версию кэша: поменяли пороги — страницы пересчитаются
+EXTRACTOR_VERSIONS["auto"] = (
+    f"{EXTRACTOR_VERSIONS['pymupdf']}+{EXTRACTOR_VERSIONS['pdfplumber']}"
+    f"+c{AUTO_MIN_CHARS_PER_PAGE}b{AUTO_MAX_BROKEN_LINE_RATIO}"
+)
+
+
+def read_pdf_pages_auto(path: str, use_cache: bool = True) -> List[str]:
+    """
+    Постраничный текст в автоматическом режиме: сначала быстрый PyMuPDF,
+    каждая страница оценивается score_page_text, и только не прошедшие
+    проверку страницы перечитываются через pdfplumber.
+    Решения и время по страницам пишутся в лог.
+    """
+    pages_text = _read_pages("auto", path, lambda p: _auto_pages(p, use_cache), use_cache)
+
+    if not any(text.strip() for text in pages_text):
+        logger.error(f"auto: PDF contains no readable text: {path}")
+        raise ValueError(f"auto: PDF contains no readable text: {path}")
+
+    return pages_text
+
+
+def read_pdf_text_auto(path: str, use_cache: bool = True) -> str:
+    return "\n".join(read_pdf_pages_auto(path, use_cache))
+
+
+# Потоковые читатели без кэша: (номер страницы, текст) по одной странице
+PAGE_ITERATORS: Dict[str, Callable[..., Iterator[Tuple[int, str]]]] = {
+    "pypdf": iter_pages_pypdf,
+    "pdfplumber": iter_pages_pdfplumber,
+    "pymupdf": iter_pages_pymupdf,
+}
+
+
+PAGE_READERS: Dict[str, Callable[..., List[str]]] = {
+    "pdfplumber": read_pdf_pages_pdfplumber,
+    "auto": read_pdf_pages_auto,
+}
+
+
+TEXT_READERS: Dict[str, Callable[..., str]] = {
+    "pypdf": read_pdf_text_pypdf,
+    "pdfplumber": read_pdf_text_pdfplumber,
+    "pymupdf": read_pdf_text_pymupdf,
+    "auto": read_pdf_text_auto,
+}
+
+
+def _warm_one(path: str, extractor: str) -> bool:
+    try:
+        TEXT_READERS[extractor](path)
+    except Exception as e:
+        logger.error(f"warm_text_cache: {extractor} не смог прочитать {path}: {e}")
+        return False
+    return True
+
+
+def warm_text_cache(input_dir: str, extractors: Sequence[str] = ("pdfplumber",),
+                    workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Заранее заполняет кэш текста для всех PDF в input_dir
+    (файлы читаются параллельно в пуле процессов).
+
+    Returns:
+        dict: {extractor: количество успешно прочитанных файлов}
+    """
+    if get_text_cache() is None:
+        raise RuntimeError("Кэш текста выключен (PDF_TEXT_CACHE=0)")
+
+    unknown = [e for e in extractors if e not in TEXT_READERS]
+    if unknown:
+        raise ValueError(f"Неизвестные экстракторы: {unknown}, доступны: {list(TEXT_READERS)}")
+
+    paths = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.lower().endswith(".pdf")]
+    logger.info(f"warm_text_cache: {len(paths)} PDF в {input_dir}, экстракторы={list(extractors)}")
+
+    stats = {extractor: 0 for extractor in extractors}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [
+            (extractor, executor.submit(_warm_one, path, extractor))
+            for extractor in extractors for path in paths
+        ]
+        for extractor, future in futures:
+            if future.result():
+                stats[extractor] += 1
+
+    logger.info(f"warm_text_cache: готово {stats}")
+    return stats
 
 
 def extract_form_fields_pypdf(path: str) -> Dict[str, Any]:
@@ -139,7 +599,7 @@ def extract_form_fields_pypdf(path: str) -> Dict[str, Any]:
     return result
 
 
-def compare_extractors(path: str):
+def compare_extractors(path: str, use_cache: bool = True):
     """
     Сравнивает pypdf, pdfplumber и pymupdf.
     Печатает различия в длине текста и примеры.
@@ -149,13 +609,13 @@ def compare_extractors(path: str):
     results = {}
 
     # pypdf
-    results["pypdf"] = read_pdf_text_pypdf(path)
+    results["pypdf"] = read_pdf_text_pypdf(path, use_cache)
 
     # pdfplumber
-    results["pdfplumber"] = read_pdf_text_pdfplumber(path)
+    results["pdfplumber"] = read_pdf_text_pdfplumber(path, use_cache)
 
     # pymupdf
-    results["pymupdf"] = read_pdf_text_pymupdf(path)
+    results["pymupdf"] = read_pdf_text_pymupdf(path, use_cache)
 
     print("\n--- Text lengths ---")
     for name, text in results.items():
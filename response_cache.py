@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+from logging_config import get_logger
+from prompt import prompt_template, target_json_format
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "responses")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+
+
+def make_cache_key(pdf_text: str, model: str, temperature: float, response_format: str = "json_object") -> str:
+    """
+    Ключ кэша = sha256 от текста PDF, шаблона промпта, JSON-схемы,
+    модели, температуры и режима ответа (json_object / json_schema). Любое изменение
+    промпта или настроек модели даёт новый ключ, поэтому старые ответы автоматически перестают использоваться.
+    """
+    h = hashlib.sha256()
+    for part in (pdf_text, prompt_template, target_json_format, model, repr(float(temperature)), response_format):
+        data = part.encode("utf-8")
+        # длина перед каждым куском, чтобы ("ab", "c") и ("a", "bc") не совпадали
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    Постоянный кэш ответов модели на диске.
+
+    Каждый ответ хранится отдельным файлом <key>.json в cache_dir.
+    Время последнего обращения — mtime файла, по нему работает LRU-вытеснение,
+    когда суммарный размер превышает max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # текущий размер считаем один раз, дальше поддерживаем его инкрементально
+        self._total_bytes = sum(size for _, size, _ in self._scan())
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        cache_dir = os.getenv("RESPONSE_CACHE_DIR", DEFAULT_CACHE_DIR)
+        max_mb = os.getenv("RESPONSE_CACHE_MAX_MB")
+        max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+        return cls(cache_dir, max_bytes)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает сохранённый ответ модели (сырую JSON-строку) или None.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                json_str = json.load(f)["response"]
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            logger.debug("ResponseCache: miss %s", key)
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"ResponseCache: повреждённая запись {path}, удаляю: {e}")
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # отмечаем обращение для LRU
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        logger.info("ResponseCache: hit %s", key[:12])
+        return json_str
+
+    def put(self, key: str, json_str: str) -> None:
+        """
+        Сохраняет ответ модели. Запись атомарная (через временный файл),
+        поэтому падение посреди записи не оставит битый кэш.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"response": json_str}, f, ensure_ascii=False)
+            new_size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception(f"ResponseCache: не удалось сохранить запись {path}")
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            self._total_bytes += new_size - old_size
+            over_limit = self._total_bytes > self.max_bytes
+
+        if over_limit:
+            self.evict()
+
+    def _scan(self):
+        """
+        Возвращает список (mtime, size, path) для всех записей кэша.
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def evict(self) -> int:
+        """
+        Удаляет самые давно использованные записи, пока размер кэша
+        не станет <= max_bytes. Возвращает количество удалённых записей.
+        """
+        with self._lock:
+            entries = self._scan()
+            total = sum(size for _, size, _ in entries)
+            self._total_bytes = total
+
+            if total <= self.max_bytes:
+                return 0
+
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                removed += 1
+            self._total_bytes = total
+
+        logger.info(f"ResponseCache: вытеснено записей={removed}, размер={total} байт")
+        return removed
+
+    def clear(self) -> int:
+        """
+        Полностью очищает кэш. Возвращает количество удалённых записей.
+        """
+        removed = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json") or entry.name.endswith(".tmp"):
+                    self._remove(entry.path)
+                    removed += 1
+        with self._lock:
+            self._total_bytes = 0
+        logger.info(f"ResponseCache: кэш очищен, удалено записей={removed}")
+        return removed
+
+    def log_stats(self) -> None:
+        logger.info(f"ResponseCache: hits={self.hits}, misses={self.misses}")
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.exception(f"ResponseCache: не удалось удалить {path}")
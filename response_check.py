@@ -0,0 +1,433 @@
+import copy
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from form_fields import CONVERTERS, FormPrefill
+from logging_config import get_logger
+from schema import RESPONSE_NODE, SchemaNode, path_hint
+
+logger = get_logger(__name__)
+
+
+def response_reask() -> int:
+    """
+    Сколько раз дозапрашивать у модели поля, не прошедшие проверку схемы (RESPONSE_REASK, 0 — не дозапрашивать).
+    Читается при вызове, чтобы значение из .env действовало после load_dotenv().
+    """
+    return int(os.getenv("RESPONSE_REASK", "1"))
+
+
+# ----------------- ремонт JSON ----------------- #
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.S | re.I)
+_BAREWORD_RE = re.compile(r"[A-Za-z0-9_.+\-]+")
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+_TRUNCATED = object()
+
+
+class _Tokens:
+    """
+    Терпимый к ошибкам токенизатор: строки в двойных и одинарных кавычках,
+    литералы JSON и Python (True/None), слова без кавычек, комментарии // и #.
+    Незакрытая строка в конце текста помечается как обрезанная.
+    """
+
+    def __init__(self, text: str, fixes: List[str]):
+        self.text = text
+        self.pos = 0
+        self.fixes = fixes
+
+    def _fix(self, name: str) -> None:
+        if name not in self.fixes:
+            self.fixes.append(name)
+
+    def _skip(self) -> None:
+        text, n = self.text, len(self.text)
+        while self.pos < n:
+            ch = text[self.pos]
+            if ch in " \t\r\n":
+                self.pos += 1
+            elif ch == "/" and text.startswith("//", self.pos) or ch == "#":
+                end = text.find("\n", self.pos)
+                self.pos = n if end < 0 else end
+                self._fix("comments")
+            else:
+                return
+
+    def peek(self) -> Optional[str]:
+        self._skip()
+        return self.text[self.pos] if self.pos < len(self.text) else None
+
+    def next(self) -> Tuple[str, Any]:
+        """
+        (вид, значение): вид — один из "{}[]:," , "value" или "eof".
+        Значение обрезанной строки — _TRUNCATED.
+        """
+        ch = self.peek()
+        if ch is None:
+            return "eof", None
+        if ch in "{}[]:,":
+            self.pos += 1
+            return ch, None
+        if ch in "\"'":
+            return "value", self._string(ch)
+        match = _BAREWORD_RE.match(self.text, self.pos)
+        if match is None:
+            # посторонний символ — пропускаем
+            self.pos += 1
+            self._fix("stray_characters")
+            return self.next()
+        self.pos = match.end()
+        word = match.group()
+        if word in _LITERALS:
+            if word[0].isupper():
+                self._fix("python_literals")
+            return "value", _LITERALS[word]
+        try:
+            return "value", int(word)
+        except ValueError:
+            pass
+        try:
+            return "value", float(word)
+        except ValueError:
+            self._fix("unquoted_strings")
+            return "value", word
+
+    def _string(self, quote: str) -> Any:
+        if quote == "'":
+            self._fix("single_quotes")
+        text, n = self.text, len(self.text)
+        start = self.pos
+        i = start + 1
+        while i < n:
+            ch = text[i]
+            if ch == "\\":
+                i += 2
+                continue
+            if ch == quote:
+                self.pos = i + 1
+                raw = text[start + 1:i]
+                if quote == "'":
+                    raw = raw.replace("\\'", "'").replace('"', '\\"')
+                try:
+                    return json.loads(f'"{raw}"', strict=False)
+                except json.JSONDecodeError:
+                    self._fix("bad_escapes")
+                    return raw.replace('\\"', '"')
+            i += 1
+        self.pos = n
+        return _TRUNCATED
+
+
+class _TolerantParser:
+    def __init__(self, text: str, fixes: List[str]):
+        self.tokens = _Tokens(text, fixes)
+        self.fixes = fixes
+
+    def _fix(self, name: str) -> None:
+        if name not in self.fixes:
+            self.fixes.append(name)
+
+    def value(self, kind: str, token: Any) -> Any:
+        if kind == "{":
+            return self.obj()
+        if kind == "[":
+            return self.array()
+        return token
+
+    def obj(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        while True:
+            kind, token = self.tokens.next()
+            if kind == "}":
+                return result
+            if kind == "eof":
+                self._fix("truncated")
+                return result
+            if kind == ",":
+                continue
+            if kind != "value" or token is _TRUNCATED:
+                self._fix("truncated" if token is _TRUNCATED else "stray_characters")
+                continue
+            key = str(token)
+            if self.tokens.peek() == ":":
+                self.tokens.next()
+            else:
+                self._fix("missing_colons")
+            kind, token = self.tokens.next()
+            if kind == "eof" or token is _TRUNCATED:
+                self._fix("truncated")
+                return result
+            if kind in "}],:":
+                # ключ без значения
+                self._fix("missing_values")
+                if kind == "}":
+                    return result
+                continue
+            item = self.value(kind, token)
+            # скаляр, за которым сразу конец текста, мог быть обрезан ("12" из "125")
+            if kind == "value" and self.tokens.peek() is None:
+                self._fix("truncated")
+                return result
+            result[key] = item
+            if self.tokens.peek() not in (",", "}", None):
+                self._fix("missing_commas")
+
+    def array(self) -> List[Any]:
+        result: List[Any] = []
+        while True:
+            kind, token = self.tokens.next()
+            if kind == "]":
+                return result
+            if kind == "eof" or token is _TRUNCATED:
+                self._fix("truncated")
+                return result
+            if kind in ",:}":
+                continue
+            item = self.value(kind, token)
+            if kind == "value" and self.tokens.peek() is None:
+                self._fix("truncated")
+                return result
+            result.append(item)
+            if self.tokens.peek() not in (",", "]", None):
+                self._fix("missing_commas")
+
+
+def repair_json(text: Any) -> Tuple[Optional[Any], List[str]]:
+    """
+    Разбирает ответ модели, исправляя типовые поломки: текст до и после объекта,
+    ```json```-обёртку, одинарные кавычки, True/False/None, лишние и пропущенные запятые,
+    комментарии, обрезанный конец (незакрытые скобки; недописанное последнее значение отбрасывается).
+
+    Returns:
+        (объект или None, если JSON-объекта в тексте нет; список применённых исправлений)
+    """
+    if not isinstance(text, str):
+        return None, []
+    try:
+        return json.loads(text), []
+    except json.JSONDecodeError:
+        pass
+
+    fixes: List[str] = []
+    fence = _FENCE_RE.search(text)
+    if fence:
+        text = fence.group(1)
+        fixes.append("code_fence")
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return None, fixes
+    if text[:start].strip():
+        fixes.append("leading_text")
+
+    parser = _TolerantParser(text[start:], fixes)
+    kind, token = parser.tokens.next()
+    data = parser.value(kind, token)
+    if parser.tokens.peek() is not None:
+        fixes.append("trailing_text")
+    return data, fixes
+
+
+# ----------------- проверка по схеме ----------------- #
+
+_Checker = Callable[[Any, str, "CheckedResponse"], Any]
+_BOOL_STRINGS = {"true": True, "yes": True, "y": True, "1": True,
+                 "false": False, "no": False, "n": False, "0": False, "": False}
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# Сокращения, которые приводятся к допустимому значению поля (если оно есть среди choices)
+_CHOICE_ALIASES = {"m": "male", "f": "female"}
+
+
+def _join(path: str, key: Any) -> str:
+    return f"{path}.{key}" if path else str(key)
+
+
+def _compile(node: SchemaNode) -> _Checker:
+    """
+    Схема → дерево замыканий: каждое проверяет и приводит значение своего узла.
+    Значение, которое не удалось привести, попадает в errors (путь вида "phq.medications.2.frequency");
+    в данных вместо него — исходная строка или значение по умолчанию.
+    """
+    kind = node.kind
+    if kind == "object":
+        fields = [(name, child, _compile(child)) for name, child in node.fields.items()]
+        names = set(node.fields)
+
+        def check_object(value, path, result):
+            if not isinstance(value, dict):
+                result.errors.append(path)
+                return node.empty()
+            out = {}
+            for name, child, check in fields:
+                child_path = _join(path, name)
+                if child.omit_missing and value.get(name) is None:
+                    result.fix(f"omitted:{child_path}")
+                    continue
+                if name not in value:
+                    if child.kind in ("object", "array") and not child.optional:
+                        result.errors.append(child_path)
+                    else:
+                        result.fix(f"default:{child_path}")
+                    out[name] = child.empty()
+                    continue
+                out[name] = check(value[name], child_path, result)
+            for name in value:
+                if name not in names:
+                    result.fix(f"extra_key:{_join(path, name)}")
+            return out
+        return check_object
+
+    if kind == "array":
+        check_item = _compile(node.item)
+
+        def check_array(value, path, result):
+            if value is None:
+                result.fix(f"default:{path}")
+                return []
+            if isinstance(value, dict) and node.item.kind == "object":
+                # один объект вместо списка из одного
+                result.fix(f"wrapped:{path}")
+                value = [value]
+            if not isinstance(value, list):
+                result.errors.append(path)
+                return []
+            return [check_item(item, _join(path, i), result) for i, item in enumerate(value)]
+        return check_array
+
+    default = node.default
+    choices = {c.lower(): c for c in node.choices} if node.choices else None
+    to_date, to_number, to_int = CONVERTERS["date"], CONVERTERS["float"], CONVERTERS["int"]
+
+    def check_scalar(value, path, result):
+        if value is None:
+            return default
+        if kind == "bool":
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, (int, float)) and value in (0, 1):
+                return bool(value)
+            if isinstance(value, str) and value.strip().lower() in _BOOL_STRINGS:
+                result.fix(f"coerced:{path}")
+                return _BOOL_STRINGS[value.strip().lower()]
+        elif kind in ("int", "float"):
+            if isinstance(value, bool):
+                pass
+            elif isinstance(value, int):
+                return value if kind == "int" else float(value)
+            elif isinstance(value, float):
+                if kind == "float":
+                    return value
+                if value.is_integer():
+                    return int(value)
+            elif isinstance(value, str):
+                if not value.strip():
+                    return default
+                number = (to_int if kind == "int" else to_number)(value)
+                if number is not None:
+                    result.fix(f"coerced:{path}")
+                    return number
+        elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            text = value if isinstance(value, str) else str(value)
+            if kind == "date" and text and not _DATE_RE.match(text):
+                date = to_date(text)
+                if date is None:
+                    result.errors.append(path)
+                    return text
+                result.fix(f"coerced:{path}")
+                return date
+            if choices is not None and text:
+                lowered = text.strip().lower()
+                canonical = choices.get(lowered) or choices.get(_CHOICE_ALIASES.get(lowered, ""))
+                if canonical is None:
+                    result.errors.append(path)
+                    return text
+                return canonical
+            return text
+        result.errors.append(path)
+        return default
+    return check_scalar
+
+
+@dataclass
+class CheckedResponse:
+    data: Dict[str, Any]
+    errors: List[str] = field(default_factory=list)
+    fixes: List[str] = field(default_factory=list)
+
+    def fix(self, name: str) -> None:
+        self.fixes.append(name)
+
+    def reask_prefill(self) -> FormPrefill:
+        """
+        Дозапрос у модели только непрошедших полей (через missing_fields_prompt_template);
+        подсказки формата — из схемы.
+        """
+        paths = list(dict.fromkeys(self.errors))
+        return FormPrefill(copy.deepcopy(self.data), set(), paths,
+                           hints={path: path_hint(path) for path in paths})
+
+    def merge(self, answer_str: str) -> "CheckedResponse":
+        """
+        Сливает ответ дозапроса и проверяет результат заново.
+        Неразборчивый ответ игнорируется — остаётся текущий результат.
+        """
+        answer, _ = repair_json(answer_str)
+        if not isinstance(answer, dict):
+            logger.warning("Дозапрос полей вернул неразборчивый ответ, оставляем исходные значения")
+            return self
+        prefill = self.reask_prefill()
+        merged = prefill.merge_answer(answer, str(self.data.get("uid") or ""))
+        return RESPONSE_SCHEMA.check(json.loads(merged))
+
+    def to_json(self, uid: Optional[str] = None) -> str:
+        """
+        JSON для сохранения (с UID файла, если передан);
+        оставшиеся ошибки схемы отмечаются через check_it / reason_checking.
+        """
+        data = self.data
+        if uid is not None:
+            data = {**data, "uid": uid}
+        if self.errors:
+            data = copy.deepcopy(data)
+            data["check_it"] = True
+            reason = f"не прошли проверку схемы: {', '.join(dict.fromkeys(self.errors))}"
+            data["reason_checking"] = " | ".join(r for r in (data.get("reason_checking"), reason) if r)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class ResponseSchema:
+    """
+    Скомпилированная схема ответа: check(obj) за один проход приводит типы,
+    заполняет пропущенные необязательные поля и собирает пути полей с ошибками.
+    """
+
+    def __init__(self, root: SchemaNode):
+        self.root = root
+        self._check = _compile(root)
+
+    def check(self, data: Any) -> CheckedResponse:
+        result = CheckedResponse({})
+        result.data = self._check(data, "", result)
+        return result
+
+
+RESPONSE_SCHEMA = ResponseSchema(RESPONSE_NODE)
+
+
+def check_response(json_str: str) -> Optional[CheckedResponse]:
+    """
+    Ремонт JSON + проверка по RESPONSE_SCHEMA.
+    None — объекта в ответе нет (сохраняется как _BAD_RESPONSE.txt).
+    """
+    data, repairs = repair_json(json_str)
+    if not isinstance(data, dict):
+        return None
+    result = RESPONSE_SCHEMA.check(data)
+    if repairs:
+        logger.info(f"Ответ модели исправлен локально: {', '.join(repairs)}")
+    if result.errors:
+        logger.info(f"Поля не прошли проверку схемы: {', '.join(result.errors)}")
+    return result
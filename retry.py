@@ -0,0 +1,176 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# Настройки читаются из окружения при создании политики (после load_dotenv), см. get_openai_retry():
+# OPENAI_MAX_RETRIES — сколько раз повторять запрос после временной ошибки (429, 5xx, сеть, таймаут);
+# экспоненциальная пауза — случайная в [0, min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2^попытка)];
+# circuit breaker — после OPENAI_BREAKER_THRESHOLD временных ошибок подряд запросы ждут
+# OPENAI_BREAKER_COOLDOWN секунд.
+
+# HTTP-статусы, после которых запрос имеет смысл повторить
+_TRANSIENT_STATUSES = {408, 409, 429}
+
+
+def is_transient(exc: BaseException) -> bool:
+    """
+    Временная ошибка OpenAI: rate limit, 5xx, обрыв соединения или таймаут.
+    Ошибки запроса (400, 401, 404, ...) не повторяются.
+    """
+    if isinstance(exc, openai.APIConnectionError):  # включая APITimeoutError
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in _TRANSIENT_STATUSES or exc.status_code >= 500
+    return False
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """
+    Значение заголовка Retry-After (в секундах) из ответа OpenAI, если есть.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Общий на все запросы предохранитель: после threshold временных ошибок подряд
+    размыкается на cooldown секунд — новые запросы в это время ждут, а не долбят API.
+    После паузы первая же ошибка снова размыкает его (half-open), первый успех — сбрасывает.
+    """
+
+    def __init__(self, threshold: Optional[int] = None, cooldown: Optional[float] = None):
+        if threshold is None:
+            threshold = int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5"))
+        if cooldown is None:
+            cooldown = float(os.getenv("OPENAI_BREAKER_COOLDOWN", "60"))
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait_seconds(self) -> float:
+        """
+        Сколько ещё ждать до следующего запроса (0 — предохранитель замкнут).
+        """
+        return max(0.0, self.opened_until - time.monotonic())
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.threshold > 0 and self.failures >= self.threshold:
+                self.opened_until = time.monotonic() + self.cooldown
+                # следующая ошибка после паузы размыкает сразу
+                self.failures = self.threshold - 1
+                logger.warning(f"CircuitBreaker: {self.threshold} временных ошибок OpenAI подряд, "
+                               f"пауза {self.cooldown:g} с")
+
+
+class RetryPolicy:
+    """
+    Повтор запросов к OpenAI при временных ошибках: экспоненциальная пауза
+    с полным jitter (учитывает Retry-After) и общий CircuitBreaker.
+    """
+
+    def __init__(self, max_retries: Optional[int] = None, base: Optional[float] = None,
+                 cap: Optional[float] = None, breaker: Optional[CircuitBreaker] = None):
+        if max_retries is None:
+            max_retries = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+        if base is None:
+            base = float(os.getenv("OPENAI_BACKOFF_BASE", "1"))
+        if cap is None:
+            cap = float(os.getenv("OPENAI_BACKOFF_MAX", "60"))
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self.breaker = breaker or CircuitBreaker()
+
+    def delay(self, attempt: int, exc: Optional[BaseException] = None) -> float:
+        """
+        Пауза перед повтором номер attempt (с 0).
+        """
+        delay = random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+        retry_after = retry_after_seconds(exc) if exc is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.cap))
+        return delay
+
+    def _on_error(self, exc: Exception, attempt: int) -> float:
+        """
+        Пауза перед следующей попыткой; пробрасывает exc, если повторять нельзя.
+        """
+        if not is_transient(exc):
+            raise exc
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            logger.error(f"OpenAI: попытки исчерпаны ({attempt + 1}): {exc!r}")
+            raise exc
+        delay = self.delay(attempt, exc)
+        logger.warning(f"OpenAI: временная ошибка {type(exc).__name__}, "
+                       f"попытка {attempt + 1}/{self.max_retries + 1}, повтор через {delay:.1f} с")
+        return delay
+
+    def call(self, fn: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            time.sleep(self.breaker.wait_seconds())
+            try:
+                result = fn()
+            except Exception as exc:
+                time.sleep(self._on_error(exc, attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, fn: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.breaker.wait_seconds())
+            try:
+                result = await fn()
+            except Exception as exc:
+                await asyncio.sleep(self._on_error(exc, attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+
+# Общая политика для всех запросов процесса (и sync, и async), создаётся при первом запросе
+_openai_retry: Optional[RetryPolicy] = None
+_openai_retry_lock = threading.Lock()
+
+
+def get_openai_retry() -> RetryPolicy:
+    """
+    Общая политика повторов; настройки берутся из окружения при первом вызове.
+    """
+    global _openai_retry
+    if _openai_retry is None:
+        with _openai_retry_lock:
+            if _openai_retry is None:
+                _openai_retry = RetryPolicy()
+    return _openai_retry
@@ -0,0 +1,261 @@
+import json
+import typing
+from dataclasses import MISSING, dataclass, field, fields, is_dataclass
+from typing import Annotated, Any, Dict, List, Optional, Tuple
+
+# Схема ответа модели — один раз, типизированными dataclass-ами. Из неё строятся:
+# - компактное описание формата для промпта (prompt.target_json_format);
+# - strict JSON Schema для response_format={"type": "json_schema"};
+# - проверка и приведение типов ответа (response_check.RESPONSE_SCHEMA).
+
+
+@dataclass(frozen=True)
+class Choices:
+    """
+    Допустимые значения строкового поля ("" — поле не заполнено).
+    """
+    values: Tuple[str, ...]
+
+
+class Date(str):
+    """
+    Дата в формате YYYY-MM-DD.
+    """
+
+
+# Допустимые значения phq.medications[].frequency
+MEDICATION_FREQUENCIES = (
+    "Once daily", "Twice daily", "Three times daily", "Four times daily", "Weekly", "Monthly",
+    "Every other day", "At bedtime", "After meals", "Before meals", "As needed",
+)
+
+Gender = Annotated[str, Choices(("male", "female"))]
+Frequency = Annotated[str, Choices(MEDICATION_FREQUENCIES)]
+
+
+@dataclass
+class Applicant:
+    applicant: int = 0
+    # пропущенное моделью значение не подставляется: tables.py считает основным аппликанта с индексом 0
+    is_main_applicant: bool = field(default=False, metadata={"omit_missing": True})
+    firstName: Optional[str] = ""
+    lastName: Optional[str] = ""
+    midName: Optional[str] = ""
+    phone: Optional[str] = ""
+    gender: Optional[Gender] = ""
+    dob: Optional[Date] = ""
+    nicotine: Optional[bool] = False
+    weight: Optional[float] = 0.0
+    height: Optional[int] = 0
+    heightFt: Optional[int] = 0
+    heightIn: Optional[int] = 0
+
+
+@dataclass
+class Plan:
+    id: int = 0
+    priceId: int = 0
+
+
+@dataclass
+class Medication:
+    applicant: int = 0
+    name: str = ""
+    rxcui: str = ""
+    dosage: str = ""
+    dosage_unit: str = ""
+    frequency: Frequency = ""
+    description: str = ""
+
+
+@dataclass
+class IssueDetail:
+    key: str = ""
+    description: str = ""
+
+
+@dataclass
+class Issue:
+    key: str = ""
+    details: List[IssueDetail] = field(default_factory=list)
+
+
+@dataclass
+class Condition:
+    key: str = ""
+    description: str = ""
+
+
+@dataclass
+class Phq:
+    treatment: bool = False
+    invalid: bool = False
+    pregnancy: bool = False
+    effectiveDate: Date = ""
+    disclaimer: bool = False
+    signature: str = ""
+    medications: List[Medication] = field(default_factory=list)
+    issues: List[Issue] = field(default_factory=list)
+    conditions: List[Condition] = field(default_factory=list)
+
+
+@dataclass
+class Address:
+    address1: Optional[str] = ""
+    address2: Optional[str] = ""
+    city: Optional[str] = ""
+    state: Optional[str] = ""
+    zipcode: Optional[str] = ""
+
+
+@dataclass
+class Response:
+    uid: Optional[str] = ""
+    check_it: bool = False
+    reason_checking: str = ""
+    applicants: List[Applicant] = field(default_factory=list)
+    plans: List[Plan] = field(default_factory=list)
+    phq: Phq = field(default_factory=Phq)
+    income: float = 0.0
+    address: Address = field(default_factory=Address)
+
+
+# ----------------- скомпилированное представление ----------------- #
+
+@dataclass
+class SchemaNode:
+    kind: str  # object | array | str | date | bool | int | float
+    optional: bool = False
+    default: Any = None
+    fields: Dict[str, "SchemaNode"] = field(default_factory=dict)
+    item: Optional["SchemaNode"] = None
+    choices: Optional[Tuple[str, ...]] = None
+    # отсутствующее (или null) значение не заполняется по умолчанию при проверке ответа
+    omit_missing: bool = False
+
+    def empty(self) -> Any:
+        if self.kind == "object":
+            return {name: node.empty() for name, node in self.fields.items()}
+        if self.kind == "array":
+            return []
+        return self.default
+
+    def hint(self) -> str:
+        """
+        Компактный формат значения для промпта: {key: type, opt?: type, list: [{...}]}.
+        """
+        if self.kind == "object":
+            return "{" + ", ".join(_field_hint(name, node) for name, node in self.fields.items()) + "}"
+        if self.kind == "array":
+            return f"[{self.item.hint()}]"
+        if self.choices:
+            return "|".join(json.dumps(c) for c in self.choices)
+        return _SCALAR_HINTS[self.kind]
+
+    def json_schema(self) -> Dict[str, Any]:
+        """
+        JSON Schema узла для strict structured output: все поля обязательны,
+        лишние запрещены, необязательные поля допускают null.
+        """
+        if self.kind == "object":
+            schema: Dict[str, Any] = {
+                "type": "object",
+                "properties": {name: node.json_schema() for name, node in self.fields.items()},
+                "required": list(self.fields),
+                "additionalProperties": False,
+            }
+        elif self.kind == "array":
+            schema = {"type": "array", "items": self.item.json_schema()}
+        elif self.choices:
+            schema = {"type": "string", "enum": [*self.choices, ""]}
+        else:
+            schema = {"type": _JSON_TYPES[self.kind]}
+            if self.kind == "date":
+                schema["description"] = "YYYY-MM-DD or empty string"
+        if self.optional:
+            schema["type"] = [schema["type"], "null"]
+            if "enum" in schema:
+                schema["enum"].append(None)
+        return schema
+
+
+_SCALAR_HINTS = {"str": "string", "date": '"YYYY-MM-DD"', "bool": "bool", "int": "int", "float": "float"}
+_JSON_TYPES = {"str": "string", "date": "string", "bool": "boolean", "int": "integer", "float": "number"}
+_PY_KINDS = {str: "str", Date: "date", bool: "bool", int: "int", float: "float"}
+
+
+def _field_hint(name: str, node: SchemaNode) -> str:
+    return f"{name}{'?' if node.optional else ''}: {node.hint()}"
+
+
+def _type_node(tp: Any, default: Any) -> SchemaNode:
+    optional = False
+    if typing.get_origin(tp) is typing.Union:
+        args = [a for a in typing.get_args(tp) if a is not type(None)]
+        optional, tp = True, args[0]
+
+    choices = None
+    if typing.get_origin(tp) is Annotated:
+        tp, *extras = typing.get_args(tp)
+        choices = next((e.values for e in extras if isinstance(e, Choices)), None)
+
+    if typing.get_origin(tp) in (list, List):
+        return SchemaNode("array", optional, item=_type_node(typing.get_args(tp)[0], MISSING))
+    if is_dataclass(tp):
+        node = schema_node(tp)
+        node.optional = optional
+        return node
+    if tp not in _PY_KINDS:
+        raise TypeError(f"schema: неподдерживаемый тип поля {tp!r}")
+    kind = _PY_KINDS[tp]
+    if default is MISSING:
+        default = {"str": "", "date": "", "bool": False, "int": 0, "float": 0.0}[kind]
+    return SchemaNode(kind, optional, default=default, choices=choices)
+
+
+def schema_node(cls: type) -> SchemaNode:
+    """
+    dataclass схемы → дерево SchemaNode (порядок полей сохраняется).
+    """
+    hints = typing.get_type_hints(cls, include_extras=True)
+    node = SchemaNode("object")
+    for f in fields(cls):
+        node.fields[f.name] = _type_node(hints[f.name], f.default)
+        node.fields[f.name].omit_missing = f.metadata.get("omit_missing", False)
+    return node
+
+
+def path_node(root: SchemaNode, path: str) -> SchemaNode:
+    """
+    Узел по пути вида "phq.medications.2.frequency" (индексы списков — числа).
+    """
+    node = root
+    for part in path.split("."):
+        node = node.item if part.isdigit() else node.fields[part]
+    return node
+
+
+def path_hint(path: str, default: str = "string") -> str:
+    try:
+        return path_node(RESPONSE_NODE, path).hint()
+    except (KeyError, AttributeError):
+        return default
+
+
+def prompt_format(node: SchemaNode) -> str:
+    """
+    Формат ответа для промпта: поле верхнего уровня на строку, вложенное — в одну строку.
+    "?" — необязательное поле, "a"|"b" — допустимые значения.
+    """
+    lines = [f"  {_field_hint(name, child)}" for name, child in node.fields.items()]
+    return "{\n" + ",\n".join(lines) + "\n}"
+
+
+def response_format(node: SchemaNode, name: str = "insurance_application") -> Dict[str, Any]:
+    """
+    response_format для chat.completions со strict JSON Schema.
+    """
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": node.json_schema()}}
+
+
+RESPONSE_NODE = schema_node(Response)
@@ -0,0 +1,227 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from logging_config import get_logger
+from response_check import repair_json
+
+logger = get_logger(__name__)
+
+# Заголовки разделов анкеты. Заголовок — короткая строка (< HEADING_MAX_CHARS),
+# совпадающая с шаблоном с начала строки. Порядок важен: берётся первое совпадение.
+SECTION_HEADINGS: List[Tuple[str, re.Pattern]] = [
+    ("member", re.compile(
+        r"^((member|applicant|primary applicant|employee) information\b|[ivx]+\.\s*demographic)", re.I)),
+    ("dependents", re.compile(r"^dependents? information\b", re.I)),
+    ("income", re.compile(r"^(\d+\.\s*)?(yearly income\b|.*income qualification\b)", re.I)),
+    ("medications", re.compile(
+        r"^(\d+\.\s*)?(prescription medications?\b|medication \d+$|name of medication$)", re.I)),
+    # без re.I: названия болезней встречаются и в ответах ("high blood pressure"),
+    # а заголовками они бывают только с заглавных букв
+    ("conditions", re.compile(
+        r"^(\d+\.\s*|[IVX]+\.\s*)?(Conditions or Treatments?|Medical Conditions|Cancer$|"
+        r"Cardiac or Heart|Diabetes$|High Cholesterol$|High Blood Pressure$|Serious Illness|"
+        r"Past 5 Years$|Pending Tests|Additional Details$)")),
+    ("pregnancy", re.compile(r"^(\d+\.\s*|[ivx]+\.\s*)?pregnancy\b", re.I)),
+    ("coverage", re.compile(
+        r"^(\d+\.\s*)?(coverage type$|type of coverage$|employee coverage$|requested effective date$)", re.I)),
+    ("signature", re.compile(r"^(confirm$|accept terms and conditions$|electronic signature$)", re.I)),
+    ("legal", re.compile(
+        r"^(product information$|disclosures and agreements$|phi disclosure$|"
+        r"client privacy notification$|terms and conditions for\b|authorization$)", re.I)),
+]
+
+HEADING_MAX_CHARS = 60
+
+# Текст до первого найденного заголовка
+PREAMBLE = "preamble"
+
+# Разделы, которые не нужны ни одному полю target_json_format
+IRRELEVANT_SECTIONS = {"legal"}
+
+# Группы разделов для длинных документов: каждая группа — отдельный запрос,
+# "keys" — поля верхнего уровня target_json_format, за которые отвечает группа.
+SECTION_GROUPS: Dict[str, Dict[str, List[str]]] = {
+    "applicants": {
+        "sections": [PREAMBLE, "member", "dependents", "income"],
+        "keys": ["uid", "applicants", "income", "address"],
+    },
+    "phq": {
+        "sections": ["medications", "conditions", "pregnancy", "coverage", "signature"],
+        "keys": ["phq", "plans"],
+    },
+}
+
+
+@dataclass
+class Section:
+    key: str
+    title: str
+    page: int
+    start: int  # смещение начала раздела в общем тексте документа
+    end: int    # смещение конца (не включительно)
+
+
+class SectionIndex:
+    """
+    Индекс разделов документа: для каждого заголовка — страница и смещения
+    в тексте, полученном склейкой страниц через "\\n".
+    """
+
+    def __init__(self, text: str, sections: List[Section], page_count: int):
+        self.text = text
+        self.sections = sections
+        self.page_count = page_count
+
+    @classmethod
+    def from_pages(cls, pages: List[str]) -> "SectionIndex":
+        text = "\n".join(pages)
+
+        # начало каждой страницы в общем тексте
+        page_starts = []
+        offset = 0
+        for page in pages:
+            page_starts.append(offset)
+            offset += len(page) + 1
+
+        headings: List[Tuple[int, str, str, int]] = []  # (offset, key, title, page)
+        for page_no, page in enumerate(pages):
+            line_offset = page_starts[page_no]
+            for line in page.split("\n"):
+                stripped = line.strip()
+                if stripped and len(stripped) < HEADING_MAX_CHARS:
+                    for key, pattern in SECTION_HEADINGS:
+                        if pattern.search(stripped):
+                            headings.append((line_offset, key, stripped, page_no))
+                            break
+                line_offset += len(line) + 1
+
+        sections: List[Section] = []
+        first = headings[0][0] if headings else len(text)
+        if first > 0:
+            sections.append(Section(PREAMBLE, "", 0, 0, first))
+
+        for i, (start, key, title, page_no) in enumerate(headings):
+            end = headings[i + 1][0] if i + 1 < len(headings) else len(text)
+            # подряд идущие заголовки одного раздела склеиваем в один диапазон
+            if sections and sections[-1].key == key and sections[-1].end == start:
+                sections[-1].end = end
+                continue
+            sections.append(Section(key, title, page_no, start, end))
+
+        return cls(text, sections, len(pages))
+
+    @property
+    def found_headings(self) -> bool:
+        return any(s.key != PREAMBLE for s in self.sections)
+
+    def text_for(self, keys) -> str:
+        """
+        Текст разделов с заданными ключами в порядке следования в документе.
+        """
+        keys = set(keys)
+        return "\n".join(
+            self.text[s.start:s.end].strip("\n") for s in self.sections if s.key in keys
+        )
+
+    def relevant_text(self) -> str:
+        """
+        Текст только тех разделов, которые нужны схеме. Если ни одного
+        заголовка не нашлось — весь документ (лучше лишний текст, чем потерянные данные).
+        """
+        if not self.found_headings:
+            return self.text
+        keys = {s.key for s in self.sections} - IRRELEVANT_SECTIONS
+        return self.text_for(keys)
+
+    def group_texts(self) -> Dict[str, str]:
+        """
+        Текст по группам SECTION_GROUPS (пустые группы не возвращаются).
+        Разделы, не попавшие ни в одну группу (и не IRRELEVANT), добавляются к группе phq.
+        """
+        grouped = {name: set(group["sections"]) for name, group in SECTION_GROUPS.items()}
+        known = set().union(*grouped.values()) | IRRELEVANT_SECTIONS
+        grouped["phq"] |= {s.key for s in self.sections} - known
+
+        result = {}
+        for name, keys in grouped.items():
+            text = self.text_for(keys)
+            if text.strip():
+                result[name] = text
+        return result
+
+
+# ----------------- слияние частичных ответов ----------------- #
+
+def _is_empty(value: Any) -> bool:
+    return value in (None, "", [], {}, 0, False)
+
+
+def merge_partial_responses(parts: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Сливает ответы модели по группам разделов в один объект target_json_format:
+    - поле верхнего уровня берётся из группы, которая за него отвечает (SECTION_GROUPS[...]["keys"])
+    - если там поле пустое — первое непустое значение из других групп
+    - check_it = OR по всем частям, reason_checking — все непустые причины через " | "
+    """
+    merged: Dict[str, Any] = {}
+
+    for data in parts.values():
+        for key, value in data.items():
+            if key not in merged or (_is_empty(merged[key]) and not _is_empty(value)):
+                merged[key] = value
+
+    for name, data in parts.items():
+        for key in SECTION_GROUPS.get(name, {}).get("keys", []):
+            if key in data and not _is_empty(data[key]):
+                merged[key] = data[key]
+
+    merged["check_it"] = any(bool(data.get("check_it")) for data in parts.values())
+    reasons = []
+    for data in parts.values():
+        reason = str(data.get("reason_checking") or "").strip()
+        if reason and reason not in reasons:
+            reasons.append(reason)
+    merged["reason_checking"] = " | ".join(reasons)
+
+    return merged
+
+
+def merge_partial_json_strings(parts: Dict[str, str]) -> str:
+    """
+    То же, что merge_partial_responses, но для сырых JSON-строк модели.
+    Типовые поломки JSON исправляются (response_check.repair_json); если часть
+    не удалось разобрать — возвращает её как есть, чтобы вызывающий код сохранил её в _BAD_RESPONSE.txt.
+    """
+    parsed: Dict[str, Dict[str, Any]] = {}
+    for name, json_str in parts.items():
+        data, _ = repair_json(json_str)
+        if data is None:
+            logger.error(f"merge_partial_json_strings: группа {name} вернула невалидный JSON")
+            return json_str
+        if not isinstance(data, dict):
+            logger.error(f"merge_partial_json_strings: группа {name} вернула не объект")
+            return json_str
+        parsed[name] = data
+
+    return json.dumps(merge_partial_responses(parsed), ensure_ascii=False)
+
+
+def split_for_prompt(pages: List[str], split_min_pages: int) -> Optional[Dict[str, str]]:
+    """
+    Для документов от split_min_pages страниц возвращает тексты групп разделов
+    (по одному запросу на группу), иначе None.
+    """
+    if len(pages) < split_min_pages:
+        return None
+
+    index = SectionIndex.from_pages(pages)
+    if not index.found_headings:
+        logger.warning("split_for_prompt: заголовки разделов не найдены, документ не делится")
+        return None
+
+    groups = index.group_texts()
+    if len(groups) < 2:
+        return None
+    return groups
@@ -0,0 +1,830 @@
+import abc
+import hashlib
+import json
+import os
+import sqlite3
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import pandas as pd
+
+from logging_config import get_logger
+from text_cache import file_sha256
+
+logger = get_logger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow нужен только для Parquet-приёмника
+    pa = pads = pq = None
+
+# Колонка с ключом строки в общих таблицах
+ROW_KEY = "row_key"
+KEY_SEP = "|"
+
+# Ограничение SQLite на число параметров в одном запросе
+_SQL_CHUNK = 500
+
+
+# ----------------- ключи и отпечатки строк ----------------- #
+
+def _cell(value) -> str:
+    """
+    Значение ячейки как строка — так же, как оно окажется в CSV после to_csv/read_csv(dtype=str).
+    """
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return ""
+    return str(value)
+
+
+def _str_series(values: pd.Series) -> pd.Series:
+    """
+    Векторный аналог values.map(_cell) для скалярных колонок.
+    """
+    if values.dtype == object and values.map(type).isin((list, dict)).any():
+        return values.map(_cell)
+    return values.astype("string").fillna("").astype(object)
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name not in df.columns:
+        return pd.Series([""] * len(df), index=df.index)
+    return _str_series(df[name])
+
+
+def application_keys(df: pd.DataFrame) -> pd.Series:
+    """
+    Ключ строки заявки: uid|applicant_id.
+    """
+    return _column(df, "uid") + KEY_SEP + _column(df, "applicant_id")
+
+
+def medication_keys(df: pd.DataFrame) -> pd.Series:
+    """
+    Ключ строки медикамента: uid|applicant_id|название|доза|единица#n,
+    n — номер повтора одинаковой строки внутри документа (обычно 0).
+    Порядок медикаментов в ответе модели на ключ не влияет.
+    """
+    base = (
+        _column(df, "uid") + KEY_SEP
+        + _column(df, "applicant_id") + KEY_SEP
+        + _column(df, "medication").str.strip().str.lower() + KEY_SEP
+        + _column(df, "dosage").str.strip() + KEY_SEP
+        + _column(df, "dosage_unit").str.strip().str.lower()
+    )
+    return base + "#" + base.groupby(base).cumcount().astype(str)
+
+
+def row_fingerprints(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """
+    Хэш значений строки (в строковом виде) по заданным колонкам —
+    по нему upsert понимает, изменилась ли строка.
+    """
+    cells = [_column(df, c) for c in columns]
+    if not cells:  # таблица без колонок данных (например, документ без медикаментов в новой таблице)
+        cells = [pd.Series([""] * len(df), index=df.index)]
+    joined = cells[0].str.cat(cells[1:], sep="\x1f") if len(cells) > 1 else cells[0]
+    return joined.map(lambda s: hashlib.sha1(s.encode("utf-8")).hexdigest()[:16])
+
+
+# ----------------- индекс ключей ----------------- #
+
+class KeyIndex:
+    """
+    Персистентный индекс живых строк таблицы: key → (uid, отпечаток).
+    Хранится в SQLite рядом с CSV, поэтому upsert поднимает только ключи
+    затронутых uid, а не всю историю.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, uid TEXT, fp TEXT)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS rows_uid ON rows (uid)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get_meta(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def get_int(self, name: str) -> int:
+        return int(self.get_meta(name, "0"))
+
+    def set_meta(self, **values) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+            [(k, str(v)) for k, v in values.items()],
+        )
+
+    def lookup_uids(self, uids: Iterable[str]) -> Dict[str, str]:
+        """
+        {key: fp} для всех живых строк заданных uid.
+        """
+        uids = list(uids)
+        result: Dict[str, str] = {}
+        for i in range(0, len(uids), _SQL_CHUNK):
+            chunk = uids[i:i + _SQL_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            for key, fp in self.conn.execute(
+                    f"SELECT key, fp FROM rows WHERE uid IN ({placeholders})", chunk):
+                result[key] = fp
+        return result
+
+    def apply(self, upserts: List[tuple], deletes: List[str]) -> None:
+        self.conn.executemany("INSERT OR REPLACE INTO rows (key, uid, fp) VALUES (?, ?, ?)", upserts)
+        self.conn.executemany("DELETE FROM rows WHERE key = ?", [(k,) for k in deletes])
+
+    def live_keys(self) -> Set[str]:
+        return {key for (key,) in self.conn.execute("SELECT key FROM rows")}
+
+    def reset(self, rows: List[tuple]) -> None:
+        self.conn.execute("DELETE FROM rows")
+        self.conn.executemany("INSERT INTO rows (key, uid, fp) VALUES (?, ?, ?)", rows)
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+
+# ----------------- CSV-таблица с upsert ----------------- #
+
+class CsvTableStore:
+    """
+    Общая CSV-таблица, в которую только дописывают:
+    - у каждой строки есть ключ (колонка row_key), индекс ключей лежит в <csv>.idx
+    - upsert по документу (uid): новые и изменённые строки дописываются в конец файла,
+      строки uid, которых больше нет в ответе, считаются удалёнными
+    - устаревшие версии строк остаются в файле до compaction, которая запускается,
+      когда их доля превышает compact_ratio
+
+    Живое содержимое таблицы — read() (последняя версия каждого живого ключа).
+    """
+
+    def __init__(self, path: str, key_fn: Callable[[pd.DataFrame], pd.Series],
+                 compact_ratio: Optional[float] = None):
+        self.path = path
+        self.key_fn = key_fn
+        # доля устаревших строк в CSV, после которой файл переписывается (compaction);
+        # по умолчанию TABLES_COMPACT_RATIO (0.2), читается при создании хранилища
+        if compact_ratio is None:
+            compact_ratio = float(os.getenv("TABLES_COMPACT_RATIO", "0.2"))
+        self.compact_ratio = compact_ratio
+        self.index_path = path + ".idx"
+
+    # --- чтение ---
+
+    def _read_raw(self) -> pd.DataFrame:
+        return pd.read_csv(self.path, dtype=str, keep_default_na=False)
+
+    def _header(self) -> List[str]:
+        return pd.read_csv(self.path, nrows=0).columns.tolist()
+
+    def read(self) -> pd.DataFrame:
+        """
+        Живые строки таблицы (все значения — строки, как в CSV).
+        """
+        if not os.path.exists(self.path):
+            return pd.DataFrame()
+        df = self._read_raw()
+        index = KeyIndex(self.index_path)
+        try:
+            live = index.live_keys()
+        finally:
+            index.close()
+        df = df.drop_duplicates(ROW_KEY, keep="last")
+        return df[df[ROW_KEY].isin(live)].reset_index(drop=True)
+
+    # --- запись ---
+
+    def _write_full(self, df: pd.DataFrame, index: KeyIndex) -> None:
+        """
+        Переписывает CSV целиком (атомарно) и пересобирает индекс по df.
+        """
+        data_columns = [c for c in df.columns if c != ROW_KEY]
+        tmp_path = self.path + ".tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+        fps = row_fingerprints(df, data_columns)
+        index.reset(list(zip(df[ROW_KEY], _column(df, "uid"), fps)))
+        index.set_meta(rows_in_file=len(df), dead_rows=0, file_size=os.path.getsize(self.path))
+        index.commit()
+
+    def _prepare_existing(self, index: KeyIndex, new_columns: List[str]) -> Optional[List[str]]:
+        """
+        Проверяет, что CSV и индекс согласованы и в файле есть все нужные колонки.
+        Иначе (старый CSV без row_key, CSV изменён вручную, появились новые колонки)
+        переписывает файл и индекс. Возвращает колонки файла или None, если файла нет.
+        """
+        if not os.path.exists(self.path):
+            # CSV удалён — индекс от него больше не действителен
+            index.reset([])
+            index.set_meta(rows_in_file=0, dead_rows=0, file_size=0)
+            return None
+
+        header = self._header()
+        in_sync = (
+            ROW_KEY in header
+            and index.get_meta("file_size") == str(os.path.getsize(self.path))
+        )
+        missing = [c for c in new_columns if c not in header]
+        if in_sync and not missing:
+            return header
+
+        logger.info(f"CsvTableStore: пересборка {self.path} "
+                    f"(индекс согласован={in_sync}, новые колонки={missing})")
+        df = self._read_raw()
+        if ROW_KEY not in df.columns:
+            df[ROW_KEY] = self.key_fn(df)
+        if in_sync:
+            df = df[df[ROW_KEY].isin(index.live_keys())]
+        df = df.drop_duplicates(ROW_KEY, keep="last")
+        for column in missing:
+            df[column] = ""
+        columns = [c for c in df.columns if c != ROW_KEY] + [ROW_KEY]
+        self._write_full(df[columns].reset_index(drop=True), index)
+        return columns
+
+    def compact(self, index: Optional[KeyIndex] = None) -> None:
+        """
+        Переписывает CSV, оставляя только последнюю версию живых строк.
+        """
+        own_index = index is None
+        index = index or KeyIndex(self.index_path)
+        try:
+            df = self._read_raw()
+            df = df.drop_duplicates(ROW_KEY, keep="last")
+            df = df[df[ROW_KEY].isin(index.live_keys())].reset_index(drop=True)
+            before = index.get_int("rows_in_file")
+            self._write_full(df, index)
+            logger.info(f"CsvTableStore: compaction {self.path}: строк {before} → {len(df)}")
+        finally:
+            if own_index:
+                index.close()
+
+    def upsert(self, df_new: pd.DataFrame, uids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Upsert строк документов. uids — документы, которые обновляются целиком
+        (по умолчанию — uid из df_new); их строки, отсутствующие в df_new, удаляются.
+
+        Returns:
+            dict: added / updated / unchanged / deleted / compacted
+        """
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0, "compacted": 0}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        df = df_new.copy()
+        if ROW_KEY in df.columns:
+            df = df.drop(columns=[ROW_KEY])
+        data_columns = list(df.columns)
+        df[ROW_KEY] = self.key_fn(df) if len(df) else pd.Series(dtype=str)
+        df = df.drop_duplicates(ROW_KEY, keep="last")
+
+        uid_set = set(_column(df, "uid")) | {_cell(u) for u in (uids or [])}
+        if not uid_set:
+            return stats
+
+        index = KeyIndex(self.index_path)
+        try:
+            header = self._prepare_existing(index, data_columns)
+            columns = header or data_columns + [ROW_KEY]
+
+            existing = index.lookup_uids(uid_set)
+            fps = row_fingerprints(df, [c for c in columns if c != ROW_KEY])
+            keys = df[ROW_KEY].tolist()
+            uids_col = _column(df, "uid").tolist()
+
+            changed_mask = []
+            upserts = []
+            for key, uid, fp in zip(keys, uids_col, fps):
+                old = existing.get(key)
+                if old == fp:
+                    stats["unchanged"] += 1
+                    changed_mask.append(False)
+                    continue
+                stats["added" if old is None else "updated"] += 1
+                changed_mask.append(True)
+                upserts.append((key, uid, fp))
+
+            new_keys = set(keys)
+            deletes = [key for key in existing if key not in new_keys]
+            stats["deleted"] = len(deletes)
+
+            changed = df[changed_mask].reindex(columns=columns)
+            if len(changed):
+                changed.to_csv(self.path, mode="a", index=False, header=header is None)
+
+            index.apply(upserts, deletes)
+            rows_in_file = (index.get_int("rows_in_file") if header else 0) + len(changed)
+            dead_rows = (index.get_int("dead_rows") if header else 0) + stats["updated"] + stats["deleted"]
+            index.set_meta(
+                rows_in_file=rows_in_file,
+                dead_rows=dead_rows,
+                file_size=os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            )
+            index.commit()
+
+            if rows_in_file and dead_rows / rows_in_file > self.compact_ratio:
+                self.compact(index)
+                stats["compacted"] = 1
+        finally:
+            index.close()
+
+        logger.info(f"CsvTableStore.upsert {self.path}: {stats}")
+        return stats
+
+
+# ----------------- приёмники таблиц ----------------- #
+
+class TableSink(abc.ABC):
+    """
+    Куда пишутся строки build_main_records / build_medication_records.
+    """
+
+    @abc.abstractmethod
+    def write(self, main_df: pd.DataFrame, meds_df: pd.DataFrame) -> Dict[str, Dict[str, int]]:
+        """Записывает батч строк, возвращает статистику по таблицам."""
+
+    def close(self) -> None:
+        pass
+
+
+class CsvTableSink(TableSink):
+    """
+    applications.csv / medications.csv с upsert по ключу (CsvTableStore).
+    """
+
+    def __init__(self, output_dir: str, main_filename: str = "applications.csv",
+                 meds_filename: str = "medications.csv"):
+        self.main_store = CsvTableStore(os.path.join(output_dir, main_filename), application_keys)
+        self.meds_store = CsvTableStore(os.path.join(output_dir, meds_filename), medication_keys)
+        self.main_filename = main_filename
+        self.meds_filename = meds_filename
+
+    def write(self, main_df: pd.DataFrame, meds_df: pd.DataFrame) -> Dict[str, Dict[str, int]]:
+        # документы, которые пришли в этом батче: у документа без медикаментов
+        # старые строки medications тоже должны удалиться
+        uids = set(main_df["uid"].tolist()) if "uid" in main_df.columns else set()
+        return {
+            self.main_filename: self.main_store.upsert(main_df, uids),
+            self.meds_filename: self.meds_store.upsert(meds_df, uids),
+        }
+
+
+# ----------------- схема таблиц ----------------- #
+
+# Явные типы всех колонок build_main_records / build_medication_records.
+# Типы: string, bool, int64, float64, date (YYYY-MM-DD), timestamp (UTC).
+APPLICATIONS_SCHEMA: Dict[str, str] = {
+    "uid": "string",
+    "check_it": "bool",
+    "reason_checking": "string",
+    "status": "string",
+    "true_tier": "string",
+    "applicant_id": "int64",
+    "is_main_applicant": "bool",
+    "firstName": "string",
+    "lastName": "string",
+    "midName": "string",
+    "phone": "string",
+    "gender": "string",
+    "dob": "date",
+    "nicotine": "bool",
+    "weight": "float64",
+    "height": "int64",
+    "heightFt": "int64",
+    "heightIn": "int64",
+    "medications": "string",
+    "dosages": "string",
+    "dosage_unit": "string",
+    "frequencies": "string",
+    "descriptions": "string",
+    "combine_reasons": "string",
+    "reason_checking_logs": "string",
+    "reason_checking_med": "string",
+    "reason_checking_dosage_unit": "string",
+    ROW_KEY: "string",
+    "ingested_at": "timestamp",
+}
+
+MEDICATIONS_SCHEMA: Dict[str, str] = {
+    "uid": "string",
+    "applicant_id": "int64",
+    "medication": "string",
+    "rxcui": "string",
+    "rxnorm_name": "string",
+    "dosage": "string",
+    "dosage_unit": "string",
+    "standardized_dose": "string",
+    "standardized_unit": "string",
+    "check_it": "bool",
+    "reason_checking": "string",
+    "reason_checking_dosage_unit": "string",
+    "frequency": "string",
+    "description": "string",
+    ROW_KEY: "string",
+    "ingested_at": "timestamp",
+}
+
+TABLE_SCHEMAS = {"applications": APPLICATIONS_SCHEMA, "medications": MEDICATIONS_SCHEMA}
+TABLE_KEY_FNS = {"applications": application_keys, "medications": medication_keys}
+
+_TRUE = {"true", "1", "yes", "y"}
+_FALSE = {"false", "0", "no", "n", ""}
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = _cell(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    return None
+
+
+def coerce_frame(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Приводит DataFrame к схеме: порядок колонок как в схеме, nullable-типы pandas,
+    отсутствующие колонки — пустые. Неприводимые значения (например, "10-20" в float) → NA.
+    Колонки не из схемы сохраняются как string (с предупреждением).
+    """
+    result = pd.DataFrame(index=df.index)
+    for column, kind in schema.items():
+        values = df[column] if column in df.columns else pd.Series([None] * len(df), index=df.index)
+        if kind == "string":
+            result[column] = _str_series(values).astype("string")
+        elif kind == "bool":
+            result[column] = values.map(_to_bool).astype("boolean")
+        elif kind == "int64":
+            result[column] = pd.to_numeric(values, errors="coerce").round().astype("Int64")
+        elif kind == "float64":
+            result[column] = pd.to_numeric(values, errors="coerce").astype("Float64")
+        elif kind == "date":
+            result[column] = pd.to_datetime(values, errors="coerce", format="%Y-%m-%d").dt.date
+        elif kind == "timestamp":
+            result[column] = pd.to_datetime(values, errors="coerce", utc=True)
+        else:
+            raise ValueError(f"coerce_frame: неизвестный тип {kind!r} у колонки {column!r}")
+
+    extra = [c for c in df.columns if c not in schema]
+    if extra:
+        logger.warning(f"coerce_frame: колонки вне схемы сохраняются как string: {extra}")
+        for column in extra:
+            result[column] = _str_series(df[column]).astype("string")
+    return result.reset_index(drop=True)
+
+
+def arrow_schema(schema: Dict[str, str]):
+    types = {
+        "string": pa.string(),
+        "bool": pa.bool_(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(column, types[kind]) for column, kind in schema.items()])
+
+
+# ----------------- Parquet ----------------- #
+
+PARTITION_COLUMN = "ingest_date"
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("Для Parquet нужен pyarrow: pip install pyarrow")
+
+
+class ParquetTableSink(TableSink):
+    """
+    Типизированные таблицы в Parquet, разбитые по дате загрузки:
+        <root>/<table>/ingest_date=YYYY-MM-DD/part-<время>-<id>.parquet
+
+    Каждый батч — новый файл, старые файлы не переписываются.
+    Повторно загруженный документ даёт новую версию строк с тем же row_key;
+    read_parquet_table по умолчанию оставляет только последнюю.
+    """
+
+    def __init__(self, root_dir: str, compression: str = "zstd"):
+        _require_pyarrow()
+        self.root_dir = root_dir
+        self.compression = compression
+
+    def _write_table(self, name: str, df: pd.DataFrame, now: datetime) -> Dict[str, int]:
+        if df.empty:
+            return {"rows": 0, "files": 0}
+
+        df = df.copy()
+        df[ROW_KEY] = TABLE_KEY_FNS[name](df)
+        df["ingested_at"] = now
+        typed = coerce_frame(df, TABLE_SCHEMAS[name])
+
+        schema = dict(TABLE_SCHEMAS[name])
+        schema.update({c: "string" for c in typed.columns if c not in schema})
+        table = pa.Table.from_pandas(typed, schema=arrow_schema(schema), preserve_index=False)
+
+        part_dir = os.path.join(self.root_dir, name, f"{PARTITION_COLUMN}={now:%Y-%m-%d}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"part-{now:%H%M%S%f}-{uuid.uuid4().hex[:8]}.parquet")
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path, compression=self.compression)
+        os.replace(tmp_path, path)
+
+        logger.info(f"ParquetTableSink: {name} строк={len(typed)} → {path}")
+        return {"rows": len(typed), "files": 1}
+
+    def write(self, main_df: pd.DataFrame, meds_df: pd.DataFrame) -> Dict[str, Dict[str, int]]:
+        now = datetime.now(timezone.utc)
+        return {
+            "applications": self._write_table("applications", main_df, now),
+            "medications": self._write_table("medications", meds_df, now),
+        }
+
+
+def read_parquet_table(root_dir: str, name: str, columns: Optional[List[str]] = None,
+                       since: Optional[str] = None, until: Optional[str] = None,
+                       latest: bool = True) -> pd.DataFrame:
+    """
+    Читает таблицу Parquet: только нужные колонки и только партиции
+    ingest_date в [since, until] (даты YYYY-MM-DD, границы включительно).
+    latest=True — по одной (последней загруженной) версии каждой строки.
+    """
+    _require_pyarrow()
+    path = os.path.join(root_dir, name)
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns or list(TABLE_SCHEMAS[name]))
+
+    # схема задаётся явно: в файлах, записанных до появления новых колонок, они будут пустыми
+    schema = arrow_schema(TABLE_SCHEMAS[name]).append(pa.field(PARTITION_COLUMN, pa.string()))
+    dataset = pads.dataset(
+        path, format="parquet", schema=schema,
+        partitioning=pads.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive"),
+    )
+
+    flt = None
+    if since:
+        flt = pads.field(PARTITION_COLUMN) >= since
+    if until:
+        cond = pads.field(PARTITION_COLUMN) <= until
+        flt = cond if flt is None else flt & cond
+
+    read_columns = list(columns) if columns else None
+    if latest and read_columns is not None:
+        read_columns += [c for c in (ROW_KEY, "ingested_at") if c not in read_columns]
+
+    df = dataset.to_table(columns=read_columns, filter=flt).to_pandas(types_mapper=pd.ArrowDtype)
+    if latest and not df.empty:
+        df = df.sort_values("ingested_at", kind="stable").drop_duplicates(ROW_KEY, keep="last")
+        if columns:
+            df = df[list(columns)]
+    return df.reset_index(drop=True)
+
+
+# ----------------- SQLite ----------------- #
+
+_SQLITE_TYPES = {
+    "string": "TEXT",
+    "bool": "INTEGER",
+    "int64": "INTEGER",
+    "float64": "REAL",
+    "date": "TEXT",
+    "timestamp": "TEXT",
+}
+
+# Сколько строк отправлять в один executemany
+SQLITE_BATCH_ROWS = 5000
+
+
+def _sqlite_columns(typed: pd.DataFrame, schema: Dict[str, str]) -> List[list]:
+    """
+    Колонки typed (после coerce_frame) как списки значений, понятных sqlite3:
+    bool → 0/1, date/timestamp → ISO-строка, NA → None.
+    """
+    columns = []
+    for column, kind in schema.items():
+        values = typed[column]
+        if kind == "bool":
+            values = values.astype("Int64")
+        elif kind == "date":
+            values = pd.to_datetime(values).dt.strftime("%Y-%m-%d")
+        elif kind == "timestamp":
+            # все значения в UTC, формат как у datetime.isoformat()
+            values = values.dt.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+        columns.append(values.astype(object).where(values.notna(), None).tolist())
+    return columns
+
+
+class SqliteTableSink(TableSink):
+    """
+    Таблицы applications / medications в одной SQLite-базе:
+    - applications: строка на аппликанта, ключ (uid, applicant_id)
+    - medications: строка на медикамент со ссылкой на (uid, applicant_id);
+      внешний ключ не объявлен: модель может вернуть медикамент для аппликанта,
+      которого нет в applicants, и такой батч не должен откатываться целиком
+    - индексы по uid, medication (без учёта регистра) и check_it
+    - WAL: читатели не блокируются, пока идёт запись
+
+    write() — одна транзакция на батч: документ (uid) заменяется целиком,
+    аппликанты upsert-ятся по (uid, applicant_id), медикаменты документа пересоздаются.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self) -> None:
+        app_columns = ",\n".join(
+            f'"{c}" {_SQLITE_TYPES[t]}' for c, t in APPLICATIONS_SCHEMA.items() if c != ROW_KEY
+        )
+        med_columns = ",\n".join(
+            f'"{c}" {_SQLITE_TYPES[t]}' for c, t in MEDICATIONS_SCHEMA.items() if c != ROW_KEY
+        )
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS applications (
+                {app_columns},
+                PRIMARY KEY (uid, applicant_id)
+            );
+            CREATE TABLE IF NOT EXISTS medications (
+                id INTEGER PRIMARY KEY,
+                {med_columns}
+            );
+        """)
+        # база из прошлой версии: недостающие колонки схемы добавляются пустыми
+        for table, schema in (("applications", APPLICATIONS_SCHEMA), ("medications", MEDICATIONS_SCHEMA)):
+            existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            for column, kind in schema.items():
+                if column != ROW_KEY and column not in existing:
+                    logger.info(f"SqliteTableSink: добавляется колонка {table}.{column}")
+                    self.conn.execute(f'ALTER TABLE {table} ADD COLUMN "{column}" {_SQLITE_TYPES[kind]}')
+        self.conn.executescript("""
+            CREATE INDEX IF NOT EXISTS applications_check_it ON applications (check_it, ingested_at);
+            CREATE INDEX IF NOT EXISTS medications_uid ON medications (uid, applicant_id);
+            CREATE INDEX IF NOT EXISTS medications_name ON medications (medication COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS medications_check_it ON medications (check_it, ingested_at);
+            CREATE INDEX IF NOT EXISTS medications_rxcui ON medications (rxcui);
+        """)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    @staticmethod
+    def _rows(df: pd.DataFrame, schema: Dict[str, str], now: datetime):
+        # ingested_at одинаковый для всего батча — подставляем готовой строкой
+        schema = {c: t for c, t in schema.items() if c not in (ROW_KEY, "ingested_at")}
+        typed = coerce_frame(df[[c for c in df.columns if c in schema]], schema)
+        columns = _sqlite_columns(typed, schema)
+        columns.append([now.isoformat()] * len(typed))
+        return list(schema) + ["ingested_at"], list(zip(*columns))
+
+    def write(self, main_df: pd.DataFrame, meds_df: pd.DataFrame) -> Dict[str, Dict[str, int]]:
+        now = datetime.now(timezone.utc)
+        app_columns, app_rows = self._rows(main_df, APPLICATIONS_SCHEMA, now)
+        med_columns, med_rows = self._rows(meds_df, MEDICATIONS_SCHEMA, now)
+
+        uids = sorted({row[0] for row in app_rows} | {row[0] for row in med_rows})
+        keys = {(row[0], row[app_columns.index("applicant_id")]) for row in app_rows}
+
+        quoted = ", ".join(f'"{c}"' for c in app_columns)
+        updates = ", ".join(f'"{c}" = excluded."{c}"' for c in app_columns if c not in ("uid", "applicant_id"))
+        upsert_sql = (
+            f"INSERT INTO applications ({quoted}) VALUES ({', '.join('?' * len(app_columns))}) "
+            f"ON CONFLICT (uid, applicant_id) DO UPDATE SET {updates}"
+        )
+        quoted_meds = ", ".join(f'"{c}"' for c in med_columns)
+        insert_meds_sql = (
+            f"INSERT INTO medications ({quoted_meds}) VALUES ({', '.join('?' * len(med_columns))})"
+        )
+
+        stats = {"applications": {"upserted": 0, "deleted": 0}, "medications": {"inserted": 0, "deleted": 0}}
+        with self.conn:  # одна транзакция: читатели видят либо старый, либо новый батч целиком
+            for i in range(0, len(uids), _SQL_CHUNK):
+                chunk = uids[i:i + _SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                cur = self.conn.execute(f"DELETE FROM medications WHERE uid IN ({placeholders})", chunk)
+                stats["medications"]["deleted"] += cur.rowcount
+                stale = [
+                    (uid, applicant_id) for uid, applicant_id in self.conn.execute(
+                        f"SELECT uid, applicant_id FROM applications WHERE uid IN ({placeholders})", chunk)
+                    if (uid, applicant_id) not in keys
+                ]
+                self.conn.executemany("DELETE FROM applications WHERE uid = ? AND applicant_id = ?", stale)
+                stats["applications"]["deleted"] += len(stale)
+
+            for i in range(0, len(app_rows), SQLITE_BATCH_ROWS):
+                self.conn.executemany(upsert_sql, app_rows[i:i + SQLITE_BATCH_ROWS])
+            stats["applications"]["upserted"] = len(app_rows)
+
+            for i in range(0, len(med_rows), SQLITE_BATCH_ROWS):
+                self.conn.executemany(insert_meds_sql, med_rows[i:i + SQLITE_BATCH_ROWS])
+            stats["medications"]["inserted"] = len(med_rows)
+
+        logger.info(f"SqliteTableSink: {self.path} {stats}")
+        return stats
+
+
+def connect_sqlite_readonly(path: str) -> sqlite3.Connection:
+    """
+    Соединение только для чтения: в WAL-режиме не мешает параллельной записи.
+    """
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def applicants_on_medication(conn: sqlite3.Connection, name: str) -> pd.DataFrame:
+    """
+    Аппликанты, у которых есть медикамент name (без учёта регистра).
+    """
+    return pd.read_sql_query(
+        """
+        SELECT a.*, m.dosage AS med_dosage, m.dosage_unit AS med_dosage_unit, m.frequency AS med_frequency
+        FROM medications m
+        JOIN applications a ON a.uid = m.uid AND a.applicant_id = m.applicant_id
+        WHERE m.medication = ? COLLATE NOCASE
+        """,
+        conn, params=(name,),
+    )
+
+
+def flagged_since(conn: sqlite3.Connection, since: str) -> pd.DataFrame:
+    """
+    Строки applications с check_it, загруженные начиная с since (ISO-дата/время, UTC).
+    """
+    return pd.read_sql_query(
+        "SELECT * FROM applications WHERE check_it = 1 AND ingested_at >= ? ORDER BY ingested_at",
+        conn, params=(since,),
+    )
+
+
+# ----------------- манифест загруженных файлов ----------------- #
+
+class IngestManifest:
+    """
+    Какие *_response.json уже загружены в таблицы: путь → (size, mtime_ns, sha256).
+    Файл с тем же размером и mtime считается неизменённым без чтения;
+    при изменившемся mtime сверяется хэш содержимого.
+    Хранится JSON-файлом, запись атомарная (tmp + os.replace).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("files", {})
+            except (OSError, json.JSONDecodeError):
+                logger.exception(f"IngestManifest: не удалось прочитать {path}, начинаю с пустого")
+
+    def is_ingested(self, path: str) -> bool:
+        entry = self.entries.get(os.path.basename(path))
+        if entry is None:
+            return False
+        st = os.stat(path)
+        if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return True
+        if entry["size"] != st.st_size:
+            return False
+        # mtime изменился (копирование, touch) — сверяем содержимое
+        if file_sha256(path) == entry["sha256"]:
+            entry["mtime_ns"] = st.st_mtime_ns
+            return True
+        return False
+
+    def mark(self, path: str) -> None:
+        st = os.stat(path)
+        self.entries[os.path.basename(path)] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": file_sha256(path),
+        }
+
+    def prune(self, existing_names: Iterable[str]) -> int:
+        """
+        Убирает записи о файлах, которых больше нет. Возвращает их количество.
+        """
+        existing = set(existing_names)
+        removed = [name for name in self.entries if name not in existing]
+        for name in removed:
+            del self.entries[name]
+        return len(removed)
+
+    def clear(self) -> None:
+        self.entries = {}
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -1,9 +1,16 @@
+import argparse
 import json
-from typing import Tuple, Dict, Any, List
+from typing import Tuple, Dict, Any, List, Optional
 import os
+import numpy as np
 import pandas as pd
-import re
+from dosage import parse_dose
+from drug_resolver import get_drug_resolver
 from logging_config import setup_logging, get_logger
+from table_store import (
+    CsvTableSink, CsvTableStore, IngestManifest, ParquetTableSink, SqliteTableSink, TableSink,
+    application_keys, medication_keys,
+)
 
 logger = get_logger(__name__)
 
@@ -11,7 +18,8 @@ logger = get_logger(__name__)
 MAIN_TABLE_FILENAME = "applications.csv"
 MEDS_TABLE_FILENAME = "medications.csv"
 
-VALID_UNITS = {"mg", "mg/ml"}
+# Куда писать таблицы: csv, parquet, sqlite или несколько через запятую
+SINK_NAMES = ("csv", "parquet", "sqlite")
 
 
 def split_values(cell: object) -> List[str]:
@@ -50,35 +58,27 @@ def safe_join(values, placeholder="NaN"):
 
 def normalize_dosage_value(dosage: str, dosage_unit: str):
     """
-    Преобразует дозу в стандартный формат (mg или mg/ml).
-    Возвращает (standardized_dose: float | None, standardized_unit: str | None)
+    Преобразует дозу в стандартный формат (mg, mg/ml, mcg/hr, unit, ml, meq, %),
+    см. dosage.parse_dose. Диапазоны и комбинации остаются строкой: "12.5-20", "10/12.5".
+    Возвращает (standardized_dose: str | None, standardized_unit: str | None)
     """
-
-    logger.debug(f"Нормализация дозировки: dosage='{dosage}', unit='{dosage_unit}'")
-
-    if not dosage or not dosage_unit:
-        logger.warning("normalize_dosage_value: dosage или dosage_unit отсутствуют")
+    dose = parse_dose(dosage, dosage_unit)
+    if not dose.ok:
         return None, None
+    return dose.text, dose.unit
 
-    dosage_unit = dosage_unit.lower().strip()
-    m = re.search(r"([\d\.]+)", dosage.strip())
-    if not m:
-        logger.warning(f"normalize_dosage_value: не найдено численное значение в '{dosage}'")
-        return None, None
 
-    val = float(m.group(1))
+# ----------------- названия медикаментов -> RxCUI ----------------- #
 
-    if dosage_unit in ["mg"]:
-        return val, "mg"
-    if dosage_unit in ["mcg", "μg"]:
-        return val / 1000.0, "mg"
-    if dosage_unit in ["g", "gram", "grams"]:
-        return val * 1000.0, "mg"
-    if dosage_unit in ["mg/ml", "mg per ml", "mg/mL"]:
-        return val, "mg/ml"
-
-    logger.warning(f"normalize_dosage_value: неизвестная единица '{dosage_unit}'")
-    return None, None
+def resolve_medication_name(resolver, name: Any, model_rxcui: Any = "") -> Tuple[Any, Any]:
+    """
+    (rxcui, каноническое название) по словарю препаратов (drug_resolver).
+    Если словаря нет или название не найдено — rxcui из ответа модели и пустое название.
+    """
+    match = resolver.resolve(name) if resolver is not None else None
+    if match is None:
+        return model_rxcui, ""
+    return match.rxcui, match.name
 
 
 # ----------------- преобразование JSON -> записи ----------------- #
@@ -88,7 +88,7 @@ def build_main_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     Строит строки для общей таблицы заявки по каждому аппликанту.
     """
 
-    logger.info(f"Формирование main-records для uid={data.get('uid')}")
+    logger.debug("Формирование main-records для uid=%s", data.get("uid"))
 
     uid = data.get("uid", "")
     check_it = data.get("check_it", False)
@@ -100,7 +100,7 @@ def build_main_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
 
     applicants = data.get("applicants", [])
     if not applicants:
-        logger.warning(f"JSON не содержит списка applicants для uid={uid}")
+        logger.warning("JSON не содержит списка applicants для uid=%s", uid)
         # если поле отсутствует ИЛИ не список
         if not isinstance(applicants, list):
             reason_checking_logs = "отсутствует или повреждено поле applicants"
@@ -115,7 +115,7 @@ def build_main_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     # медикаменты внутри phq.medications
     phq = data.get("phq", {})
     meds = phq.get("medications", [])
-    logger.debug(f"build_main_records: найдено медикаментов={len(meds)} для uid={uid}")
+    logger.debug("build_main_records: найдено медикаментов=%d для uid=%s", len(meds), uid)
 
     # applicant поля в medications могут отсутствовать, поэтому берём id главного
     default_applicant_id = applicants[0].get("applicant", 0) if applicants else 0
@@ -132,7 +132,7 @@ def build_main_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
             applicant_id = idx
 
         logger.debug(
-            f"Обрабатываем applicant #{idx} → applicant_id={applicant_id}, uid={uid}"
+            "Обрабатываем applicant #%d → applicant_id=%s, uid=%s", idx, applicant_id, uid
         )
 
         applicant_meds = [
@@ -142,7 +142,7 @@ def build_main_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
         ]
 
         logger.debug(
-            f"Для applicant_id={applicant_id} найдено медикаментов: {len(applicant_meds)}"
+            "Для applicant_id=%s найдено медикаментов: %d", applicant_id, len(applicant_meds)
         )
 
         medications = safe_join([m.get("name", "") for m in applicant_meds])
@@ -201,7 +201,7 @@ def build_main_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
             }
         )
 
-    logger.info(f"build_main_records: для uid={uid} сформировано записей={len(records)}")
+    logger.debug("build_main_records: для uid=%s сформировано записей=%d", uid, len(records))
     return records
 
 
@@ -210,15 +210,16 @@ def build_medication_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     Строит список строк для таблицы медикаментов.
     """
     uid = data.get("uid", "")
-    logger.info(f"build_medication_records: начало обработки uid={uid}")
+    logger.debug("build_medication_records: начало обработки uid=%s", uid)
 
     applicants = data.get("applicants", [])
     phq = data.get("phq", {})
     meds = phq.get("medications", [])
-    logger.debug(f"build_medication_records: найдено meds={len(meds)} для uid={uid}")
+    logger.debug("build_medication_records: найдено meds=%d для uid=%s", len(meds), uid)
 
     # по умолчанию считаем, что все meds относятся к main applicant (0)
     main_applicant_id = applicants[0].get("applicant", 0) if applicants else 0
+    resolver = get_drug_resolver()
 
     # records = []
     records: List[Dict[str, Any]] = []
@@ -231,9 +232,8 @@ def build_medication_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
         freq = med.get("frequency", "")
         descr = med.get("description", "")
 
-        std_dose = dosage
-        std_unit = dosage_unit
-        # std_dose, std_unit = normalize_dosage_value(dosage, dosage_unit)
+        std_dose, std_unit = normalize_dosage_value(dosage, dosage_unit)
+        rxcui, rxnorm_name = resolve_medication_name(resolver, name, med.get("rxcui", ""))
 
         # пока check_it и reason_checking для строки медикамента
         # просто копируем из верхнего уровня;
@@ -243,8 +243,8 @@ def build_medication_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
         reason_checking_dosage_unit = data.get("reason_checking_dosage_unit", "")
 
         logger.debug(
-            f"build_medication_records: uid={uid}, med_name={name!r}, "
-            f"applicant_id={applicant_id}, dosage={dosage!r}, dosage_unit={dosage_unit!r}"
+            "build_medication_records: uid=%s, med_name=%r, applicant_id=%s, dosage=%r, dosage_unit=%r",
+            uid, name, applicant_id, dosage, dosage_unit,
         )
 
         records.append(
@@ -252,6 +252,8 @@ def build_medication_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
                 "uid": uid,
                 "applicant_id": applicant_id,
                 "medication": name,
+                "rxcui": rxcui,
+                "rxnorm_name": rxnorm_name,
                 "dosage": dosage,
                 "dosage_unit": dosage_unit,
                 "standardized_dose": std_dose,
@@ -264,7 +266,7 @@ def build_medication_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
             }
         )
 
-    logger.info(f"build_medication_records: для uid={uid} записей={len(records)}")
+    logger.debug("build_medication_records: для uid=%s записей=%d", uid, len(records))
     return records
 
 
@@ -281,51 +283,298 @@ def json_to_tables_from_dict(data: Dict[str, Any]) -> Tuple[pd.DataFrame, pd.Dat
 
     uid = data.get("uid", "")
     logger.info(
-        f"json_to_tables_from_dict: для uid={uid} main_rows={len(main_df)}, meds_rows={len(meds_df)}"
+        "json_to_tables_from_dict: для uid=%s main_rows=%d, meds_rows=%d", uid, len(main_df), len(meds_df)
     )
 
     return main_df, meds_df
 
 
-def json_to_tables_from_file(path: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+def load_response_json(path: str) -> Dict[str, Any]:
     """
-    Загружает JSON из файла и возвращает
-    два DataFrame: main_df, meds_df.
+    Загружает и проверяет JSON-ответ модели (корень должен быть объектом).
     """
-    logger.info(f"json_to_tables_from_file: чтение JSON из файла {path}")
+    logger.info("load_response_json: чтение JSON из файла %s", path)
 
     # проверяем, что файл вообще существует
     if not os.path.exists(path):
-        logger.error(f"json_to_tables_from_file: файл не найден: {path}")
+        logger.error(f"load_response_json: файл не найден: {path}")
         raise FileNotFoundError(f"JSON-файл не найден: {path}")
 
     try:
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
     except json.JSONDecodeError as e:
-        logger.exception(f"json_to_tables_from_file: невалидный JSON в файле {path}: {e}")
+        logger.exception(f"load_response_json: невалидный JSON в файле {path}: {e}")
         raise ValueError(f"Невалидный JSON в файле {path}: {e}")
     except Exception as e:
-        logger.exception(f"json_to_tables_from_file: ошибка чтения файла {path}: {e}")
+        logger.exception(f"load_response_json: ошибка чтения файла {path}: {e}")
         raise
 
     if not isinstance(data, dict):
         logger.error(
-            f"json_to_tables_from_file: корень JSON не объект (dict), а {type(data)} в файле {path}"
+            f"load_response_json: корень JSON не объект (dict), а {type(data)} в файле {path}"
         )
         raise ValueError(f"Ожидался JSON-объект (dict) в файле {path}, получено {type(data)}")
 
-    logger.info(f"json_to_tables_from_file: JSON успешно загружен, uid={data.get('uid', '')}")
-    return json_to_tables_from_dict(data)
+    logger.info("load_response_json: JSON успешно загружен, uid=%s", data.get("uid", ""))
+    return data
+
+
+def json_to_tables_from_file(path: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Загружает JSON из файла и возвращает
+    два DataFrame: main_df, meds_df.
+    """
+    return json_to_tables_from_dict(load_response_json(path))
+
+
+# ----------------- пакетное преобразование ----------------- #
+
+MAIN_COLUMNS = [
+    "uid", "check_it", "reason_checking", "status", "true_tier", "applicant_id", "is_main_applicant",
+    "firstName", "lastName", "midName", "phone", "gender", "dob", "nicotine", "weight", "height",
+    "heightFt", "heightIn", "medications", "dosages", "dosage_unit", "frequencies", "descriptions",
+    "combine_reasons", "reason_checking_logs", "reason_checking_med", "reason_checking_dosage_unit",
+]
+MEDS_COLUMNS = [
+    "uid", "applicant_id", "medication", "rxcui", "rxnorm_name", "dosage", "dosage_unit",
+    "standardized_dose", "standardized_unit",
+    "check_it", "reason_checking", "reason_checking_dosage_unit", "frequency", "description",
+]
+
+# Поля аппликанта и значения по умолчанию (как в build_main_records)
+APPLICANT_FIELDS = {
+    "firstName": "", "lastName": "", "midName": "", "phone": "", "gender": "", "dob": "",
+    "nicotine": False, "weight": 0, "height": 0, "heightFt": 0, "heightIn": 0,
+}
+
+DOSAGE_UNIT_ERROR = "некорректная система измерения"
+
+
+def normalize_dosage_series(dosages: pd.Series, units: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Векторный аналог normalize_dosage_value для колонок доз и единиц:
+    каждая различная пара (доза, единица) разбирается один раз.
+    Возвращает (standardized_dose, standardized_unit); NA там, где нормализация не удалась.
+    """
+    dose_text = dosages.where(dosages.notna(), "").astype(str).str.strip()
+    unit_text = units.where(units.notna(), "").astype(str).str.strip()
+
+    codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([dose_text, unit_text])) if len(dose_text) \
+        else (np.array([], dtype="int64"), [])
+    parsed = [parse_dose(d, u) for d, u in pairs]
+    std_dose = np.array([p.text if p.ok else pd.NA for p in parsed], dtype=object)
+    std_unit = np.array([p.unit if p.ok else pd.NA for p in parsed], dtype=object)
+    return (pd.Series(std_dose[codes], index=dosages.index, dtype=object),
+            pd.Series(std_unit[codes], index=dosages.index, dtype=object))
+
+
+def _clean_for_join(values: pd.Series, placeholder: str) -> Tuple[pd.Series, pd.Series]:
+    """
+    Подготовка значений для safe_join: (строка или placeholder, признак настоящего значения).
+    """
+    text = values.where(values.notna(), "").astype(str).str.strip()
+    real = (text != "") & (text != " | ")
+    return text.where(real, placeholder), real
+
+
+def _group_join(text: pd.Series, real: pd.Series, groups: pd.Series, size: int) -> list:
+    """
+    safe_join по группам: для группы i — " | ".join(text) или pd.NA,
+    если в группе нет ни одного настоящего значения (или группа пустая).
+    """
+    result = [pd.NA] * size
+    if not len(text):
+        return result
+    joined = text.groupby(groups, sort=False).agg(" | ".join)
+    has_real = real.groupby(groups, sort=False).any()
+    for group, value in joined[has_real.reindex(joined.index)].items():
+        result[group] = value
+    return result
+
+
+def json_list_to_tables(datas: List[Dict[str, Any]]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Пакетный аналог json_to_tables_from_dict для списка ответов:
+    строки заявок и медикаментов собираются в колонки за один проход,
+    а сопоставление медикаментов аппликантам, нормализация доз, safe_join
+    и флаг check_it считаются операциями pandas по всему батчу.
+
+    Результат совпадает построчно с pd.concat(json_to_tables_from_dict(d) для d в datas)
+    (кроме ответов, на которых построчная версия падает с исключением).
+    """
+    # --- аппликанты ---
+    app_doc: List[int] = []
+    app_idx: List[int] = []
+    app_ids: List[Any] = []
+    applicants_flat: List[Dict[str, Any]] = []
+
+    # --- медикаменты ---
+    med_doc: List[int] = []
+    med_target: List[Any] = []  # значение applicant для сопоставления с аппликантом (build_main_records)
+    med_applicant: List[Any] = []  # applicant_id строки таблицы медикаментов (build_medication_records)
+    meds_flat: List[Dict[str, Any]] = []
+
+    doc_fields = []
+    for doc, data in enumerate(datas):
+        applicants = data.get("applicants", [])
+        if not applicants or not isinstance(applicants, list):
+            applicants = []
+        meds = data.get("phq", {}).get("medications", [])
+
+        first_id = applicants[0].get("applicant", 0) if applicants else 0
+        doc_fields.append((
+            data.get("uid", ""), data.get("check_it", False), data.get("reason_checking", ""),
+            data.get("status", ""), data.get("true_tier", ""), data.get("reason_checking_dosage_unit", ""),
+        ))
+
+        for idx, applicant in enumerate(applicants):
+            applicant_id = applicant.get("applicant")
+            app_doc.append(doc)
+            app_idx.append(idx)
+            app_ids.append(idx if applicant_id is None else applicant_id)
+            applicants_flat.append(applicant)
+
+        for med in meds:
+            med_doc.append(doc)
+            med_target.append(med.get("applicant", first_id))
+            med_applicant.append(med.get("applicant", first_id))
+            meds_flat.append(med)
+
+    n_apps, n_meds = len(applicants_flat), len(meds_flat)
+    doc_fields_df = pd.DataFrame(
+        doc_fields, columns=["uid", "check_it", "reason_checking", "status", "true_tier", "rcdu"], dtype=object,
+    )
+
+    # --- сопоставление медикаментов аппликантам: то же, что med.get(...) == applicant_id ---
+    # словарь приводит ключи к одному значению по правилам Python (0 == 0.0 == False)
+    canon: Dict[Any, int] = {}
+
+    def canon_id(value):
+        try:
+            return canon.setdefault(value, len(canon))
+        except TypeError:  # нехешируемое значение ни с чем не совпадает
+            return -1 - len(canon)
+
+    apps_key = pd.DataFrame({
+        "doc": app_doc, "key": [canon_id(v) for v in app_ids], "app_row": range(n_apps),
+    })
+    meds_key = pd.DataFrame({
+        "doc": med_doc, "key": [canon_id(v) for v in med_target], "med_row": range(n_meds),
+    })
+    pairs = apps_key.merge(meds_key, on=["doc", "key"]).sort_values(["app_row", "med_row"], kind="stable")
+    group = pairs["app_row"].reset_index(drop=True)
+    med_rows = pairs["med_row"].to_numpy()
+
+    def med_column(name: str) -> pd.Series:
+        return pd.Series([med.get(name, "") for med in meds_flat], dtype=object)
+
+    names, dosages, units = med_column("name"), med_column("dosage"), med_column("dosage_unit")
+    resolver = get_drug_resolver()
+    rxcuis, rxnorm_names = zip(*(
+        resolve_medication_name(resolver, name, med.get("rxcui", "")) for name, med in zip(names, meds_flat)
+    )) if n_meds else ((), ())
+    frequencies, descriptions = med_column("frequency"), med_column("description")
+
+    # --- нормализация доз и ошибки единиц ---
+    std_dose, std_unit = normalize_dosage_series(dosages, units)
+    bad_unit = std_dose.isna().to_numpy()[med_rows] if n_meds else []
+    unit_error = pd.Series(bad_unit, dtype=bool).groupby(group).any().reindex(range(n_apps), fill_value=False)
+
+    # check_it "залипает" внутри документа: после первого аппликанта с ошибкой единиц — True
+    sticky = unit_error.groupby(pd.Series(app_doc, dtype="int64")).cummax() if n_apps else unit_error
+    doc_check_it = doc_fields_df["check_it"].to_numpy()[app_doc] if n_apps else []
+    check_it = [True if s else c for s, c in zip(sticky.tolist(), list(doc_check_it))]
+
+    def joined(values: pd.Series) -> list:
+        text, real = _clean_for_join(values.iloc[med_rows].reset_index(drop=True), "NaN")
+        return _group_join(text, real, group, n_apps)
+
+    reason_du = [DOSAGE_UNIT_ERROR if e else "" for e in unit_error.tolist()]
+    doc_reason = doc_fields_df["reason_checking"].iloc[app_doc].reset_index(drop=True) if n_apps \
+        else pd.Series([], dtype=object)
+    reason_text, reason_real = _clean_for_join(doc_reason, "")
+    du_series = pd.Series(reason_du, dtype=object)
+    combine = (reason_text + " |  |  | " + du_series).where(reason_real | (du_series != ""), pd.NA)
+
+    main_columns = {
+        "uid": doc_fields_df["uid"].to_numpy()[app_doc].tolist() if n_apps else [],
+        "check_it": check_it,
+        "reason_checking": doc_reason.tolist(),
+        "status": doc_fields_df["status"].to_numpy()[app_doc].tolist() if n_apps else [],
+        "true_tier": doc_fields_df["true_tier"].to_numpy()[app_doc].tolist() if n_apps else [],
+        "applicant_id": app_ids,
+        "is_main_applicant": [a.get("is_main_applicant", i == 0) for a, i in zip(applicants_flat, app_idx)],
+    }
+    for field, default in APPLICANT_FIELDS.items():
+        main_columns[field] = [a.get(field, default) for a in applicants_flat]
+    main_columns.update({
+        "medications": joined(names),
+        "dosages": joined(dosages),
+        "dosage_unit": joined(units),
+        "frequencies": joined(frequencies),
+        "descriptions": joined(descriptions),
+        "combine_reasons": combine.tolist(),
+        "reason_checking_logs": [""] * n_apps,
+        "reason_checking_med": [""] * n_apps,
+        "reason_checking_dosage_unit": reason_du,
+    })
+    main_df = pd.DataFrame(main_columns, columns=MAIN_COLUMNS) if n_apps else pd.DataFrame()
+
+    meds_columns = {
+        "uid": doc_fields_df["uid"].to_numpy()[med_doc].tolist() if n_meds else [],
+        "applicant_id": med_applicant,
+        "medication": names.tolist(),
+        "rxcui": list(rxcuis),
+        "rxnorm_name": list(rxnorm_names),
+        "dosage": dosages.tolist(),
+        "dosage_unit": units.tolist(),
+        "standardized_dose": std_dose.tolist(),
+        "standardized_unit": std_unit.tolist(),
+        "check_it": doc_fields_df["check_it"].to_numpy()[med_doc].tolist() if n_meds else [],
+        "reason_checking": doc_fields_df["reason_checking"].to_numpy()[med_doc].tolist() if n_meds else [],
+        "reason_checking_dosage_unit": doc_fields_df["rcdu"].to_numpy()[med_doc].tolist() if n_meds else [],
+        "frequency": frequencies.tolist(),
+        "description": descriptions.tolist(),
+    }
+    meds_df = pd.DataFrame(meds_columns, columns=MEDS_COLUMNS) if n_meds else pd.DataFrame()
+
+    logger.info(f"json_list_to_tables: документов={len(datas)}, main_rows={len(main_df)}, meds_rows={len(meds_df)}")
+    return main_df, meds_df
+
+
+def tables_equal(left: pd.DataFrame, right: pd.DataFrame) -> bool:
+    """
+    Совпадают ли таблицы построчно по значениям: те же колонки, строки и значения,
+    пропуски (None / NaN / pd.NA) равны друг другу. Типы колонок не сравниваются —
+    pd.concat по файлам выводит их по-разному в зависимости от состава батча.
+    """
+    if list(left.columns) != list(right.columns) or len(left) != len(right):
+        return False
+    for column in left.columns:
+        a = left[column].astype(object).tolist()
+        b = right[column].astype(object).tolist()
+        for x, y in zip(a, b):
+            if pd.isna(x) and pd.isna(y):
+                continue
+            if x != y or type(x) is not type(y) and not (isinstance(x, (int, float)) and isinstance(y, (int, float))):
+                return False
+    return True
 
 
 def append_to_global_tables(main_df_new: pd.DataFrame,
-                            meds_df_new: pd.DataFrame, output_dir: str, ) -> None:
+                            meds_df_new: pd.DataFrame, output_dir: str, ) -> Dict[str, Dict[str, int]]:
     """
-    Добавляет новые записи в общие таблицы (applications.csv и medications.csv),
-    не пересоздавая их и убирая дубли.
+    Upsert новых записей в общие таблицы (applications.csv и medications.csv)
+    без чтения и перезаписи всей истории (см. table_store.CsvTableStore).
 
-    "Такая же запись" = строка, совпадающая по всем колонкам.
+    "Такая же запись" = тот же ключ: (uid, applicant_id) для заявок,
+    (uid, applicant_id, медикамент, доза, единица) для медикаментов.
+    Документ (uid) обновляется целиком: изменённые строки заменяются,
+    пропавшие из ответа — удаляются.
+
+    Returns:
+        dict: статистика upsert по каждой таблице
     """
     logger.info(f"append_to_global_tables: output_dir={output_dir}")
     os.makedirs(output_dir, exist_ok=True)
@@ -333,43 +582,61 @@ def append_to_global_tables(main_df_new: pd.DataFrame,
     main_path = os.path.join(output_dir, MAIN_TABLE_FILENAME)
     meds_path = os.path.join(output_dir, MEDS_TABLE_FILENAME)
 
-    # ---- общая таблица заявок ----
-    if os.path.exists(main_path):
-        logger.info(f"append_to_global_tables: читаю существующую {main_path}")
-        main_df_old = pd.read_csv(main_path)
-        main_df_all = pd.concat([main_df_old, main_df_new], ignore_index=True)
-        main_df_all = main_df_all.drop_duplicates()
-    else:
-        logger.info(f"append_to_global_tables: {main_path} не существует, создаю новую")
-        main_df_all = main_df_new.copy()
-
-    main_df_all.to_csv(main_path, index=False)
+    stats = CsvTableSink(output_dir, MAIN_TABLE_FILENAME, MEDS_TABLE_FILENAME).write(main_df_new, meds_df_new)
     logger.info(f"append_to_global_tables: основная таблица обновлена → {main_path}")
-
-    # ---- общая таблица медикаментов ----
-    if os.path.exists(meds_path):
-        logger.info(f"append_to_global_tables: читаю существующую {meds_path}")
-        meds_df_old = pd.read_csv(meds_path)
-        meds_df_all = pd.concat([meds_df_old, meds_df_new], ignore_index=True)
-        meds_df_all = meds_df_all.drop_duplicates()
-    else:
-        logger.info(f"append_to_global_tables: {meds_path} не существует, создаем новую")
-        meds_df_all = meds_df_new.copy()
-
-    meds_df_all.to_csv(meds_path, index=False)
     logger.info(f"append_to_global_tables: таблица медикаментов обновлена → {meds_path}")
+    return stats
 
 
-def main():
+def read_global_table(output_dir: str, filename: str) -> pd.DataFrame:
+    """
+    Актуальное содержимое общей таблицы: по одной (последней) версии каждой строки.
+    Между compaction в CSV могут лежать устаревшие версии, поэтому
+    для анализа лучше читать таблицу этой функцией, а не pd.read_csv.
+    """
+    key_fn = application_keys if filename == MAIN_TABLE_FILENAME else medication_keys
+    return CsvTableStore(os.path.join(output_dir, filename), key_fn).read()
+
+
+def make_sinks(names: List[str], output_dir: str) -> List[TableSink]:
+    """
+    Приёмники таблиц по именам из SINK_NAMES.
+    """
+    sinks: List[TableSink] = []
+    for name in names:
+        if name == "csv":
+            sinks.append(CsvTableSink(output_dir, MAIN_TABLE_FILENAME, MEDS_TABLE_FILENAME))
+        elif name == "parquet":
+            sinks.append(ParquetTableSink(os.getenv("TABLES_PARQUET_DIR", os.path.join(output_dir, "parquet"))))
+        elif name == "sqlite":
+            sinks.append(SqliteTableSink(os.getenv("TABLES_SQLITE_PATH", os.path.join(output_dir, "tables.sqlite"))))
+        else:
+            raise ValueError(f"Неизвестный приёмник таблиц: {name!r} (ожидается одно из {SINK_NAMES})")
+    return sinks
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="JSON-ответы модели → общие таблицы")
+    parser.add_argument("--sink", type=lambda s: [x.strip() for x in s.split(",") if x.strip()],
+                        default=os.getenv("TABLES_SINK", "csv").split(","),
+                        help="куда писать таблицы: csv, parquet, sqlite или несколько через запятую")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="игнорировать манифест и заново загрузить все *_response.json")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
     # Ищем все JSON-ответы вида *_response.json в папке OUTPUT_DIR
     if not os.path.isdir(OUTPUT_DIR):
         logger.error(f"Директория с JSON не найдена: {OUTPUT_DIR}")
         raise FileNotFoundError(f"Директория с JSON не найдена: {OUTPUT_DIR}")
 
-    json_files = [
+    json_files = sorted(
         f for f in os.listdir(OUTPUT_DIR)
         if f.lower().endswith("_response.json")
-    ]
+    )
 
     logger.info(f"Найдены JSON-ответы: {len(json_files)} шт. в {OUTPUT_DIR}")
 
@@ -377,29 +644,66 @@ def main():
         logger.error(f"В {OUTPUT_DIR} не найдено ни одного *_response.json")
         raise FileNotFoundError(f"В {OUTPUT_DIR} не найдено ни одного *_response.json")
 
-    all_main_dfs: List[pd.DataFrame] = []
-    all_meds_dfs: List[pd.DataFrame] = []
+    # Манифест уже загруженных файлов — свой для каждого набора приёмников
+    manifest = IngestManifest(os.path.join(OUTPUT_DIR, f".tables_manifest-{'+'.join(sorted(args.sink))}.json"))
+    if args.full_rebuild:
+        logger.info("Полная пересборка: манифест игнорируется")
+        manifest.clear()
+    run_stats = {"found": len(json_files), "skipped": 0, "parsed": 0,
+                 "forgotten": manifest.prune(json_files)}
 
-    print("Найдены JSON-ответы:")
+    pending = []
     for fname in json_files:
-        logger.info(f"Обработка JSON-файла: {fname}")
-        json_path = os.path.join(OUTPUT_DIR, fname)
-
-        main_df, meds_df = json_to_tables_from_file(json_path)
-        all_main_dfs.append(main_df)
-        all_meds_dfs.append(meds_df)
-
-    # Объединяем всё в один DataFrame по заявкам и один по медикаментам
-    combined_main_df = pd.concat(all_main_dfs, ignore_index=True)
-    combined_meds_df = pd.concat(all_meds_dfs, ignore_index=True)
-
-    # Дописываем в общие таблицы (или создаём, если их ещё нет),
-    # удаляя дубли
-    append_to_global_tables(combined_main_df, combined_meds_df, OUTPUT_DIR)
+        if manifest.is_ingested(os.path.join(OUTPUT_DIR, fname)):
+            run_stats["skipped"] += 1
+        else:
+            pending.append(fname)
+    logger.info(f"К загрузке: {len(pending)} из {len(json_files)} (без изменений: {run_stats['skipped']})")
 
-    print("Записи из всех JSON добавлены в общие таблицы:")
-    print(f"- {os.path.join(OUTPUT_DIR, MAIN_TABLE_FILENAME)}")
-    print(f"- {os.path.join(OUTPUT_DIR, MEDS_TABLE_FILENAME)}")
+    # Сколько JSON-файлов загружается в таблицы за один батч
+    batch_files = int(os.getenv("TABLES_INGEST_BATCH", "1000"))
+    sinks = make_sinks(args.sink, OUTPUT_DIR)
+    totals: Dict[str, Dict[str, Dict[str, int]]] = {}
+    try:
+        # Пишем батчами по TABLES_INGEST_BATCH файлов: память не зависит от числа файлов,
+        # а манифест сохраняется после каждого записанного батча
+        for i in range(0, len(pending), batch_files):
+            batch = pending[i:i + batch_files]
+            datas = [load_response_json(os.path.join(OUTPUT_DIR, fname)) for fname in batch]
+
+            # Весь батч сразу в один DataFrame по заявкам и один по медикаментам
+            # (строки те же, что у json_to_tables_from_dict + pd.concat)
+            combined_main_df, combined_meds_df = json_list_to_tables(datas)
+
+            # Пишем в общие таблицы (или создаём, если их ещё нет):
+            # в CSV дописываются только новые и изменённые строки, в Parquet — новый файл партиции
+            for sink in sinks:
+                stats = sink.write(combined_main_df, combined_meds_df)
+                sink_totals = totals.setdefault(type(sink).__name__, {})
+                for table, table_stats in stats.items():
+                    table_totals = sink_totals.setdefault(table, {})
+                    for key, value in table_stats.items():
+                        table_totals[key] = table_totals.get(key, 0) + value
+
+            for fname in batch:
+                manifest.mark(os.path.join(OUTPUT_DIR, fname))
+            manifest.save()
+            run_stats["parsed"] += len(batch)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+    manifest.save()
+    logger.info(f"tables.main: {run_stats}")
+
+    print(f"JSON-ответов: найдено {run_stats['found']}, загружено {run_stats['parsed']}, "
+          f"пропущено без изменений {run_stats['skipped']}")
+    if totals:
+        print("Записи добавлены в общие таблицы:")
+    for sink_name, sink_totals in totals.items():
+        for table, table_stats in sink_totals.items():
+            print(f"- {sink_name} {table}: {table_stats}")
+    return run_stats
 
 
 # ----------------- пример использования как скрипта ----------------- #
@@ -0,0 +1,69 @@
+import logging
+
+import pytest
+
+from drug_resolver import DrugResolver, normalize_name
+
+ENTRIES = [
+    ("potassium chloride", "8591", "potassium chloride"),
+    ("sodium chloride", "9863", "sodium chloride"),
+    ("vitamin B12", "11248", "vitamin B12"),
+    ("vitamin B6", "11256", "vitamin B6"),
+    ("calcium", "1895", "calcium"),
+    ("magnesium", "6574", "magnesium"),
+    ("losartan", "52175", "losartan"),
+    ("Cozaar", "52175", "losartan"),
+    ("lisinopril", "29046", "lisinopril"),
+    ("alprazolam", "596", "alprazolam"),
+    ("Xanax", "596", "alprazolam"),
+]
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return DrugResolver(ENTRIES)
+
+
+@pytest.mark.parametrize("name, rxcui", [
+    ("Sodium Chloride", "9863"),
+    ("Potassium Chloride ER 20 mEq", "8591"),
+    ("Vitamin B6", "11256"),
+    ("Vitamin B12 1000 mcg", "11248"),
+    ("Calcium", "1895"),
+    ("Magnesium", "6574"),
+    ("Losartan Potassium 50 mg", "52175"),
+    ("Lisinopril 20mg tab", "29046"),
+])
+def test_exact_keeps_active_ingredient(resolver, name, rxcui):
+    match = resolver.resolve(name)
+    assert match is not None and match.method == "exact"
+    assert match.rxcui == rxcui
+
+
+@pytest.mark.parametrize("name, rxcui", [("xanex", "596"), ("lysinoprel", "29046")])
+def test_fuzzy_at_threshold(resolver, name, rxcui):
+    # длина 5 и 10: max_dist = 1 и 2 ровно на пороге DRUG_FUZZY_MIN = 0.8
+    match = resolver.resolve(name)
+    assert match is not None and match.method == "fuzzy"
+    assert match.rxcui == rxcui
+
+
+def test_normalize_strips_only_doses_with_units():
+    assert normalize_name("Vitamin D3 2000 IU") == "d3 vitamin"
+    assert normalize_name("Lisinopril/HCTZ 20 mg tab") == "hctz lisinopril"
+    assert normalize_name("Naproxen Sodium") == "naproxen"
+    assert normalize_name("Magnesium Citrate") == "citrate magnesium"
+
+
+def test_colliding_keys_are_dropped(caplog):
+    with caplog.at_level(logging.WARNING):
+        resolver = DrugResolver([("Foo HCl", "1", "foo hydrochloride"), ("foo sulfate", "2", "foo sulfate")])
+    assert resolver.resolve("foo") is None
+    assert "разным RxCUI" in caplog.text
+
+
+def test_canonical_name_wins_over_synonym():
+    resolver = DrugResolver([("bar", "1", "bar"), ("bar", "2", "baz")])
+    assert resolver.resolve("bar").rxcui == "1"
+    resolver = DrugResolver([("bar", "2", "baz"), ("bar", "1", "bar")])
+    assert resolver.resolve("bar").rxcui == "1"
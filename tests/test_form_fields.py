@@ -0,0 +1,103 @@
+import json
+import os
+
+import pytest
+
+from form_fields import CONVERTERS, DEPENDENTS_PATH, FormFieldMap
+from reader import extract_form_fields_pypdf
+from tables import json_to_tables_from_dict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DTQ17 = os.path.join(ROOT_DIR, "other_imput_files", "DTQ17_Redacted.pdf")
+
+
+@pytest.fixture(scope="module")
+def field_map():
+    return FormFieldMap.load(os.path.join(ROOT_DIR, "form_field_map.json"))
+
+
+@pytest.mark.parametrize("kind, raw, expected", [
+    ("height", "5' 9\"", {"height": 69, "heightFt": 5, "heightIn": 9}),
+    ("height", "5 ft 10 in", {"height": 70, "heightFt": 5, "heightIn": 10}),
+    ("height", "66\"", {"height": 66, "heightFt": 5, "heightIn": 6}),
+    ("height", "178 cm", {"height": 70, "heightFt": 5, "heightIn": 10}),
+    ("money", "$178641+", 178641.0),
+    ("money", "52k", 52000.0),
+    ("money", "52,000", 52000.0),
+    ("weight", "190 lbs", 190.0),
+    ("weight", "80 kg", 176.4),
+    ("float", "1,234.5", 1234.5),
+    ("int", "7", 7),
+])
+def test_converters_parse_known_units(kind, raw, expected):
+    assert CONVERTERS[kind](raw) == expected
+
+
+@pytest.mark.parametrize("kind, raw", [
+    ("height", "5-10"),
+    ("height", "178"),
+    ("height", "5' 14\""),
+    ("money", "about 50"),
+    ("weight", "80 stone"),
+    ("float", "80 kg"),
+    ("float", "52k"),
+    ("int", "10-20"),
+])
+def test_converters_reject_unknown_units(kind, raw):
+    # неразобранное значение не попадает в resolved — путь уходит модели
+    assert CONVERTERS[kind](raw) is None
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("Yes", True), ("Y", True), ("y", True), ("1", True), ("true", True), ("TRUE", True),
+    ("No", False), ("N", False), ("0", False), ("false", False), ("Off", False),
+    ("maybe", None), ("", None),
+])
+def test_to_bool_spellings(raw, expected):
+    assert CONVERTERS["bool"](raw) is expected
+
+
+def test_prefill_from_dtq17(field_map):
+    prefill = field_map.prefill(extract_form_fields_pypdf(DTQ17))
+    assert prefill is not None
+    main = prefill.data["applicants"][0]
+    assert (main["dob"], main["gender"], main["height"], main["weight"]) == ("1969-07-12", "male", 69, 190.0)
+    assert prefill.data["income"] == 178641.0
+    assert prefill.data["phq"]["effectiveDate"] == "2025-03-01"
+    # Medication_Question = "Y", Pregnancy_Status = "0"
+    assert prefill.data["phq"]["treatment"] is True
+    assert prefill.data["phq"]["pregnancy"] is False
+    assert "phq.medications" in prefill.missing
+    assert "applicants.0.dob" not in prefill.missing
+
+
+def test_dependents_are_asked_and_merged(field_map):
+    fields = extract_form_fields_pypdf(DTQ17)
+    prefill = field_map.prefill(fields)
+    # в форме есть иждивенец (dependents = "Kimberly 5/16/1966 F ... Spouse")
+    assert DEPENDENTS_PATH in prefill.missing
+    # и поля схемы, которых нет в маппинге
+    assert {"plans", "phq.invalid", "phq.disclaimer"} <= set(prefill.missing)
+
+    answer = {
+        DEPENDENTS_PATH: [{"firstName": "Kimberly", "dob": "1966-05-16", "gender": "female", "height": 66,
+                           "weight": 150}],
+        "phq.medications": [{"applicant": 1, "name": "Lisinopril/HCTZ", "dosage": "20-12.5",
+                             "dosage_unit": "mg", "frequency": "Once daily"}],
+    }
+    data = json.loads(prefill.merge_answer(answer, "DTQ17"))
+    main, dependent = data["applicants"]
+    assert main["dob"] == "1969-07-12" and main["is_main_applicant"] is True
+    assert dependent["applicant"] == 1 and dependent["is_main_applicant"] is False
+    assert (dependent["heightFt"], dependent["heightIn"]) == (5, 6)
+
+    main_df, meds_df = json_to_tables_from_dict(data)
+    assert len(main_df) == 2
+    assert set(meds_df["applicant_id"]) <= set(main_df["applicant_id"])
+
+
+def test_dependents_cleared_by_no(field_map):
+    prefill = field_map.prefill({"DOB": "7/12/1969", "dependents": "No"})
+    assert DEPENDENTS_PATH not in prefill.missing
+    assert DEPENDENTS_PATH not in prefill.data
+    assert len(prefill.data["applicants"]) == 1
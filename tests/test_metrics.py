@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+
+import metrics
+from metrics import MetricsRecorder
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    rec = MetricsRecorder(str(tmp_path), window=4, max_bytes=300, backups=2)
+    yield rec
+    rec._file.close()
+
+
+def test_quantiles_use_sliding_window(recorder):
+    for seconds in (100.0, 1.0, 2.0, 3.0, 4.0):
+        recorder.record("api_call", seconds, {}, True)
+    stats = recorder.stages["api_call"]
+    assert stats.count == 5 and stats.total == pytest.approx(110.0)
+    assert len(stats.window) == 4
+    assert stats.quantile(0.95) == 4.0
+    assert 'pdf_stage_seconds_count{stage="api_call"} 5' in recorder.prometheus()
+
+
+def test_jsonl_is_rotated(recorder):
+    for i in range(40):
+        recorder.record("read_pdf", 0.5, {"uid": f"doc{i}"}, True)
+    assert os.path.getsize(recorder.jsonl_path) < 300
+    assert os.path.exists(recorder.jsonl_path + ".1")
+    assert os.path.exists(recorder.jsonl_path + ".2")
+    assert not os.path.exists(recorder.jsonl_path + ".3")
+    with open(recorder.jsonl_path + ".1", encoding="utf-8") as f:
+        assert all(json.loads(line)["stage"] == "read_pdf" for line in f)
+
+
+def test_document_tags_released_after_context(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_RECENT_DOCS", 2)
+    metrics.start_run(str(tmp_path))
+    try:
+        recorder = metrics._recorder
+        # async-режим: чтение и запрос — два doc_context одного документа
+        with metrics.doc_context("a"):
+            metrics.set_doc_tags(pages=3)
+        with metrics.doc_context("a"), metrics.span("api_call"):
+            pass
+        assert recorder.documents == {}
+        assert recorder.recent_documents["a"]["pages"] == 3
+        for uid in ("b", "c"):
+            with metrics.doc_context(uid):
+                pass
+        assert list(recorder.recent_documents) == ["b", "c"]
+        assert recorder.documents_total == 3
+    finally:
+        metrics.finish_run()
+    with open(recorder.jsonl_path, encoding="utf-8") as f:
+        entry = json.loads(f.readline())
+    assert entry["uid"] == "a" and entry["pages"] == 3
@@ -0,0 +1,81 @@
+import pytest
+
+from response_check import RESPONSE_SCHEMA, check_response, repair_json, response_reask
+
+
+@pytest.mark.parametrize("text, expected, fix", [
+    ('{"a": 1, "b": [1, 2', {"a": 1, "b": [1]}, "truncated"),
+    ('{"a": "unterminated', {}, "truncated"),
+    ("{'a': 'x', 'b': True, 'c': None}", {"a": "x", "b": True, "c": None}, "single_quotes"),
+    ('Here you go:\n```json\n{"a": 1}\n```', {"a": 1}, "code_fence"),
+    ('{"a": 1} Hope this helps!', {"a": 1}, "trailing_text"),
+    ('Result: {"a": 1}', {"a": 1}, "leading_text"),
+    ('{"a": 1 "b": 2}', {"a": 1, "b": 2}, "missing_commas"),
+    ('{"a": 1, // comment\n "b": 2}', {"a": 1, "b": 2}, "comments"),
+])
+def test_repair_json(text, expected, fix):
+    data, fixes = repair_json(text)
+    assert data == expected
+    assert fix in fixes
+
+
+def test_repair_json_valid_and_missing():
+    assert repair_json('{"a": [1, 2]}') == ({"a": [1, 2]}, [])
+    assert repair_json("no json here")[0] is None
+    assert repair_json(None) == (None, [])
+
+
+def test_check_coerces_scalars():
+    result = RESPONSE_SCHEMA.check({
+        "applicants": [{"applicant": "0", "weight": "190", "dob": "7/12/1969", "gender": "M", "nicotine": "yes"}],
+        "plans": {"id": 1},
+        "phq": {"treatment": "Y", "medications": [], "issues": [], "conditions": []},
+        "address": {},
+    })
+    applicant = result.data["applicants"][0]
+    assert (applicant["applicant"], applicant["weight"], applicant["dob"]) == (0, 190.0, "1969-07-12")
+    assert (applicant["gender"], applicant["nicotine"]) == ("male", True)
+    assert result.data["phq"]["treatment"] is True
+    assert result.data["plans"] == [{"id": 1, "priceId": 0}]
+    assert {"coerced:applicants.0.weight", "coerced:applicants.0.dob", "wrapped:plans"} <= set(result.fixes)
+    assert result.errors == []
+
+
+def test_check_reports_choice_and_type_errors():
+    result = RESPONSE_SCHEMA.check({
+        "applicants": [{"weight": "80 kg", "gender": "unknown"}],
+        "plans": [],
+        "phq": {"medications": [{"frequency": "sometimes"}], "issues": "none", "conditions": []},
+        "address": {},
+        "income": "$50k",
+    })
+    assert set(result.errors) == {"applicants.0.weight", "applicants.0.gender",
+                                  "phq.medications.0.frequency", "phq.issues", "income"}
+    # непрошедшее значение остаётся в данных как было (для дозапроса и reason_checking)
+    assert result.data["phq"]["medications"][0]["frequency"] == "sometimes"
+    assert "applicants.0.weight" in result.to_json()
+
+
+def test_check_missing_required_sections():
+    result = check_response('{"applicants": [], "phq": {}}')
+    assert set(result.errors) == {"plans", "phq.medications", "phq.issues", "phq.conditions", "address"}
+    assert check_response("not json") is None
+
+
+def test_response_reask_reads_env_at_call_time(monkeypatch):
+    monkeypatch.setenv("RESPONSE_REASK", "3")
+    assert response_reask() == 3
+    monkeypatch.delenv("RESPONSE_REASK")
+    assert response_reask() == 1
+
+
+def test_missing_is_main_applicant_left_to_tables():
+    from tables import json_to_tables_from_dict
+
+    result = check_response('{"applicants": [{"firstName": "A"}, {"firstName": "B", "is_main_applicant": true}], '
+                            '"plans": [], "phq": {"medications": [], "issues": [], "conditions": []}, "address": {}}')
+    assert "is_main_applicant" not in result.data["applicants"][0]
+    assert result.data["applicants"][1]["is_main_applicant"] is True
+    main_df, _ = json_to_tables_from_dict({**result.data, "uid": "u"})
+    # основной — по индексу 0 (fallback tables.py), явное значение модели сохраняется
+    assert main_df["is_main_applicant"].tolist() == [True, True]
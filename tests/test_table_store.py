@@ -0,0 +1,47 @@
+import datetime
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from table_store import ParquetTableSink, read_parquet_table  # noqa: E402
+from tables import json_list_to_tables  # noqa: E402
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_response(uid: str):
+    with open(os.path.join(ROOT_DIR, "output_files", f"{uid}_response.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_parquet_round_trip_date_with_nat(tmp_path):
+    data = load_response("044551191")
+    # неразборчивая дата → NaT в object-колонке .dt.date → null в date32
+    data["applicants"][1]["dob"] = "not a date"
+    main_df, meds_df = json_list_to_tables([data])
+
+    stats = ParquetTableSink(str(tmp_path)).write(main_df, meds_df)
+    assert stats["applications"] == {"rows": 3, "files": 1}
+
+    df = read_parquet_table(str(tmp_path), "applications", columns=["uid", "dob", "weight"])
+    assert list(df.columns) == ["uid", "dob", "weight"]
+    assert str(df["dob"].dtype) == "date32[day][pyarrow]"
+    assert df["dob"].isna().sum() == 1
+    assert sorted(df["dob"].dropna()) == [datetime.date(1963, 2, 26), datetime.date(2003, 2, 18)]
+
+
+def test_parquet_all_nat_dates_and_latest_version(tmp_path):
+    data = load_response("416887602")
+    for applicant in data["applicants"]:
+        applicant["dob"] = ""
+    sink = ParquetTableSink(str(tmp_path))
+    sink.write(*json_list_to_tables([data]))
+    sink.write(*json_list_to_tables([data]))
+
+    df = read_parquet_table(str(tmp_path), "applications")
+    assert len(df) == len(data["applicants"])
+    assert df["dob"].isna().all()
+    assert len(read_parquet_table(str(tmp_path), "applications", latest=False)) == 2 * len(df)
@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from logging_config import setup_logging, get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "text")
+
+# (abspath, size, mtime_ns) -> sha256, чтобы не хэшировать один и тот же файл повторно
+_hash_memo: Dict[Tuple[str, int, int], str] = {}
+_hash_memo_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    """
+    sha256 содержимого файла. Результат запоминается по (путь, размер, mtime).
+    """
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _hash_memo_lock:
+        cached = _hash_memo.get(memo_key)
+    if cached is not None:
+        return cached
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+class TextCache:
+    """
+    Постоянный кэш извлечённого текста PDF, постранично.
+
+    Ключ — sha256 содержимого файла + имя экстрактора (pypdf / pdfplumber / pymupdf)
+    + версия библиотеки. Запись — gzip-JSONL, одна строка на страницу:
+        {"page": 0, "text": "..."}
+    Путь: <cache_dir>/<hash[:2]>/<hash>.<extractor>-<version>.jsonl.gz
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["TextCache"]:
+        """
+        Кэш из переменных окружения. PDF_TEXT_CACHE=0 — кэш выключен (вернёт None).
+        """
+        if os.getenv("PDF_TEXT_CACHE", "1").lower() in ("0", "false", "no", "off"):
+            return None
+        return cls(os.getenv("PDF_TEXT_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+    def _path(self, file_hash: str, extractor: str, version: str) -> str:
+        return os.path.join(self.cache_dir, file_hash[:2], f"{file_hash}.{extractor}-{version}.jsonl.gz")
+
+    def get(self, file_hash: str, extractor: str, version: str) -> Optional[List[str]]:
+        """
+        Возвращает список текстов страниц или None, если записи нет.
+        """
+        path = self._path(file_hash, extractor, version)
+        try:
+            pages: List[str] = []
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["page"] != len(pages):
+                        raise ValueError(f"нарушен порядок страниц: {record['page']} != {len(pages)}")
+                    pages.append(record["text"])
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (OSError, EOFError, ValueError, KeyError) as e:
+            logger.warning(f"TextCache: повреждённая запись {path}, удаляю: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        logger.debug("TextCache: hit %s (%s-%s)", file_hash[:12], extractor, version)
+        return pages
+
+    def put(self, file_hash: str, extractor: str, version: str, pages: List[str]) -> None:
+        """
+        Сохраняет тексты страниц. Запись атомарная (через временный файл).
+        """
+        path = self._path(file_hash, extractor, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                for i, text in enumerate(pages):
+                    f.write(json.dumps({"page": i, "text": text}, ensure_ascii=False))
+                    f.write("\n")
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception(f"TextCache: не удалось сохранить запись {path}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def get_or_extract(self, path: str, extractor: str, version: str,
+                       extract_fn: Callable[[str], List[str]]) -> List[str]:
+        """
+        Возвращает страницы из кэша, а при промахе вызывает extract_fn(path)
+        и сохраняет результат. Ошибки extract_fn пробрасываются как есть.
+        """
+        try:
+            file_hash = file_sha256(path)
+        except OSError:
+            # файла нет или он не читается — пусть экстрактор сам выдаст привычную ошибку
+            return extract_fn(path)
+
+        pages = self.get(file_hash, extractor, version)
+        if pages is not None:
+            return pages
+
+        pages = extract_fn(path)
+        self.put(file_hash, extractor, version, pages)
+        return pages
+
+    def log_stats(self) -> None:
+        logger.info(f"TextCache: hits={self.hits}, misses={self.misses}")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    logger = get_logger(__name__)
+
+    # python text_cache.py warm <dir> [extractor ...]
+    if len(sys.argv) < 3 or sys.argv[1] != "warm":
+        print("Использование: python text_cache.py warm <dir> [pypdf|pdfplumber|pymupdf ...]")
+        sys.exit(2)
+
+    from reader import warm_text_cache
+
+    extractors = sys.argv[3:] or ["pdfplumber"]
+    warm_text_cache(sys.argv[2], extractors)
@@ -0,0 +1,437 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import signal
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from job_ledger import JobLedger, default_ledger_path
+from logging_config import setup_logging, get_logger
+from main import DEFAULT_MAX_CONCURRENCY, add_processing_args, openai_api_key, process_pdf_job
+from metrics import observe, print_summary as print_metrics_summary, set_gauge, start_run, write_snapshot
+from pipeline import TableWriter, add_table_args
+from response_cache import ResponseCache
+
+logger = get_logger(__name__)
+
+# inotify (Linux) или опрос каталога; auto — inotify, если он доступен
+WATCH_MODES = ("auto", "inotify", "poll")
+
+
+def watch_settings() -> Dict[str, Any]:
+    """
+    Настройки наблюдения из окружения; читаются при вызове (значения из .env действуют после load_dotenv).
+
+    - mode (WATCH_MODE): inotify, poll или auto;
+    - workers (WATCH_WORKERS): сколько PDF обрабатывается одновременно (один клиент OpenAI на всех);
+    - settle_seconds (WATCH_SETTLE_SECONDS): файл берётся в работу, когда его размер и mtime
+      не менялись столько секунд;
+    - poll_seconds (WATCH_POLL_SECONDS): период опроса каталога в режиме poll;
+    - stats_seconds (WATCH_STATS_SECONDS): как часто писать в лог и в метрики размер очереди (backlog);
+    - flush_seconds (WATCH_FLUSH_SECONDS): неполный батч таблиц ждёт не дольше
+      (в режиме наблюдения важнее задержка, чем размер батча).
+    """
+    return {
+        "mode": os.getenv("WATCH_MODE", "auto"),
+        "workers": int(os.getenv("WATCH_WORKERS", str(DEFAULT_MAX_CONCURRENCY))),
+        "settle_seconds": float(os.getenv("WATCH_SETTLE_SECONDS", "1")),
+        "poll_seconds": float(os.getenv("WATCH_POLL_SECONDS", "2")),
+        "stats_seconds": float(os.getenv("WATCH_STATS_SECONDS", "30")),
+        "flush_seconds": float(os.getenv("WATCH_FLUSH_SECONDS", "1")),
+    }
+
+# Маски событий inotify (см. <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+_STOP = object()
+
+
+def is_watched_pdf(name: str) -> bool:
+    # скрытые файлы — временные файлы копирования (.name.pdf.XXXX, .~lock и т.п.)
+    base = os.path.basename(name)
+    return base.lower().endswith(".pdf") and not base.startswith(".")
+
+
+def scan_pdfs(directory: str) -> List[str]:
+    with os.scandir(directory) as entries:
+        return sorted(e.path for e in entries if e.is_file() and is_watched_pdf(e.name))
+
+
+class InotifyWatcher:
+    """
+    События создания / закрытия после записи / переноса файлов в каталоге через inotify (Linux, ctypes).
+    Каталог не перечитывается: poll() возвращает только пути из событий.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch {directory}")
+
+    def poll(self, timeout: float) -> Optional[List[str]]:
+        """
+        Пути файлов из событий за timeout секунд; None — очередь событий ядра переполнилась,
+        нужно один раз перечитать каталог.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths, offset = [], 0
+        while offset < len(data):
+            _, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify: очередь событий переполнена, перечитываем каталог")
+                return None
+            if mask & IN_IGNORED:
+                raise RuntimeError(f"inotify: каталог {self.directory} удалён или размонтирован")
+            if name and not mask & IN_ISDIR:
+                paths.append(os.path.join(self.directory, os.fsdecode(name)))
+        return paths
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Запасной вариант без inotify: раз в interval секунд сравнивает (размер, mtime) файлов каталога
+    с предыдущим опросом и возвращает новые и изменившиеся.
+    """
+
+    def __init__(self, directory: str, interval: Optional[float] = None):
+        if interval is None:
+            interval = watch_settings()["poll_seconds"]
+        self.directory = directory
+        self.interval = interval
+        self.seen = self._snapshot()
+        self.next_scan = time.monotonic() + interval
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not is_watched_pdf(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                snapshot[entry.path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def poll(self, timeout: float) -> Optional[List[str]]:
+        wait = self.next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, wait))
+        self.next_scan = time.monotonic() + self.interval
+
+        snapshot = self._snapshot()
+        changed = [path for path, sig in snapshot.items() if self.seen.get(path) != sig]
+        self.seen = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def make_watcher(directory: str, mode: Optional[str] = None, poll_seconds: Optional[float] = None):
+    settings = watch_settings()
+    mode = settings["mode"] if mode is None else mode
+    poll_seconds = settings["poll_seconds"] if poll_seconds is None else poll_seconds
+    if mode not in WATCH_MODES:
+        raise ValueError(f"Неизвестный WATCH_MODE={mode!r}, доступны: {WATCH_MODES}")
+    if mode != "poll":
+        try:
+            watcher = InotifyWatcher(directory)
+            logger.info(f"Наблюдение за {directory}: inotify")
+            return watcher
+        except (OSError, AttributeError) as e:  # нет inotify (не Linux) или исчерпан лимит watch-ей
+            if mode == "inotify":
+                raise
+            logger.warning(f"inotify недоступен ({e}), опрос каталога раз в {poll_seconds:g} с")
+    logger.info(f"Наблюдение за {directory}: опрос раз в {poll_seconds:g} с")
+    return PollingWatcher(directory, poll_seconds)
+
+
+class FolderWatcher:
+    """
+    Долгоживущий режим: следит за каталогом и отдаёт новые PDF пулу из workers потоков.
+
+    - файл берётся в работу, когда дописан: размер и mtime не менялись settle_seconds;
+    - повторные события по одному файлу схлопываются, одна версия файла
+      (размер, mtime) обрабатывается один раз;
+    - очередь к пулу ограничена: если пул занят, готовые файлы ждут в pending;
+    - backlog (ждут стабилизации + в очереди + в работе) пишется в лог и в метрики (pdf_watch_backlog).
+
+    handle(pdf_path) -> bool обрабатывает один файл (см. main.process_pdf_job).
+    stop() (или SIGINT/SIGTERM в main) — новые файлы больше не берутся, документы в работе
+    дообрабатываются; не начатые остаются в журнале и берутся при следующем запуске.
+    """
+
+    def __init__(self, input_dir: str, handle: Callable[[str], bool],
+                 workers: Optional[int] = None,
+                 settle_seconds: Optional[float] = None,
+                 mode: Optional[str] = None,
+                 poll_seconds: Optional[float] = None,
+                 stats_seconds: Optional[float] = None):
+        # не переданные параметры — из WATCH_* (см. watch_settings)
+        settings = watch_settings()
+        workers = settings["workers"] if workers is None else workers
+        settle_seconds = settings["settle_seconds"] if settle_seconds is None else settle_seconds
+        mode = settings["mode"] if mode is None else mode
+        poll_seconds = settings["poll_seconds"] if poll_seconds is None else poll_seconds
+        stats_seconds = settings["stats_seconds"] if stats_seconds is None else stats_seconds
+        if workers < 1:
+            raise ValueError(f"workers должен быть >= 1, получено {workers}")
+        self.input_dir = input_dir
+        self.handle = handle
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self.mode = mode
+        self.poll_seconds = poll_seconds
+        self.stats_seconds = stats_seconds
+        self.queue: queue.Queue = queue.Queue(maxsize=workers)
+        # path -> ((размер, mtime_ns), когда менялся, когда замечен)
+        self.pending: Dict[str, Tuple[Optional[Tuple[int, int]], float, float]] = {}
+        # последняя версия каждого файла, отданная в работу
+        self.taken: Dict[str, Tuple[int, int]] = {}
+        self.in_flight = 0
+        self.stats = {"done": 0, "failed": 0}
+        self.error: Optional[BaseException] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._last_backlog: Optional[int] = None
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def backlog(self) -> int:
+        return len(self.pending) + self.queue.qsize() + self.in_flight
+
+    def track(self, path: str) -> None:
+        if is_watched_pdf(path) and path not in self.pending:
+            now = time.monotonic()
+            self.pending[path] = (None, now, now)
+
+    def _promote_ready(self) -> None:
+        now = time.monotonic()
+        for path, (sig, changed_at, seen_at) in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]  # удалён или переименован, не дописавшись
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != sig:
+                self.pending[path] = (current, now, seen_at)
+                continue
+            if st.st_size == 0 or now - changed_at < self.settle_seconds:
+                continue
+            if self.taken.get(path) == current:
+                del self.pending[path]  # повторное событие по уже обработанной версии
+                continue
+            try:
+                self.queue.put_nowait((path, seen_at))
+            except queue.Full:
+                return  # пул занят, файлы подождут в pending
+            del self.pending[path]
+            self.taken[path] = current
+
+    def _work(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            path, seen_at = item
+            with self._lock:
+                self.in_flight += 1
+            try:
+                ok = self.handle(path)
+            except Exception as e:
+                # например, AuthenticationError: остальные файлы тоже не пройдут
+                logger.critical(f"Наблюдение остановлено: ошибка при обработке {path}: {e!r}")
+                self.error = e
+                self.stop()
+                ok = False
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+            with self._lock:
+                self.stats["done" if ok else "failed"] += 1
+            if ok:
+                observe("watch_latency", time.monotonic() - seen_at, file=os.path.basename(path))
+
+    def _report(self) -> None:
+        backlog = self.backlog()
+        if backlog or backlog != self._last_backlog:
+            logger.info(f"Наблюдение: backlog={backlog} (ждут записи {len(self.pending)}, "
+                        f"в очереди {self.queue.qsize()}, в работе {self.in_flight}), {self.stats}")
+        self._last_backlog = backlog
+        set_gauge("watch_backlog", backlog)
+        set_gauge("watch_in_flight", self.in_flight)
+        try:
+            write_snapshot()
+        except OSError as e:
+            logger.warning(f"Не удалось обновить снапшот метрик: {e}")
+
+    def run(self, initial: Iterable[str] = ()) -> Dict[str, int]:
+        """
+        Работает до stop(). initial — файлы, которые уже лежат в каталоге и ещё не обработаны.
+        """
+        watcher = make_watcher(self.input_dir, self.mode, self.poll_seconds)
+        threads = [threading.Thread(target=self._work, name=f"watch-worker-{i}", daemon=True)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for path in initial:
+            self.track(path)
+        logger.info(f"Наблюдение запущено: {self.input_dir}, воркеров {self.workers}, "
+                    f"к обработке при старте {len(self.pending)}")
+
+        next_report = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                # пока есть недописанные файлы, проверяем их чаще
+                changed = watcher.poll(min(0.25, self.settle_seconds) if self.pending else 1.0)
+                if changed is None:
+                    changed = scan_pdfs(self.input_dir)
+                for path in changed:
+                    self.track(path)
+                self._promote_ready()
+                if time.monotonic() >= next_report:
+                    self._report()
+                    next_report = time.monotonic() + self.stats_seconds
+        finally:
+            watcher.close()
+            not_started = 0
+            while True:
+                try:
+                    self.queue.get_nowait()
+                    not_started += 1
+                except queue.Empty:
+                    break
+            logger.info(f"Наблюдение останавливается: дообрабатываем {self.in_flight} PDF, "
+                        f"не начато {not_started + len(self.pending)} (будут взяты при следующем запуске)")
+            for _ in threads:
+                self.queue.put(_STOP)
+            for thread in threads:
+                thread.join()
+            self._report()
+
+        if self.error is not None:
+            raise self.error
+        return self.stats
+
+
+def _install_signal_handlers(daemon: FolderWatcher) -> None:
+    def handler(signum, frame):
+        logger.info(f"Получен {signal.Signals(signum).name}: останавливаемся после текущих документов "
+                    f"(повторный сигнал — немедленный выход)")
+        daemon.stop()
+        signal.signal(signum, signal.SIG_DFL)
+
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    # умолчания из WATCH_* читаются здесь, после load_dotenv() в main
+    settings = watch_settings()
+    parser = argparse.ArgumentParser(
+        description="Наблюдение за PDF_INPUT_DIR: новые PDF → OpenAI → _response.json и таблицы"
+    )
+    parser.add_argument("--workers", type=int, default=settings["workers"],
+                        help="сколько PDF обрабатывать одновременно")
+    parser.add_argument("--mode", choices=WATCH_MODES, default=settings["mode"],
+                        help="inotify, опрос каталога (poll) или auto")
+    parser.add_argument("--settle-seconds", type=float, default=settings["settle_seconds"],
+                        help="файл считается дописанным, если не менялся столько секунд")
+    add_processing_args(parser)
+    add_table_args(parser, flush_seconds=settings["flush_seconds"])
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    load_dotenv()
+    args = parse_args(argv)
+    input_dir = os.getenv("PDF_INPUT_DIR", "input_files")
+    output_dir = os.getenv("OUTPUT_DIR", "output_files")
+    os.makedirs(input_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # один клиент на все документы: соединения с API переиспользуются
+    client = OpenAI(api_key=openai_api_key(), max_retries=0)
+
+    cache = None
+    if args.clear_cache:
+        ResponseCache.from_env().clear()
+    if not args.no_cache:
+        cache = ResponseCache.from_env()
+
+    # PDF, положенные, пока процесс не работал, — как при --resume
+    ledger = JobLedger(default_ledger_path(output_dir))
+    existing = scan_pdfs(input_dir)
+    ledger.enqueue(existing, reset=False)
+    initial = ledger.pending(existing)
+
+    start_run(args.metrics_dir)
+    try:
+        with TableWriter(args.sink, output_dir, args.batch_docs, args.flush_seconds) as writer:
+            daemon = FolderWatcher(
+                input_dir,
+                lambda pdf_path: process_pdf_job(pdf_path, client, output_dir, ledger, cache,
+                                                 compact=not args.no_compact,
+                                                 use_form=not args.no_form_fields,
+                                                 on_result=writer.put),
+                workers=args.workers, settle_seconds=args.settle_seconds, mode=args.mode,
+            )
+            _install_signal_handlers(daemon)
+            stats = daemon.run(initial)
+    finally:
+        print_metrics_summary()
+        logger.info(f"Журнал обработки {ledger.path}: {ledger.counts()}")
+        ledger.close()
+        if cache is not None:
+            cache.log_stats()
+
+    print(f"Обработано: {stats}, записано в таблицы: {writer.stats}")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    logger = get_logger(__name__)
+
+    logger.info("Приложение запущено (watcher.py)")
+
+    main()